@@ -0,0 +1,64 @@
+import collections
+
+from minimap_grid import cell_centres
+
+Action = collections.namedtuple('Action', ['index', 'name', 'kind', 'x', 'y'])
+
+
+def no_action(agent, obs, census, action):
+    return None
+
+
+class ActionRegistry:
+    """An agent's smart actions in Q-table column order, with a handler per action kind and move_number phase.
+
+    Handlers are plain functions `handler(agent, obs, census, action)` returning a FunctionCall, or None to fall
+    back to a no-op. `table[phase][index]` is compiled from them as actions and handlers are registered, so
+    dispatching an action is one indexed call; the 'attack_15_47' style names only exist as the Q-table's
+    column labels and are never parsed.
+    """
+
+    def __init__(self, phases=1):
+        self.phases = phases
+        self.actions = []
+        self.handlers = {}  # kind -> handler per phase
+        self.table = [[] for _ in range(phases)]
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __getitem__(self, index):
+        return self.actions[index]
+
+    @property
+    def names(self):
+        return [action.name for action in self.actions]
+
+    def add(self, kind, x=0, y=0, name=None):
+        self.actions.append(Action(len(self.actions), name or kind, kind, x, y))
+        self._compile()
+
+    def add_grid(self, kind, grid_size, minimap_size=64):
+        # one '<kind>_<x>_<y>' action per cell of a grid_size x grid_size split of the minimap, aimed at its centre
+        centres = cell_centres(grid_size, minimap_size)
+
+        for x in centres:
+            for y in centres:
+                self.add(kind, x, y, '%s_%d_%d' % (kind, x, y))
+
+    def handler(self, kind, phase=0):
+        # decorator registering the handler of `kind` actions in `phase`
+        def register(fn):
+            self.handlers.setdefault(kind, [no_action] * self.phases)[phase] = fn
+            self._compile()
+
+            return fn
+
+        return register
+
+    def _compile(self):
+        self.table = [[self.handlers.get(action.kind, [no_action] * self.phases)[phase] for action in self.actions]
+                      for phase in range(self.phases)]
+
+    def dispatch(self, agent, phase, index, obs, census):
+        return self.table[phase][index](agent, obs, census, self.actions[index])
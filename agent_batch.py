@@ -0,0 +1,144 @@
+import importlib
+
+import numpy as np
+
+from pysc2.lib import features
+
+from building_tracker import BuildingTracker
+from minimap_grid import hot_squares_batch
+from step_profiler import NULL_PROFILER, make_profiler
+from unit_census import UnitCensus
+
+_PLAYER_RELATIVE = features.SCREEN_FEATURES.player_relative.index
+_UNIT_TYPE = features.SCREEN_FEATURES.unit_type.index
+
+
+def choose_actions(qlearn, states):
+    # qlearn.choose_actions where the table has it (QLearningTable), one choose_action per state otherwise
+    batch = getattr(qlearn, 'choose_actions', None)
+    if batch is not None:
+        return batch(states)
+
+    return [qlearn.choose_action(state) for state in states]
+
+
+class AgentBatch:
+    """One agent per environment for N environments played in lockstep, stepped together.
+
+    Every environment has its own agent, so its own move_number state machine, building counts and previous
+    state and action, but they all share the first agent's Q-table (and only the first one checkpoints it).
+    `step(observations)` takes a timestep per environment and returns a FunctionCall per environment: the unit
+    census, building tracking, hot squares, state encoding and the Q-table's lookup and choice run once over all
+    the environments (the last four only over those at move 0), while the bookkeeping and the action handlers run
+    per agent.
+
+    A shared table has one set of eligibility traces and one episode boundary, so trace_decay and a bounded table
+    (max_states, which evicts at the end of an episode) are refused.
+
+    `agent_cls` is SparseAgent or BMAgent, or any agent with their observe/state_features/learn_previous/act
+    split of step(); its module provides STATE_ENCODER and HOT_SQUARES_GRID.
+    """
+
+    def __init__(self, agent_cls, n, **kwargs):
+        # one transition log per environment, `record_path` + '.<i>': a shared one would interleave their episodes
+        # (offline_trainer.py replays each log in order, and takes several)
+        record_path = kwargs.pop('record_path', None)
+
+        def recording(i):
+            return {} if record_path is None else {'record_path': '%s.%d' % (record_path, i)}
+
+        first = agent_cls(**dict(kwargs, **recording(0)))
+
+        if getattr(first.qlearn, 'traces', None) is not None:
+            raise ValueError('AgentBatch shares one Q-table between its environments, so it cannot keep their '
+                             'eligibility traces apart; use trace_decay=0')
+        if getattr(first.qlearn, 'max_states', None) is not None:
+            raise ValueError('AgentBatch cannot share a bounded Q-table: one environment ending its episode would '
+                             'evict rows the others are still using')
+
+        # the table and how it explores come from the first agent; the rest share it
+        shared = {key: value for key, value in kwargs.items() if key not in ('qlearn', 'exploration', 'trace_decay')}
+        self.agents = [first] + [agent_cls(qlearn=first.qlearn, **dict(shared, **recording(i))) for i in range(1, n)]
+        self.qlearn = first.qlearn
+
+        module = importlib.import_module(agent_cls.__module__)
+        self.encoder = module.STATE_ENCODER
+        self.grid = module.HOT_SQUARES_GRID
+
+        # the agents' own phases would interleave, so the batch is profiled as a whole
+        self.profiler = make_profiler(agent_cls.__name__ + 'Batch')
+        for agent in self.agents:
+            agent.profiler = NULL_PROFILER
+
+    def __len__(self):
+        return len(self.agents)
+
+    def setup(self, obs_spec, action_spec):
+        for agent in self.agents:
+            agent.setup(obs_spec, action_spec)
+
+    def reset(self):
+        for agent in self.agents:
+            agent.reset()
+
+    def step(self, observations):
+        # the batch as a whole is paced by the first agent's pacer
+        self.agents[0].pacer.pace(observations[0])
+
+        profiler = self.profiler
+        profiler.begin()
+
+        try:
+            return self._step(observations)
+        finally:
+            profiler.end()
+
+            if observations[0].last():
+                profiler.dump()
+
+    def _step(self, observations):
+        profiler = self.profiler
+        agents = self.agents
+
+        profiler.phase('observe')
+        frames = [obs.observation['screen'][_UNIT_TYPE] for obs in observations]
+        censuses = UnitCensus.batch(frames)
+
+        # observe() tracks a first frame itself after resetting, and the sparse agent skips the last one
+        tracking = [i for i, obs in enumerate(observations) if not obs.first() and not obs.last()]
+        BuildingTracker.update_batch([agents[i].buildings for i in tracking], [frames[i] for i in tracking])
+
+        calls = [None] * len(agents)
+        deciding = []
+
+        for i, (agent, obs) in enumerate(zip(agents, observations)):
+            calls[i], censuses[i] = agent.observe(obs, censuses[i])
+
+            if calls[i] is None and agent.move_number == 0:
+                deciding.append(i)
+
+        keys = chosen = []
+        if deciding:
+            profiler.phase('state')
+            squares = hot_squares_batch(
+                np.stack([observations[i].observation['minimap'][_PLAYER_RELATIVE] for i in deciding]), self.grid,
+                [agents[i].base_top_left for i in deciding])
+
+            keys = self.encoder.encode_batch([agents[i].state_features(observations[i], censuses[i], squares[j])
+                                              for j, i in enumerate(deciding)]).tolist()
+
+            profiler.phase('learn')
+            for i, key in zip(deciding, keys):
+                agents[i].learn_previous(key)
+
+            profiler.phase('choose_action')
+            chosen = choose_actions(self.qlearn, keys)
+
+        profiler.phase('dispatch')
+        decisions = dict(zip(deciding, zip(keys, chosen)))
+
+        for i, (agent, obs) in enumerate(zip(agents, observations)):
+            if calls[i] is None:
+                calls[i] = agent.act(obs, censuses[i], *decisions.get(i, (None, None)))
+
+        return calls
@@ -1,13 +1,22 @@
 import random
-import math
 
 import numpy as np
-import pandas as pd
 
 from pysc2.agents import base_agent
 from pysc2.lib import actions
 from pysc2.lib import features
 
+from action_registry import ActionRegistry
+from map_context import MapContext
+from minimap_grid import hot_squares
+from pacing import make_pacer, paced_step
+from qlearning_table import QLearningTable
+from state_encoding import StateEncoder, bit_fields
+from step_profiler import make_profiler, profiled_step
+from tile_coding import TileCodingQ
+from transition_log import TransitionRecorder
+from unit_census import UnitCensus
+
 _NO_OP = actions.FUNCTIONS.no_op.id
 _SELECT_POINT = actions.FUNCTIONS.select_point.id
 _BUILD_SUPPLY_DEPOT = actions.FUNCTIONS.Build_SupplyDepot_screen.id
@@ -31,6 +40,9 @@ _TERRAN_BARRACKS = 21
 _NOT_QUEUED = [0]
 _QUEUED = [1]
 
+# enemy presence is tracked on a HOT_SQUARES_GRID x HOT_SQUARES_GRID split of the minimap
+HOT_SQUARES_GRID = 4
+
 ACTION_DO_NOTHING = 'donothing'
 ACTION_SELECT_SCV = 'selectscv'
 ACTION_BUILD_SUPPLY_DEPOT = 'buildsupplydepot'
@@ -40,73 +52,117 @@ ACTION_BUILD_MARINE = 'buildmarine'
 ACTION_SELECT_ARMY = 'selectarmy'
 ACTION_ATTACK = 'attack'
 
-smart_actions = [
-    ACTION_DO_NOTHING,
-    ACTION_SELECT_SCV,
-    ACTION_BUILD_SUPPLY_DEPOT,
-    ACTION_BUILD_BARRACKS,
-    ACTION_SELECT_BARRACKS,
-    ACTION_BUILD_MARINE,
-    ACTION_SELECT_ARMY,
-]
-
-for mm_x in range(0, 64):
-    for mm_y in range(0, 64):
-        if (mm_x + 1) % 16 == 0 and (mm_y + 1) % 16 == 0:
-            smart_actions.append(ACTION_ATTACK + '_' + str(mm_x - 8) + '_' + str(mm_y - 8))
+ACTIONS = ActionRegistry()
+ACTIONS.add(ACTION_DO_NOTHING)
+ACTIONS.add(ACTION_SELECT_SCV)
+ACTIONS.add(ACTION_BUILD_SUPPLY_DEPOT)
+ACTIONS.add(ACTION_BUILD_BARRACKS)
+ACTIONS.add(ACTION_SELECT_BARRACKS)
+ACTIONS.add(ACTION_BUILD_MARINE)
+ACTIONS.add(ACTION_SELECT_ARMY)
+
+ACTIONS.add_grid(ACTION_ATTACK, HOT_SQUARES_GRID)
+
+smart_actions = ACTIONS.names
+
+STATE_ENCODER = StateEncoder([
+    ('supply_depot_count', 1),
+    ('barracks_count', 1),
+    ('supply_limit', 8),
+    ('army_supply', 8),
+] + bit_fields('hot_square', HOT_SQUARES_GRID ** 2))
+
+# tile widths per state field for the tile-coded learner: supply figures generalise over a few units, the
+# building and hot-square flags are kept apart
+TILE_WIDTHS = [1, 1, 8, 4] + [1] * HOT_SQUARES_GRID ** 2
+TILINGS = 8
+TILE_TABLE_SIZE = 1 << 14
 
 KILL_UNIT_REWARD = 0.2
 KILL_BUILDING_REWARD = 0.5
 
 
-# Stolen from https://github.com/MorvanZhou/Reinforcement-learning-with-tensorflow
-class QLearningTable:
-    def __init__(self, actions, learning_rate=0.01, reward_decay=0.9, e_greedy=0.9):
-        self.actions = actions  # a list
-        self.lr = learning_rate
-        self.gamma = reward_decay
-        self.epsilon = e_greedy
-        self.q_table = pd.DataFrame(columns=self.actions, dtype=np.float64)
+@ACTIONS.handler(ACTION_SELECT_SCV)
+def select_scv(agent, obs, census, action):
+    unit_y, unit_x = census.coords(_TERRAN_SCV)
 
-    def choose_action(self, observation):
-        self.check_state_exist(observation)
+    if unit_y.any():
+        i = random.randint(0, len(unit_y) - 1)
+        target = [unit_x[i], unit_y[i]]
 
-        if np.random.uniform() < self.epsilon:
-            # choose best action
-            state_action = self.q_table.ix[observation, :]
+        return actions.FunctionCall(_SELECT_POINT, [_NOT_QUEUED, target])
 
-            # some actions have the same value
-            state_action = state_action.reindex(np.random.permutation(state_action.index))
 
-            action = state_action.idxmax()
-        else:
-            # choose random action
-            action = np.random.choice(self.actions)
+@ACTIONS.handler(ACTION_BUILD_SUPPLY_DEPOT)
+def build_supply_depot(agent, obs, census, action):
+    if _BUILD_SUPPLY_DEPOT in obs.observation['available_actions']:
+        cc = agent.map_context.cc_centroid
+
+        if cc is not None:
+            target = agent.transformDistance(int(cc[0]), 0, int(cc[1]), 20)
+
+            return actions.FunctionCall(_BUILD_SUPPLY_DEPOT, [_NOT_QUEUED, target])
+
+
+@ACTIONS.handler(ACTION_BUILD_BARRACKS)
+def build_barracks(agent, obs, census, action):
+    if _BUILD_BARRACKS in obs.observation['available_actions']:
+        cc = agent.map_context.cc_centroid
 
-        return action
+        if cc is not None:
+            target = agent.transformDistance(int(cc[0]), 20, int(cc[1]), 0)
 
-    def learn(self, s, a, r, s_):
-        self.check_state_exist(s_)
-        self.check_state_exist(s)
+            return actions.FunctionCall(_BUILD_BARRACKS, [_NOT_QUEUED, target])
 
-        q_predict = self.q_table.ix[s, a]
-        q_target = r + self.gamma * self.q_table.ix[s_, :].max()
 
-        # update
-        self.q_table.ix[s, a] += self.lr * (q_target - q_predict)
+@ACTIONS.handler(ACTION_SELECT_BARRACKS)
+def select_barracks(agent, obs, census, action):
+    unit_y, unit_x = census.coords(_TERRAN_BARRACKS)
 
-    def check_state_exist(self, state):
-        if state not in self.q_table.index:
-            # append new state to q table
-            self.q_table = self.q_table.append(
-                pd.Series([0] * len(self.actions), index=self.q_table.columns, name=state))
+    if unit_y.any():
+        target = [int(unit_x.mean()), int(unit_y.mean())]
+
+        return actions.FunctionCall(_SELECT_POINT, [_NOT_QUEUED, target])
+
+
+@ACTIONS.handler(ACTION_BUILD_MARINE)
+def train_marine(agent, obs, census, action):
+    if _TRAIN_MARINE in obs.observation['available_actions']:
+        return actions.FunctionCall(_TRAIN_MARINE, [_QUEUED])
+
+
+@ACTIONS.handler(ACTION_SELECT_ARMY)
+def select_army(agent, obs, census, action):
+    if _SELECT_ARMY in obs.observation['available_actions']:
+        return actions.FunctionCall(_SELECT_ARMY, [_NOT_QUEUED])
+
+
+@ACTIONS.handler(ACTION_ATTACK)
+def attack(agent, obs, census, action):
+    # single_select is empty when nothing, or a group, is selected
+    single_select = obs.observation['single_select']
+
+    if (len(single_select) == 0 or single_select[0][0] != _TERRAN_SCV) and _ATTACK_MINIMAP in obs.observation[
+            "available_actions"]:
+        return actions.FunctionCall(_ATTACK_MINIMAP, [_NOT_QUEUED, agent.transformLocation(action.x, action.y)])
 
 
 class AttackAgent(base_agent.BaseAgent):
-    def __init__(self):
+    def __init__(self, record_path=None, exploration=None, tabular=False, pacing=None):
         super(AttackAgent, self).__init__()
 
-        self.qlearn = QLearningTable(actions=list(range(len(smart_actions))))
+        # the raw state has unbounded supply counts and 16 flags, so by default Q-values are tile-coded into a
+        # fixed-size weight table; tabular=True keeps one Q-table row per distinct state instead
+        if tabular:
+            self.qlearn = QLearningTable(actions=list(range(len(smart_actions))), exploration=exploration)
+        else:
+            self.qlearn = TileCodingQ(list(range(len(smart_actions))), STATE_ENCODER, TILE_WIDTHS, tilings=TILINGS,
+                                      size=TILE_TABLE_SIZE, exploration=exploration)
+
+        # every transition learned from is also appended here, for offline_trainer.py
+        self.recorder = None
+        if record_path is not None:
+            self.recorder = TransitionRecorder(record_path, self.qlearn.actions, agent=type(self).__name__)
 
         self.previous_killed_unit_score = 0
         self.previous_killed_building_score = 0
@@ -114,6 +170,10 @@ class AttackAgent(base_agent.BaseAgent):
         self.previous_action = None
         self.previous_state = None
 
+        self.profiler = make_profiler(type(self).__name__)
+        self.pacer = make_pacer(pacing)
+        self.map_context = MapContext()
+
     def transformDistance(self, x, x_distance, y, y_distance):
         if not self.base_top_left:
             return [x - x_distance, y - y_distance]
@@ -126,18 +186,19 @@ class AttackAgent(base_agent.BaseAgent):
 
         return [x, y]
 
+    @paced_step
+    @profiled_step
     def step(self, obs):
         super(AttackAgent, self).step(obs)
 
-        player_y, player_x = (obs.observation['minimap'][_PLAYER_RELATIVE] == _PLAYER_SELF).nonzero()
-        self.base_top_left = 1 if player_y.any() and player_y.mean() <= 31 else 0
-
-        unit_type = obs.observation['screen'][_UNIT_TYPE]
+        self.profiler.phase('features')
+        census = UnitCensus(obs.observation['screen'][_UNIT_TYPE])
+        self.base_top_left = self.map_context.update(obs, census).base_top_left
 
-        depot_y, depot_x = (unit_type == _TERRAN_SUPPLY_DEPOT).nonzero()
+        depot_y, depot_x = census.coords(_TERRAN_SUPPLY_DEPOT)
         supply_depot_count = supply_depot_count = 1 if depot_y.any() else 0
 
-        barracks_y, barracks_x = (unit_type == _TERRAN_BARRACKS).nonzero()
+        barracks_y, barracks_x = census.coords(_TERRAN_BARRACKS)
         barracks_count = 1 if barracks_y.any() else 0
 
         supply_limit = obs.observation['player'][4]
@@ -146,26 +207,19 @@ class AttackAgent(base_agent.BaseAgent):
         killed_unit_score = obs.observation['score_cumulative'][5]
         killed_building_score = obs.observation['score_cumulative'][6]
 
-        current_state = np.zeros(20)
+        self.profiler.phase('state')
+        current_state = np.zeros(4 + HOT_SQUARES_GRID ** 2)
         current_state[0] = supply_depot_count
         current_state[1] = barracks_count
         current_state[2] = supply_limit
         current_state[3] = army_supply
 
-        hot_squares = np.zeros(16)
-        enemy_y, enemy_x = (obs.observation['minimap'][_PLAYER_RELATIVE] == _PLAYER_HOSTILE).nonzero()
-        for i in range(0, len(enemy_y)):
-            y = int(math.ceil((enemy_y[i] + 1) / 16))
-            x = int(math.ceil((enemy_x[i] + 1) / 16))
-
-            hot_squares[((y - 1) * 4) + (x - 1)] = 1
+        current_state[4:] = hot_squares(obs.observation['minimap'][_PLAYER_RELATIVE], HOT_SQUARES_GRID,
+                                        self.base_top_left)
 
-        if not self.base_top_left:
-            hot_squares = hot_squares[::-1]
-
-        for i in range(0, 16):
-            current_state[i + 4] = hot_squares[i]
+        current_key = STATE_ENCODER.encode(current_state)
 
+        self.profiler.phase('learn')
         if self.previous_action is not None:
             reward = 0
 
@@ -175,74 +229,23 @@ class AttackAgent(base_agent.BaseAgent):
             if killed_building_score > self.previous_killed_building_score:
                 reward += KILL_BUILDING_REWARD
 
-            self.qlearn.learn(str(self.previous_state), self.previous_action, reward, str(current_state))
+            self.qlearn.learn(self.previous_state, self.previous_action, reward, current_key)
+
+            if self.recorder is not None:
+                self.recorder.append(self.previous_state, self.previous_action, reward, current_key)
 
-        rl_action = self.qlearn.choose_action(str(current_state))
-        smart_action = smart_actions[rl_action]
+        self.profiler.phase('choose_action')
+        rl_action = self.qlearn.choose_action(current_key)
 
         self.previous_killed_unit_score = killed_unit_score
         self.previous_killed_building_score = killed_building_score
-        self.previous_state = current_state
+        self.previous_state = current_key
         self.previous_action = rl_action
 
-        x = 0
-        y = 0
-        if '_' in smart_action:
-            smart_action, x, y = smart_action.split('_')
-
-        if smart_action == ACTION_DO_NOTHING:
-            return actions.FunctionCall(_NO_OP, [])
-
-        elif smart_action == ACTION_SELECT_SCV:
-            unit_type = obs.observation['screen'][_UNIT_TYPE]
-            unit_y, unit_x = (unit_type == _TERRAN_SCV).nonzero()
-
-            if unit_y.any():
-                i = random.randint(0, len(unit_y) - 1)
-                target = [unit_x[i], unit_y[i]]
-
-                return actions.FunctionCall(_SELECT_POINT, [_NOT_QUEUED, target])
-
-        elif smart_action == ACTION_BUILD_SUPPLY_DEPOT:
-            if _BUILD_SUPPLY_DEPOT in obs.observation['available_actions']:
-                unit_type = obs.observation['screen'][_UNIT_TYPE]
-                unit_y, unit_x = (unit_type == _TERRAN_COMMANDCENTER).nonzero()
-
-                if unit_y.any():
-                    target = self.transformDistance(int(unit_x.mean()), 0, int(unit_y.mean()), 20)
-
-                    return actions.FunctionCall(_BUILD_SUPPLY_DEPOT, [_NOT_QUEUED, target])
-
-        elif smart_action == ACTION_BUILD_BARRACKS:
-            if _BUILD_BARRACKS in obs.observation['available_actions']:
-                unit_type = obs.observation['screen'][_UNIT_TYPE]
-                unit_y, unit_x = (unit_type == _TERRAN_COMMANDCENTER).nonzero()
-
-                if unit_y.any():
-                    target = self.transformDistance(int(unit_x.mean()), 20, int(unit_y.mean()), 0)
-
-                    return actions.FunctionCall(_BUILD_BARRACKS, [_NOT_QUEUED, target])
-
-        elif smart_action == ACTION_SELECT_BARRACKS:
-            unit_type = obs.observation['screen'][_UNIT_TYPE]
-            unit_y, unit_x = (unit_type == _TERRAN_BARRACKS).nonzero()
-
-            if unit_y.any():
-                target = [int(unit_x.mean()), int(unit_y.mean())]
-
-                return actions.FunctionCall(_SELECT_POINT, [_NOT_QUEUED, target])
-
-        elif smart_action == ACTION_BUILD_MARINE:
-            if _TRAIN_MARINE in obs.observation['available_actions']:
-                return actions.FunctionCall(_TRAIN_MARINE, [_QUEUED])
-
-        elif smart_action == ACTION_SELECT_ARMY:
-            if _SELECT_ARMY in obs.observation['available_actions']:
-                return actions.FunctionCall(_SELECT_ARMY, [_NOT_QUEUED])
+        self.profiler.phase('dispatch')
 
-        elif smart_action == ACTION_ATTACK:
-            if obs.observation['single_select'][0][0] != _TERRAN_SCV and _ATTACK_MINIMAP in obs.observation[
-                "available_actions"]:
-                return actions.FunctionCall(_ATTACK_MINIMAP, [_NOT_QUEUED, self.transformLocation(int(x), int(y))])
+        call = ACTIONS.dispatch(self, 0, rl_action, obs, census)
+        if call is not None:
+            return call
 
         return actions.FunctionCall(_NO_OP, [])
\ No newline at end of file
@@ -0,0 +1,139 @@
+import argparse
+import importlib
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from synthetic_env import SyntheticEnv  # installs the pysc2 stand-in when the real package is missing
+
+AGENTS = [
+    'simple_agent:SimpleAgent',
+    'smart_agent:SmartAgent',
+    'attack_agent:AttackAgent',
+    'sparse_agent:SparseAgent',
+    'bm_agent:BMAgent',
+]
+
+# checkpoints the agents load at start, copied next to them so their tables are realistically sized
+DATA_FILES = ['sparse_agent_data.gz', 'bm_agent_data.gz']
+
+
+def play(agent, env, episodes, on_step):
+    # run_loop.run_episode with a hook around each agent.step call
+    agent.setup(env.observation_spec(), env.action_spec())
+
+    try:
+        for _ in range(episodes):
+            agent.reset()
+            timestep = env.reset()[0]
+
+            while True:
+                call = on_step(agent, timestep)
+                if timestep.last():
+                    break
+
+                timestep = env.step([call])[0]
+    finally:
+        # finish background checkpoint writes while still in the agent's working directory
+        if getattr(agent, 'checkpoint', None) is not None:
+            agent.checkpoint.close()
+
+
+# the agents are built with pacing='off' (see pacing.py), so the time they would sleep to keep pace is not measured
+
+def measure_latency(agent_cls, episodes, episode_steps, seed):
+    latencies = []
+
+    def on_step(agent, timestep):
+        start = time.perf_counter()
+        call = agent.step(timestep)
+        latencies.append(time.perf_counter() - start)
+        return call
+
+    random.seed(seed)
+    np.random.seed(seed)
+    play(agent_cls(pacing='off'), SyntheticEnv(episode_steps=episode_steps, seed=seed), episodes, on_step)
+
+    return np.array(latencies) * 1e6
+
+
+def measure_allocations(agent_cls, episodes, episode_steps, seed):
+    # per step: peak bytes allocated above what was live before the step, and bytes still live after it
+    peaks = []
+    retained = []
+
+    def on_step(agent, timestep):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+        call = agent.step(timestep)
+
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(current - before)
+        return call
+
+    random.seed(seed)
+    np.random.seed(seed)
+    agent = agent_cls(pacing='off')
+    env = SyntheticEnv(episode_steps=episode_steps, seed=seed)
+
+    tracemalloc.start()
+    try:
+        play(agent, env, episodes, on_step)
+    finally:
+        tracemalloc.stop()
+
+    return np.array(peaks), np.array(retained)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time agent step() calls against the synthetic environment.')
+    parser.add_argument('--agents', nargs='+', default=AGENTS, help='module:Class specs')
+    parser.add_argument('--episodes', type=int, default=2)
+    parser.add_argument('--episode-steps', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-allocations', action='store_true', help='skip the (slower) tracemalloc pass')
+    args = parser.parse_args()
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    cwd = os.getcwd()
+
+    print('%-28s %8s %10s %10s %10s %12s %12s' % ('agent', 'steps', 'p50 (us)', 'p99 (us)', 'max (us)',
+                                                  'peak (KB)', 'kept (B)'))
+
+    for spec in args.agents:
+        module, name = spec.split(':')
+
+        # agents read and write their checkpoints in the working directory; keep those out of the repo
+        with tempfile.TemporaryDirectory() as directory:
+            for data_file in DATA_FILES:
+                shutil.copy(os.path.join(repo, data_file), directory)
+
+            os.chdir(directory)
+            try:
+                agent_cls = getattr(importlib.import_module(module), name)
+                latencies = measure_latency(agent_cls, args.episodes, args.episode_steps, args.seed)
+
+                peak = kept = float('nan')
+                if not args.no_allocations:
+                    peaks, retained = measure_allocations(agent_cls, args.episodes, args.episode_steps, args.seed)
+                    peak, kept = np.mean(peaks) / 1024.0, np.mean(retained)
+            except Exception as e:
+                print('%-28s failed: %s: %s' % (name, type(e).__name__, e))
+                continue
+            finally:
+                os.chdir(cwd)
+
+        print('%-28s %8d %10.1f %10.1f %10.1f %12.1f %12.1f' % (
+            name, len(latencies), np.percentile(latencies, 50), np.percentile(latencies, 99), latencies.max(),
+            peak, kept))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# only the standard library up here: the child process times every other import itself
+
+AGENTS = [
+    'sparse_agent:SparseAgent',
+    'bm_agent:BMAgent',
+]
+
+# legacy: training, starting from the .gz pickle checkpoint (unpickles a DataFrame, so imports pandas)
+# native: training, starting from the same table converted to a native .qtab file
+# inference: playing the .qtab through policy=, without learning or checkpointing (see inference.py)
+MODES = ['legacy', 'native', 'inference']
+
+
+def rss_mb():
+    # current resident set size, or the peak where /proc is not available
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def child(spec, mode):
+    # runs in a fresh interpreter whose working directory holds the agent's checkpoint
+    start = time.perf_counter()
+    import synthetic_env  # noqa: F401 -- pysc2 and numpy, or the pysc2 stand-in when the real package is missing
+    pysc2_done = time.perf_counter()
+    base_rss = rss_mb()
+
+    import importlib
+    module_name, name = spec.split(':')
+    module = importlib.import_module(module_name)
+    import_done = time.perf_counter()
+
+    kwargs = {'policy': module.DATA_FILE + '.qtab'} if mode == 'inference' else {}
+    agent = getattr(module, name)(**kwargs)
+    init_done = time.perf_counter()
+
+    result = {'pysc2': pysc2_done - start, 'import': import_done - pysc2_done, 'init': init_done - import_done,
+              'base_rss': base_rss, 'rss': rss_mb(), 'states': agent.qlearn.n_states, 'pandas': 'pandas' in sys.modules}
+
+    if agent.checkpoint is not None:
+        agent.checkpoint.close()
+
+    print(json.dumps(result))
+
+
+def prepare(directory, repo, spec, mode):
+    import importlib
+    import synthetic_env  # noqa: F401
+    from qtable_format import convert_pickle
+
+    module = importlib.import_module(spec.split(':')[0])
+    legacy = os.path.join(repo, module.DATA_FILE + '.gz')
+
+    if mode == 'legacy':
+        shutil.copy(legacy, directory)
+        return
+
+    # converting the pickle needs pandas, but only here in the parent
+    convert_pickle(legacy, os.path.join(directory, module.DATA_FILE + '.qtab'), module.STATE_ENCODER.migrate_key)
+
+
+def measure(repo, spec, mode, repeat):
+    runs = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        prepare(directory, repo, spec, mode)
+
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [repo, os.environ.get('PYTHONPATH')])))
+        env.pop('BMBOT_POLICY', None)
+
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, os.path.join(repo, 'bench_startup.py'), '--child', spec, mode],
+                                    cwd=directory, env=env, check=True, stdout=subprocess.PIPE,
+                                    universal_newlines=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    return {key: statistics.median(run[key] for run in runs) if key != 'pandas' else runs[-1][key]
+            for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time agent imports and construction, and their resident memory, '
+                                                 'each in a fresh process.')
+    parser.add_argument('--agents', nargs='+', default=AGENTS, help='module:Class specs')
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--repeat', type=int, default=3, help='processes per agent and mode; medians are shown')
+    parser.add_argument('--child', nargs=2, metavar=('SPEC', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+
+    print('%-14s %-10s %11s %11s %11s %11s %11s %9s %7s' % ('agent', 'mode', 'pysc2 (ms)', 'import (ms)', 'init (ms)',
+                                                           'base (MB)', 'RSS (MB)', 'states', 'pandas'))
+
+    for spec in args.agents:
+        name = spec.split(':')[1]
+
+        for mode in args.modes:
+            try:
+                result = measure(repo, spec, mode, args.repeat)
+            except (subprocess.CalledProcessError, ValueError) as e:
+                print('%-14s %-10s failed: %s' % (name, mode, e))
+                continue
+
+            print('%-14s %-10s %11.1f %11.1f %11.1f %11.1f %11.1f %9d %7s' % (
+                name, mode, result['pysc2'] * 1e3, result['import'] * 1e3, result['init'] * 1e3, result['base_rss'],
+                result['rss'], result['states'], 'yes' if result['pandas'] else 'no'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import bz2
+import lzma
+import os
+import pickle
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+from qlearning_table import make_dataframe, read_table, write_table
+from qtable_format import QTableFile, write_qtable
+
+
+def make_table(n_states, n_actions, seed=0):
+    rng = np.random.RandomState(seed)
+
+    keys = np.unique(rng.randint(0, 1 << 40, int(n_states * 1.1), dtype=np.int64))[:n_states]
+    rng.shuffle(keys)
+
+    # most Q-values of a real table are still at their initial 0
+    values = rng.randn(len(keys), n_actions) * 0.1
+    values[rng.uniform(size=values.shape) < 0.7] = 0.0
+
+    return keys, values
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    result = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+
+def codec_format(compress, decompress):
+    def write(path, actions, keys, values):
+        with open(path, 'wb') as f:
+            f.write(compress(pickle.dumps(make_dataframe(actions, keys.tolist(), values), pickle.HIGHEST_PROTOCOL)))
+
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.loads(decompress(f.read()))
+
+    return write, load
+
+
+def native_open(path):
+    table = QTableFile(path)
+    table.lookup(int(table.keys[len(table) // 2]))  # first lookup touches the pages it needs
+
+    return table
+
+
+FORMATS = [
+    ('gzip pickle (current)', lambda path, a, k, v: write_table(path, a, k.tolist(), v), read_table, '.gz'),
+    ('pickle + zlib', ) + codec_format(zlib.compress, zlib.decompress) + ('.zlib', ),
+    ('pickle + bz2', ) + codec_format(bz2.compress, bz2.decompress) + ('.bz2', ),
+    ('pickle + lzma', ) + codec_format(lzma.compress, lzma.decompress) + ('.xz', ),
+    ('native, full read', write_qtable, lambda path: QTableFile(path, mmap=False), '.qtab'),
+    ('native, mmap + lookup', write_qtable, native_open, '.qtab'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Q-table checkpoint formats: size, write and load time.')
+    parser.add_argument('--states', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--actions', type=int, default=13)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    actions = list(range(args.actions))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for n_states in args.states:
+            keys, values = make_table(n_states, args.actions)
+
+            print('%d states x %d actions' % (len(keys), args.actions))
+            print('  %-24s %12s %12s %12s' % ('format', 'size (KB)', 'write (ms)', 'load (ms)'))
+
+            for name, write, load, ext in FORMATS:
+                path = os.path.join(directory, 'table' + ext)
+
+                write_time, _ = timed(lambda: write(path, actions, keys, values), args.repeat)
+                load_time, _ = timed(lambda: load(path), args.repeat)
+
+                print('  %-24s %12.1f %12.2f %12.2f' % (name, os.path.getsize(path) / 1024.0, write_time * 1000,
+                                                       load_time * 1000))
+
+            print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+import numpy as np
+
+_TILE = 16
+
+
+def label_components(types, mask):
+    """Labels the 4-connected components of equal-type pixels where mask is set; 0 elsewhere.
+
+    Labels start out as each pixel's flat index + 1 and settle on the smallest index of their component: every
+    round takes the minimum over same-type neighbours, then jumps each label to the label of the pixel it names.
+    """
+    height, width = mask.shape
+    labels = np.where(mask, np.arange(1, height * width + 1).reshape(height, width), 0)
+
+    vertical = mask[1:] & mask[:-1] & (types[1:] == types[:-1])
+    horizontal = mask[:, 1:] & mask[:, :-1] & (types[:, 1:] == types[:, :-1])
+
+    while True:
+        previous = labels
+        labels = labels.copy()
+
+        below, above = labels[1:], labels[:-1]
+        np.minimum(below, np.where(vertical, previous[:-1], below), out=below)
+        np.minimum(above, np.where(vertical, previous[1:], above), out=above)
+
+        right, left = labels[:, 1:], labels[:, :-1]
+        np.minimum(right, np.where(horizontal, previous[:, :-1], right), out=right)
+        np.minimum(left, np.where(horizontal, previous[:, 1:], left), out=left)
+
+        flat = labels.reshape(-1)
+        labels = np.where(mask, flat[np.maximum(labels, 1) - 1].reshape(height, width), 0)
+
+        if np.array_equal(labels, previous):
+            return labels
+
+
+class BuildingTracker:
+    """Instances of the building types on the screen's unit_type layer, kept up to date from frame diffs.
+
+    `footprints` maps each tracked unit type to the pixel area of one building. Every connected blob of a type
+    is a component; touching buildings of the same type merge into one blob, which is split back into
+    round(area / footprint) instances (at least one, so a building cut off by the screen edge still counts).
+
+    `update` only looks at pixels whose unit type changed and involve a tracked type. The changed pixels are
+    grouped into tiles, each group's window is grown to cover every component it touches, and only those windows
+    are relabelled, so a frame where no building appeared, grew or vanished costs one array comparison.
+    """
+
+    def __init__(self, footprints):
+        self.footprints = dict(footprints)
+        self.types = np.array(sorted(self.footprints), dtype=np.int64)
+
+        # unit type -> tracked, with one last False entry that every larger type is clipped to
+        self._tracked = np.zeros(self.types.max() + 2, dtype=bool)
+        self._tracked[self.types] = True
+
+        # instances by unit type; only ever updated in place, so callers can hold on to it
+        self.counts = dict.fromkeys(self.footprints, 0)
+
+        self.reset()
+
+    def reset(self):
+        # forgets the previous frame, so the next update labels the whole screen
+        self.frame = None
+        self.labels = None  # component id per pixel, 0 if not a tracked building
+        self.components = {}  # id -> (type, instances, area, centroid x, centroid y, y0, y1, x0, x1)
+        self.counts.update(dict.fromkeys(self.footprints, 0))
+        self._next_id = 1
+
+    def count(self, unit_type):
+        return self.counts[unit_type]
+
+    def centroids(self, unit_type):
+        # [x, y] of each blob of unit_type
+        return [[c[3], c[4]] for c in self.components.values() if c[0] == unit_type]
+
+    def _tracked_pixels(self, unit_types):
+        # np.isin(unit_types, self.types), as a table lookup
+        return self._tracked[np.minimum(unit_types, len(self._tracked) - 1)]
+
+    def update(self, unit_type):
+        return self.update_batch([self], [unit_type])[0]
+
+    @staticmethod
+    def update_batch(trackers, unit_types):
+        # update() for several trackers, e.g. one per environment of an AgentBatch: the changed windows of all of
+        # them are labelled together, in one label_components call
+        jobs = []
+        for tracker, unit_type in zip(trackers, unit_types):
+            jobs.extend((tracker, ) + window for window in tracker._changed_windows(unit_type))
+
+        if jobs:
+            _relabel(jobs)
+
+        return trackers
+
+    def _changed_windows(self, unit_type):
+        # takes in the new frame; returns the disjoint windows to relabel, each covering whole components
+        if self.frame is None or self.frame.shape != unit_type.shape:
+            self.frame = np.array(unit_type)
+            self.labels = np.zeros(unit_type.shape, dtype=np.int64)
+            self.components = {}
+            self.counts.update(dict.fromkeys(self.footprints, 0))
+
+            return [(0, unit_type.shape[0], 0, unit_type.shape[1])]
+
+        changed = np.flatnonzero(self.frame != unit_type)
+        if not len(changed):
+            return []
+
+        before = self.frame.reshape(-1)[changed]
+        after = unit_type.reshape(-1)[changed]
+        changed = changed[self._tracked_pixels(before) | self._tracked_pixels(after)]
+
+        self.frame[...] = unit_type
+        if not len(changed):
+            return []
+
+        width = unit_type.shape[1]
+        windows = [self._grow(*window) for window in self._windows(changed // width, changed % width)]
+
+        # grown windows can overlap; merge those that do (and grow the merged ones) until they are disjoint
+        while True:
+            merged = _merge(windows)
+            if len(merged) == len(windows):
+                return windows
+
+            windows = [self._grow(*window) for window in merged]
+
+    def _windows(self, ys, xs):
+        # bounding boxes of 8-connected groups of the tiles holding changed pixels
+        tiles = set(zip((ys // _TILE).tolist(), (xs // _TILE).tolist()))
+        height, width = self.frame.shape
+
+        while tiles:
+            group = [tiles.pop()]
+            stack = list(group)
+
+            while stack:
+                ty, tx = stack.pop()
+                for neighbour in [(ty + dy, tx + dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]:
+                    if neighbour in tiles:
+                        tiles.remove(neighbour)
+                        group.append(neighbour)
+                        stack.append(neighbour)
+
+            tile_ys, tile_xs = zip(*group)
+            yield (min(tile_ys) * _TILE, min(height, (max(tile_ys) + 1) * _TILE),
+                   min(tile_xs) * _TILE, min(width, (max(tile_xs) + 1) * _TILE))
+
+    def _grow(self, y0, y1, x0, x1):
+        # widens the window until every component inside it or touching its edge lies completely inside
+        while True:
+            border = self.labels[max(0, y0 - 1):y1 + 1, max(0, x0 - 1):x1 + 1]
+            grown = (y0, y1, x0, x1)
+
+            for component_id in np.unique(border[border > 0]).tolist():
+                c = self.components[component_id]
+                grown = (min(grown[0], c[5]), max(grown[1], c[6]), min(grown[2], c[7]), max(grown[3], c[8]))
+
+            if grown == (y0, y1, x0, x1):
+                return y0, y1, x0, x1
+
+            y0, y1, x0, x1 = grown
+
+
+def _merge(windows):
+    # unions of the overlapping (y0, y1, x0, x1) windows, in the order of their first window
+    merged = []
+
+    for window in windows:
+        y0, y1, x0, x1 = window
+        i = 0
+
+        while i < len(merged):
+            m = merged[i]
+            if y0 < m[1] and m[0] < y1 and x0 < m[3] and m[2] < x1:
+                y0, y1, x0, x1 = min(y0, m[0]), max(y1, m[1]), min(x0, m[2]), max(x1, m[3])
+                merged.pop(i)
+                i = 0
+            else:
+                i += 1
+
+        merged.append((y0, y1, x0, x1))
+
+    return merged
+
+
+def _relabel(jobs):
+    # relabels every (tracker, y0, y1, x0, x1) window: their components are dropped and labelled anew, all windows
+    # at once on a mosaic that stacks them top to bottom with a blank row between, so none touch
+    for tracker, y0, y1, x0, x1 in jobs:
+        labels = tracker.labels[y0:y1, x0:x1]
+
+        for component_id in np.unique(labels[labels > 0]).tolist():
+            c = tracker.components.pop(component_id)
+            tracker.counts[c[0]] -= c[1]
+
+        labels[...] = 0
+
+    heights = np.array([y1 - y0 for _, y0, y1, _, _ in jobs])
+    tops = np.concatenate([[0], np.cumsum(heights + 1)[:-1]])
+    width = max(x1 - x0 for _, _, _, x0, x1 in jobs)
+
+    types = np.zeros((int(tops[-1] + heights[-1]), width), dtype=np.int64)
+    mask = np.zeros(types.shape, dtype=bool)
+    for (tracker, y0, y1, x0, x1), top in zip(jobs, tops.tolist()):
+        window = tracker.frame[y0:y1, x0:x1]
+        types[top:top + y1 - y0, :x1 - x0] = window
+        mask[top:top + y1 - y0, :x1 - x0] = tracker._tracked_pixels(window)
+
+    if not mask.any():
+        return
+
+    mosaic_labels = label_components(types, mask)
+
+    # components in order of their first pixel, so by window and then as a window on its own would order them
+    pixels = np.flatnonzero(mask)
+    roots, inverse, areas = np.unique(mosaic_labels.reshape(-1)[pixels], return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    # rows and columns within each pixel's own window, as a window labelled on its own would have them
+    pixel_jobs = np.repeat(np.arange(len(jobs)), heights + 1)[pixels // width]
+    ys, xs = pixels // width - tops[pixel_jobs], pixels % width
+
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(areas)[:-1]])
+    component_types = types.reshape(-1)[pixels[order[starts]]]
+    sum_y = np.bincount(inverse, weights=ys)
+    sum_x = np.bincount(inverse, weights=xs)
+    min_y, max_y = np.minimum.reduceat(ys[order], starts), np.maximum.reduceat(ys[order], starts)
+    min_x, max_x = np.minimum.reduceat(xs[order], starts), np.maximum.reduceat(xs[order], starts)
+    component_jobs = pixel_jobs[order[starts]]
+
+    ids = np.zeros(len(roots), dtype=np.int64)
+    for i, j in enumerate(component_jobs.tolist()):
+        tracker, y0, _, x0, _ = jobs[j]
+        unit_type, area = int(component_types[i]), int(areas[i])
+        instances = max(1, int(round(area / float(tracker.footprints[unit_type]))))
+
+        component_id = ids[i] = tracker._next_id
+        tracker._next_id += 1
+
+        tracker.components[component_id] = (unit_type, instances, area, x0 + sum_x[i] / area, y0 + sum_y[i] / area,
+                                            y0 + int(min_y[i]), y0 + int(max_y[i]) + 1,
+                                            x0 + int(min_x[i]), x0 + int(max_x[i]) + 1)
+        tracker.counts[unit_type] += instances
+
+    id_map = np.zeros(types.shape, dtype=np.int64)
+    id_map.reshape(-1)[pixels] = ids[inverse]
+    for (tracker, y0, y1, x0, x1), top in zip(jobs, tops.tolist()):
+        tracker.labels[y0:y1, x0:x1] = id_map[top:top + y1 - y0, :x1 - x0]
@@ -0,0 +1,204 @@
+import atexit
+import glob
+import os
+import queue
+import threading
+import time
+
+from qlearning_table import merge_rows, write_table
+from qtable_format import QTableFile, write_qtable
+
+_DELTA_FORMAT = '%s.delta.%08d'
+
+
+class Checkpointer:
+    """Saves a QLearningTable in the background as full snapshots plus delta segments of the rows that changed.
+
+    Every save copies what it needs on the calling thread (the changed rows for a delta, the in-memory rows for
+    a snapshot) and hands the copy to a single writer thread, so `step` never waits on compression or disk. Each
+    file is written to a temporary name and renamed into place. A snapshot records the sequence number of the first
+    delta segment it does not include; `restore` loads the snapshot and replays the newer segments on top of it.
+    Once a native snapshot is on disk the table is rebased onto it, releasing the spill file of evicted rows it
+    includes.
+    """
+
+    def __init__(self, table, path, every_steps=None, every_seconds=None, snapshot_every=10, migrate=None,
+                 legacy_path=None):
+        self.table = table
+        self.path = path
+        self.legacy_path = legacy_path  # older checkpoint to start from when `path` does not exist yet
+        self.every_steps = every_steps
+        self.every_seconds = every_seconds
+        self.snapshot_every = snapshot_every
+        self.migrate = migrate  # called on the table after loading a snapshot, before deltas are replayed
+
+        self._steps = 0
+        self._last_save = time.time()
+        self._saves = 0
+        self._sequence = 0
+        self._snapshot_due = False
+        self._error = None
+
+        self._queue = queue.Queue()
+        self._rebases = queue.Queue()  # (QTableFile, table.spill it includes) of written snapshots, for the main thread
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+
+        atexit.register(self.close)
+
+    def _segments(self):
+        segments = []
+
+        for path in glob.glob(glob.escape(self.path) + '.delta.*'):
+            suffix = path.rsplit('.', 1)[1]
+            if suffix.isdigit():
+                segments.append((int(suffix), path))
+
+        return sorted(segments)
+
+    def restore(self):
+        restored = False
+        sequence = 0
+
+        if os.path.isfile(self.path):
+            attrs = self.table.load(self.path)
+            sequence = attrs.get('delta_sequence', 0)
+            restored = True
+
+            # old checkpoints predate the delta log, rewrite them in full on the first save
+            self._snapshot_due = 'delta_sequence' not in attrs
+        elif self.legacy_path and os.path.isfile(self.legacy_path):
+            self.table.load(self.legacy_path)
+            restored = True
+            self._snapshot_due = True
+
+        if restored and self.migrate is not None:
+            self.migrate(self.table)
+
+        for number, path in self._segments():
+            if number < sequence:
+                os.remove(path)  # already folded into the snapshot
+                continue
+
+            segment = QTableFile(path, mmap=False)
+            self.table.update_rows(segment.keys.tolist(), segment.values, segment.arrays)
+            sequence = number + 1
+            restored = True
+
+        self._sequence = sequence
+        self.table.dirty.clear()
+
+        return restored
+
+    def tick(self):
+        # call once per agent step; saves when the step or time cadence is due
+        self._steps += 1
+
+        if self.every_steps and self._steps >= self.every_steps:
+            self.save()
+        elif self.every_seconds and time.time() - self._last_save >= self.every_seconds:
+            self.save()
+
+    def save(self, snapshot=False):
+        self._raise_error()
+        self._rebase()
+
+        self._steps = 0
+        self._last_save = time.time()
+        self._saves += 1
+
+        if snapshot or self._snapshot_due or self._saves % self.snapshot_every == 0:
+            self._snapshot_due = False
+            self._save_snapshot()
+        else:
+            self._save_delta()
+
+    def _save_delta(self):
+        table = self.table
+
+        states = [state for state in table.dirty if state in table.state_index or table.is_spilled(state)]
+        table.dirty.clear()
+        if not states:
+            return
+
+        values, counters = table.copy_rows(states)
+
+        self._queue.put((self._write_delta, (_DELTA_FORMAT % (self.path, self._sequence), list(table.actions),
+                                             states, values, counters)))
+        self._sequence += 1
+
+    def _save_snapshot(self):
+        table = self.table
+
+        states, values, counters = table.saved_rows()
+        spill = table.spill
+        table.dirty.clear()
+
+        # rows of a memory-mapped base file are merged in on the writer thread
+        self._queue.put((self._write_snapshot, (list(table.actions), table.base, states, values, counters,
+                                                self._sequence, spill)))
+
+    def _write_delta(self, path, actions, states, values, counters):
+        tmp = path + '.tmp'
+
+        write_qtable(tmp, actions, states, values, arrays=counters)
+        os.replace(tmp, path)
+
+    def _write_snapshot(self, actions, base, states, values, counters, sequence, spill):
+        root, ext = os.path.splitext(self.path)
+        tmp = root + '.tmp' + ext  # keeps the extension, which picks the file format
+
+        write_table(tmp, actions, *merge_rows(base, states, values, counters), delta_sequence=sequence)
+        os.replace(tmp, self.path)
+
+        if not self.path.endswith('.gz'):
+            self._rebases.put((QTableFile(self.path), spill))
+
+        for number, path in self._segments():
+            if number < sequence:
+                os.remove(path)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+
+            try:
+                if job is None:
+                    return
+
+                fn, args = job
+                fn(*args)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _rebase(self):
+        # on the main thread: moves the table onto the newest snapshot written since the last call
+        while True:
+            try:
+                base, spill = self._rebases.get_nowait()
+            except queue.Empty:
+                return
+
+            if list(base.actions) == list(self.table.actions):
+                self.table.rebase(base, spill)
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def flush(self):
+        # blocks until every queued save is on disk
+        self._queue.join()
+        self._raise_error()
+        self._rebase()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+        atexit.unregister(self.close)
+        self._raise_error()
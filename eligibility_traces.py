@@ -0,0 +1,71 @@
+import numpy as np
+
+# traces that have decayed below this are dropped, so only the last few dozen visits are ever updated
+TRACE_CUTOFF = 0.01
+
+
+class EligibilityTraces:
+    """Sparse replacing eligibility traces for Watkins Q(lambda): one entry per (row, column) visited since the
+    traces were last cut, in parallel arrays that double when full, plus a dict finding a pair's slot.
+    """
+
+    def __init__(self, capacity=64, cutoff=TRACE_CUTOFF):
+        self.rows = np.zeros(max(1, capacity), dtype=np.int64)
+        self.columns = np.zeros(max(1, capacity), dtype=np.int64)
+        self.eligibility = np.zeros(max(1, capacity), dtype=np.float64)
+        self.cutoff = cutoff
+
+        self.slots = {}  # (row, column) -> slot
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def visit(self, row, column):
+        slot = self.slots.get((row, column))
+
+        if slot is None:
+            slot = self.size
+
+            if slot == len(self.rows):
+                self._grow(slot * 2)
+
+            self.rows[slot] = row
+            self.columns[slot] = column
+            self.slots[(row, column)] = slot
+            self.size += 1
+
+        self.eligibility[slot] = 1.0
+
+    def apply(self, values, step):
+        # values[row, column] += step * eligibility for every live trace; pairs are unique, so no np.add.at
+        n = self.size
+        values[self.rows[:n], self.columns[:n]] += step * self.eligibility[:n]
+
+    def decay(self, factor):
+        n = self.size
+        eligibility = self.eligibility[:n]
+        eligibility *= factor
+
+        if n and eligibility.min() < self.cutoff:
+            keep = np.flatnonzero(eligibility >= self.cutoff)
+            size = len(keep)
+
+            self.rows[:size] = self.rows[keep]
+            self.columns[:size] = self.columns[keep]
+            self.eligibility[:size] = self.eligibility[keep]
+            self.size = size
+
+            self.slots = {pair: slot for slot, pair in
+                          enumerate(zip(self.rows[:size].tolist(), self.columns[:size].tolist()))}
+
+    def clear(self):
+        self.slots = {}
+        self.size = 0
+
+    def _grow(self, capacity):
+        for name in ('rows', 'columns', 'eligibility'):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
@@ -0,0 +1,153 @@
+import argparse
+import importlib
+import multiprocessing
+import os
+import queue
+import random
+import time
+
+import numpy as np
+
+from inference import FrozenTable
+from parallel_train import load_object
+from run_loop import run_episode
+
+
+def default_table(agent_module):
+    # the checkpoint the agent itself would start from: its native file, else the legacy pickle
+    path = agent_module.DATA_FILE + '.qtab'
+    return path if os.path.isfile(path) else agent_module.DATA_FILE + '.gz'
+
+
+def worker(worker_id, seed, agent_spec, env_spec, path, e_greedy, episodes, max_steps, results):
+    random.seed(seed)
+    np.random.seed(seed)
+
+    # the env module first: a stand-in environment installs its fake pysc2 before the agent module imports it
+    env = load_object(env_spec)()
+
+    try:
+        agent_cls = load_object(agent_spec)
+        agent_module = importlib.import_module(agent_cls.__module__)
+
+        policy = FrozenTable(path, list(range(len(agent_module.smart_actions))), e_greedy,
+                             agent_module.STATE_ENCODER.migrate_table)
+        agent = agent_cls(qlearn=policy)
+        agent.setup(env.observation_spec(), env.action_spec())
+
+        for _ in range(episodes):
+            latencies = []
+            decisions, unseen = policy.decisions, policy.unseen
+
+            reward, steps = run_episode(agent, env, max_steps, latencies)
+            results.put((worker_id, reward, steps, np.array(latencies), policy.decisions - decisions,
+                         policy.unseen - unseen))
+    finally:
+        env.close()
+        results.put((worker_id, None, None, None, None, None))
+
+
+def summarize(rewards, steps, latencies, decisions, unseen, elapsed):
+    rewards = np.asarray(rewards, dtype=np.float64)
+    latencies = np.concatenate(latencies) * 1e3 if latencies else np.zeros(1)
+    n = max(1, len(rewards))
+
+    return {
+        'episodes': len(rewards),
+        'wins': int(np.count_nonzero(rewards > 0)),
+        'ties': int(np.count_nonzero(rewards == 0)),
+        'losses': int(np.count_nonzero(rewards < 0)),
+        'win_rate': np.count_nonzero(rewards > 0) / float(n),
+        'reward_mean': float(rewards.mean()) if len(rewards) else 0.0,
+        'reward_std': float(rewards.std()) if len(rewards) else 0.0,
+        'steps_mean': float(np.mean(steps)) if len(steps) else 0.0,
+        'step_ms_mean': float(latencies.mean()),
+        'step_ms_p50': float(np.percentile(latencies, 50)),
+        'step_ms_p95': float(np.percentile(latencies, 95)),
+        'step_ms_p99': float(np.percentile(latencies, 99)),
+        'step_ms_max': float(latencies.max()),
+        'unseen_rate': unseen / float(max(1, decisions)),
+        'seconds': elapsed,
+    }
+
+
+def evaluate(agent_spec, env_spec, path=None, episodes=10, workers=None, e_greedy=1.0, max_steps=0, seed=0):
+    """Plays `episodes` games with a frozen greedy policy loaded from `path`, spread over `workers` processes.
+
+    Returns the summary from `summarize`: win/tie/loss counts, reward, and agent.step latency in milliseconds.
+    """
+    workers = max(1, min(workers or os.cpu_count(), episodes))
+
+    load_object(env_spec)  # see worker
+    agent_module = importlib.import_module(load_object(agent_spec).__module__)
+    path = path or default_table(agent_module)
+    if not os.path.isfile(path):
+        raise IOError('no Q-table at %s' % path)
+
+    context = multiprocessing.get_context('spawn')  # the game client doesn't survive a fork
+    results = context.Queue()
+    processes = [context.Process(target=worker, name='eval-%d' % i,
+                                 args=(i, seed + i, agent_spec, env_spec, path, e_greedy,
+                                       episodes // workers + (i < episodes % workers), max_steps, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+
+    start_time = time.time()
+    running = workers
+    rewards, steps, latencies = [], [], []
+    decisions = unseen = 0
+
+    while running:
+        try:
+            worker_id, reward, episode_steps, episode_latencies, episode_decisions, episode_unseen = \
+                results.get(timeout=1)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                break  # a worker died without reporting
+        else:
+            if reward is None:
+                running -= 1
+            else:
+                rewards.append(reward)
+                steps.append(episode_steps)
+                latencies.append(episode_latencies)
+                decisions += episode_decisions
+                unseen += episode_unseen
+                print('worker %d: reward %s after %d steps (%d/%d episodes)' % (worker_id, reward, episode_steps,
+                                                                                 len(rewards), episodes))
+
+    for process in processes:
+        process.join()
+
+    return summarize(rewards, steps, latencies, decisions, unseen, time.time() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate a trained Q-table: play games with a frozen, greedy '
+                                                 'policy in parallel and report win rate, reward and latency.')
+    parser.add_argument('--agent', default='bm_agent:BMAgent', help='module:Class of an agent taking qlearn=')
+    parser.add_argument('--env', default='run_loop:make_sc2_env',
+                        help='module:callable returning a new env, e.g. synthetic_env:SyntheticEnv to run locally')
+    parser.add_argument('--table', default=None, help="Q-table to evaluate; defaults to the agent's checkpoint")
+    parser.add_argument('--episodes', type=int, default=10, help='episodes in total')
+    parser.add_argument('--workers', type=int, default=None, help='defaults to the number of CPUs')
+    parser.add_argument('--e-greedy', type=float, default=1.0, help='probability of acting greedily')
+    parser.add_argument('--max-steps', type=int, default=0, help='cut episodes off after this many steps')
+    parser.add_argument('--seed', type=int, default=0, help='worker i is seeded with seed + i')
+    args = parser.parse_args()
+
+    stats = evaluate(args.agent, args.env, args.table, args.episodes, args.workers, args.e_greedy, args.max_steps,
+                     args.seed)
+
+    print('%d episodes in %.1f seconds: %d wins, %d ties, %d losses (%.1f%% won), reward %.3f +- %.3f, '
+          '%.0f steps per episode' % (stats['episodes'], stats['seconds'], stats['wins'], stats['ties'],
+                                      stats['losses'], 100 * stats['win_rate'], stats['reward_mean'],
+                                      stats['reward_std'], stats['steps_mean']))
+    print('agent.step: %.3f ms mean, %.3f p50, %.3f p95, %.3f p99, %.3f max; %.1f%% of decisions in unseen '
+          'states' % (stats['step_ms_mean'], stats['step_ms_p50'], stats['step_ms_p95'], stats['step_ms_p99'],
+                      stats['step_ms_max'], 100 * stats['unseen_rate']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import numpy as np
+
+TRANSITION = np.dtype([
+    ('state', np.int64),
+    ('action', np.int64),
+    ('reward', np.float64),
+    ('next_state', np.int64),  # -1 when terminal
+    ('terminal', np.bool_),
+])
+
+
+class ExperienceBuffer:
+    """The (s, a, r, s') transitions of one episode in a preallocated structured array, doubled when full."""
+
+    def __init__(self, capacity=1024):
+        self.transitions = np.zeros(max(1, capacity), dtype=TRANSITION)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, s, a, r, s_):
+        if self.size == len(self.transitions):
+            transitions = np.zeros(self.size * 2, dtype=TRANSITION)
+            transitions[:self.size] = self.transitions
+            self.transitions = transitions
+
+        if s_ == 'terminal':
+            self.transitions[self.size] = (s, a, r, -1, True)
+        else:
+            self.transitions[self.size] = (s, a, r, s_, False)
+
+        self.size += 1
+
+    def columns(self):
+        # states, actions, rewards, next states, terminal flags, in the order they were appended
+        batch = self.transitions[:self.size]
+        return batch['state'], batch['action'], batch['reward'], batch['next_state'], batch['terminal']
+
+    def clear(self):
+        self.size = 0
@@ -0,0 +1,186 @@
+import math
+
+import numpy as np
+
+
+# Exploration strategies pick a column from a state's row of Q-values: `select(values, row)`, where `row` is the
+# state's row number in the table (only UCB uses it). They work on the row in place and draw from np.random, so
+# seeding np.random makes an agent's choices reproducible.
+#
+# As with the tables' `e_greedy`, an epsilon here is the probability of acting greedily, not of exploring.
+#
+# `select_batch(strategy, values, rows)` picks for many rows at once (one state per environment, say); strategies
+# with a `select_batch` method do it with array operations, the others are called row by row.
+
+
+def random_argmax(values, ties):
+    # column of the largest value, ties broken uniformly at random; `ties` is a bool scratch row
+    best = int(values.argmax())
+    np.equal(values, values[best], out=ties)
+
+    n = np.count_nonzero(ties)
+    if n > 1:
+        best = int(np.flatnonzero(ties)[np.random.randint(n)])
+
+    return best
+
+
+def select_batch(strategy, values, rows):
+    # a column for each row of `values`, an (n, actions) array holding the table rows `rows`
+    batch = getattr(strategy, 'select_batch', None)
+    if batch is not None:
+        return batch(values, rows)
+
+    return np.array([strategy.select(row_values, row) for row_values, row in zip(values, rows.tolist())],
+                    dtype=np.int64)
+
+
+class EpsilonGreedy:
+    def __init__(self, e_greedy=0.9):
+        self.e_greedy = e_greedy
+
+        self._ties = np.zeros(0, dtype=bool)
+
+    def select(self, values, row):
+        if np.random.uniform() < self.e_greedy:
+            if len(self._ties) != len(values):
+                self._ties = np.zeros(len(values), dtype=bool)
+
+            return random_argmax(values, self._ties)
+
+        return np.random.randint(len(values))
+
+    def select_batch(self, values, rows):
+        n, n_actions = values.shape
+        greedy = np.random.uniform(size=n) < self._greedy_probabilities(n)
+
+        # uniform noise on the maxima and zero elsewhere, so argmax breaks ties at random
+        ties = values == values.max(axis=1, keepdims=True)
+        best = (np.random.uniform(size=values.shape) * ties).argmax(axis=1)
+
+        return np.where(greedy, best, np.random.randint(n_actions, size=n))
+
+    def _greedy_probabilities(self, n):
+        # probability of acting greedily for each of the next n decisions
+        return self.e_greedy
+
+
+class DecayingEpsilon(EpsilonGreedy):
+    """Epsilon-greedy whose greedy probability moves from `start` to `end` over `steps` decisions.
+
+    'linear' gets there in a straight line and stays at `end`; 'exponential' closes the remaining gap at a
+    constant rate, covering 99% of it by `steps`.
+    """
+
+    SCHEDULES = ('linear', 'exponential')
+
+    def __init__(self, start=0.5, end=0.9, steps=10000, schedule='linear'):
+        if schedule not in self.SCHEDULES:
+            raise ValueError('unknown schedule %r, expected one of %s' % (schedule, ', '.join(self.SCHEDULES)))
+
+        super(DecayingEpsilon, self).__init__(start)
+
+        self.start = start
+        self.end = end
+        self.steps = max(1, steps)
+        self.schedule = schedule
+        self.decisions = 0
+
+    def select(self, values, row):
+        self.e_greedy = self._scheduled(self.decisions)
+        self.decisions += 1
+
+        return super(DecayingEpsilon, self).select(values, row)
+
+    def _greedy_probabilities(self, n):
+        probabilities = self._scheduled(self.decisions + np.arange(n))
+        self.e_greedy = float(probabilities[-1])
+        self.decisions += n
+
+        return probabilities
+
+    def _scheduled(self, decisions):
+        progress = decisions / float(self.steps)
+
+        if self.schedule == 'linear':
+            return self.start + (self.end - self.start) * np.minimum(1.0, progress)
+
+        return self.end - (self.end - self.start) * 0.01 ** progress
+
+
+class Boltzmann:
+    # softmax over Q / temperature: higher temperatures explore more, near zero it is greedy
+
+    def __init__(self, temperature=1.0):
+        self.temperature = temperature
+
+        self._weights = np.zeros(0)
+
+    def select(self, values, row):
+        if len(self._weights) != len(values):
+            self._weights = np.zeros(len(values))
+
+        weights = self._weights
+        np.subtract(values, values.max(), out=weights)
+        weights /= max(self.temperature, 1e-12)
+        np.exp(weights, out=weights)
+        np.cumsum(weights, out=weights)
+
+        column = int(np.searchsorted(weights, np.random.uniform() * weights[-1], side='right'))
+
+        return min(column, len(values) - 1)
+
+
+class UCB:
+    """Count-based upper confidence bound: Q + c * sqrt(ln N(s) / N(s, a)).
+
+    Actions a state has never taken are tried first, in random order. The counts are this strategy's own,
+    kept per table row and grown as rows appear; they are not saved with the table.
+    """
+
+    def __init__(self, c=2.0):
+        self.c = c
+
+        self.counts = np.zeros((0, 0), dtype=np.int64)  # row -> decisions per action
+        self.totals = np.zeros(0, dtype=np.int64)  # row -> decisions
+
+        self._scores = np.zeros(0)
+        self._ties = np.zeros(0, dtype=bool)
+
+    def _grow(self, rows, n_actions):
+        size = max(rows, 2 * len(self.totals), 64)
+
+        counts = np.zeros((size, n_actions), dtype=np.int64)
+        totals = np.zeros(size, dtype=np.int64)
+        if self.counts.shape[1] == n_actions:
+            counts[:len(self.counts)] = self.counts
+            totals[:len(self.totals)] = self.totals
+
+        self.counts, self.totals = counts, totals
+        self._scores = np.zeros(n_actions)
+        self._ties = np.zeros(n_actions, dtype=bool)
+
+    def select(self, values, row):
+        if row >= len(self.totals) or self.counts.shape[1] != len(values):
+            self._grow(row + 1, len(values))
+
+        counts = self.counts[row]
+
+        if self.totals[row] < len(values):
+            # untried actions score +inf, and they are all tried before any is repeated
+            np.equal(counts, 0, out=self._ties)
+            untried = np.flatnonzero(self._ties)
+            column = int(untried[np.random.randint(len(untried))])
+        else:
+            scores = self._scores
+            np.divide(math.log(self.totals[row]), counts, out=scores)
+            np.sqrt(scores, out=scores)
+            scores *= self.c
+            scores += values
+
+            column = random_argmax(scores, self._ties)
+
+        counts[column] += 1
+        self.totals[row] += 1
+
+        return column
@@ -0,0 +1,72 @@
+import os
+
+from exploration import EpsilonGreedy
+from qlearning_table import QLearningTable
+from qtable_format import is_qtable_file
+
+# path of a native Q-table for SparseAgent and BMAgent to play without learning, e.g.
+# BMBOT_POLICY=bm_agent_data.qtab python -m pysc2.bin.agent ... (see load_policy)
+POLICY_ENV = 'BMBOT_POLICY'
+
+
+class FrozenTable:
+    """A saved Q-table as a read-only policy, for agents that take a `qlearn` table.
+
+    choose_action is greedy (epsilon-greedy with `e_greedy` < 1), learn and learn_batch do nothing and nothing is
+    ever written back. A native file stays memory-mapped, so worker processes share its pages and only copy the
+    rows of states they meet; a legacy .gz pickle is read whole and rekeyed with `migrate`.
+    """
+
+    def __init__(self, path, actions, e_greedy=1.0, migrate=None):
+        self.table = QLearningTable(actions, exploration=EpsilonGreedy(e_greedy))
+        self.table.load(path)
+
+        if not is_qtable_file(path) and migrate is not None:
+            migrate(self.table)
+        self.table.dirty.clear()
+        self.table.read_only = True  # never saved, so states met during play are not tracked as dirty
+
+        self.actions = self.table.actions
+        self.decisions = 0
+        self.unseen = 0  # decisions in states the saved table has no row for
+        self.unseen_states = set()
+
+    @property
+    def n_states(self):
+        return self.table.n_states
+
+    def choose_action(self, observation):
+        table = self.table
+
+        # neither in memory nor in the file: choose_action is about to add it as a new, all-zero row
+        if observation not in table.state_index and (table.base is None or table.base.lookup(observation) < 0):
+            self.unseen_states.add(observation)
+
+        self.decisions += 1
+        if observation in self.unseen_states:
+            self.unseen += 1
+
+        return table.choose_action(observation)
+
+    def learn(self, s, a, r, s_):
+        pass
+
+    def learn_batch(self, s, a, r, s_, terminal):
+        pass
+
+
+def load_policy(policy=None, actions=None):
+    """The FrozenTable an agent plays in inference mode, from `policy` or else BMBOT_POLICY; None for neither.
+
+    Inference mode only reads native files: they are memory-mapped, so startup neither unpickles a DataFrame nor
+    imports pandas. Convert a legacy .gz checkpoint first with `python qtable_format.py convert`.
+    """
+    if policy is None:
+        policy = os.environ.get(POLICY_ENV) or None
+    if policy is None:
+        return None
+
+    if not is_qtable_file(policy):
+        raise ValueError('%s is not a native Q-table file; convert it with qtable_format.py convert' % policy)
+
+    return FrozenTable(policy, actions)
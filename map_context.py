@@ -0,0 +1,117 @@
+import numpy as np
+
+from pysc2.lib import features
+
+from building_tracker import label_components
+
+_PLAYER_RELATIVE = features.SCREEN_FEATURES.player_relative.index
+_UNIT_TYPE = features.SCREEN_FEATURES.unit_type.index
+
+_PLAYER_SELF = 1
+
+_TERRAN_COMMANDCENTER = 18
+_NEUTRAL_MINERAL_FIELD = 341
+_VESPENE_GEYSER = 342
+
+
+def base_top_left(player_relative):
+    # 1 if our units on the minimap are in its top half, else 0
+    player_y, player_x = (player_relative == _PLAYER_SELF).nonzero()
+    return 1 if player_y.any() and player_y.mean() <= 31 else 0
+
+
+def closest_point(x, y, xs, ys):
+    # [xs[i], ys[i]] nearest to (x, y), the first one on ties
+    i = int(np.argmin((np.asarray(xs) - x) ** 2 + (np.asarray(ys) - y) ** 2))
+    return [xs[i], ys[i]]
+
+
+class MapContext:
+    """What agents need to know about the map that does not change within an episode, computed once.
+
+    `update(obs, census)` is called every step. It builds the context on obs.first() (or the first step it sees),
+    and after that only rebuilds the screen part when the screen stops matching it: the pixel at the command
+    center's centroid no longer shows a command center (the camera moved, or the CC is gone), or a command
+    center shows up where there was none. Otherwise a step costs one pixel lookup.
+
+    - base_top_left: 1 if our base is in the top half of the minimap, from the first step of the episode
+    - cc_y, cc_x: the command center's pixels, as census.coords gives them; cc_centroid: [x, y], or None
+    - mineral_y, mineral_x: the mineral field pixels
+    - geyser_y, geyser_x: the vespene geyser pixels; geysers: the [x, y] centroid of each geyser, one row each
+    """
+
+    def __init__(self):
+        self.builds = 0
+        self.reset()
+
+    def reset(self):
+        self.base_top_left = None
+
+        empty = np.zeros(0, dtype=np.int64)
+        self.cc_y = self.cc_x = self.mineral_y = self.mineral_x = self.geyser_y = self.geyser_x = empty
+        self.cc_centroid = None
+        self.geysers = np.zeros((0, 2))
+
+        self._probe = None  # (y, x) of a command center pixel, checked every step
+
+    def update(self, obs, census):
+        unit_type = obs.observation['screen'][_UNIT_TYPE]
+
+        if obs.first() or self.base_top_left is None:
+            self.reset()
+            self.base_top_left = base_top_left(obs.observation['minimap'][_PLAYER_RELATIVE])
+            self._build(census)
+        elif not self._valid(unit_type, census):
+            self._build(census)
+
+        return self
+
+    def _valid(self, unit_type, census):
+        if self._probe is None:
+            return not census.any(_TERRAN_COMMANDCENTER)
+
+        return unit_type[self._probe] == _TERRAN_COMMANDCENTER
+
+    def _build(self, census):
+        self.builds += 1
+
+        self.cc_y, self.cc_x = census.coords(_TERRAN_COMMANDCENTER)
+        self.mineral_y, self.mineral_x = census.coords(_NEUTRAL_MINERAL_FIELD)
+        self.geyser_y, self.geyser_x = census.coords(_VESPENE_GEYSER)
+
+        self.cc_centroid = census.centroid(_TERRAN_COMMANDCENTER)
+        self._probe = None
+        if self.cc_centroid is not None:
+            # the centroid pixel, unless the CC's shape leaves it outside (then its first pixel)
+            x, y = int(round(self.cc_centroid[0])), int(round(self.cc_centroid[1]))
+            inside = np.any((self.cc_y == y) & (self.cc_x == x))
+            self._probe = (y, x) if inside else (int(self.cc_y[0]), int(self.cc_x[0]))
+
+        self.geysers = self._cluster(self.geyser_y, self.geyser_x)
+
+    def _cluster(self, ys, xs):
+        # centroids of the 4-connected blobs of geyser pixels, labelled within their bounding box
+        if not len(ys):
+            return np.zeros((0, 2))
+
+        y0, x0 = ys.min(), xs.min()
+        mask = np.zeros((ys.max() - y0 + 1, xs.max() - x0 + 1), dtype=bool)
+        mask[ys - y0, xs - x0] = True
+
+        labels = label_components(mask.astype(np.int64), mask)[ys - y0, xs - x0]
+        _, inverse, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+
+        return np.stack([np.bincount(inverse, weights=xs) / sizes, np.bincount(inverse, weights=ys) / sizes], axis=1)
+
+    def nearest_geyser(self, x=None, y=None):
+        # [x, y] centroid of the geyser nearest to (x, y), by default the command center; None without geysers
+        if not len(self.geysers):
+            return None
+
+        if x is None:
+            if self.cc_centroid is None:
+                return list(self.geysers[0])
+            x, y = self.cc_centroid
+
+        return closest_point(x, y, self.geysers[:, 0], self.geysers[:, 1])
@@ -0,0 +1,270 @@
+import argparse
+import glob
+import importlib
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from qlearning_table import COUNTERS, read_table, write_table
+from qtable_format import QTableFile, is_qtable_file, write_qtable_parts
+
+DEFAULT_CHUNK_SIZE = 1 << 14
+
+
+class TableStream:
+    """One input table as arrays sorted by key, handed out a chunk at a time.
+
+    Native files stay memory-mapped, with any delta segments newer than the snapshot laid over them. Legacy .gz
+    pickles have to be read whole; their states are rekeyed with `migrate_key` and sorted. Each row is weighted
+    per action by its update counts; rows without any (never learned from, or from files written before the
+    counters were kept) fall back to the state's visit count, and rows without that count as one visit.
+    """
+
+    def __init__(self, path, migrate_key=None):
+        self.path = path
+        self.cursor = 0
+
+        self.overrides = None  # (keys, values, counters) of newer delta rows that are also in the snapshot
+        self.extra = None  # the same for delta rows of states the snapshot lacks
+
+        if is_qtable_file(path):
+            base = QTableFile(path)
+
+            self.actions = base.actions
+            self.keys, self.values = base.keys, base.values
+            self.counters = {name: base.arrays[name] for name in COUNTERS if name in base.arrays}
+
+            self._apply_deltas(base)
+        else:
+            table = read_table(path)
+            keys = list(table.index)
+            if migrate_key is not None:
+                keys = [migrate_key(key) for key in keys]
+
+            keep = [i for i, key in enumerate(keys) if key is not None]
+            keys, first = np.unique(np.array([keys[i] for i in keep], dtype=np.int64), return_index=True)
+
+            self.actions = list(table.columns)
+            self.keys = keys
+            self.values = table.to_numpy(dtype=np.float64)[keep][first]
+            self.counters = {}
+
+    def _apply_deltas(self, base):
+        # the latest delta row of each state wins; rows for states the snapshot lacks become an extra stream
+        sequence = base.attrs.get('delta_sequence', 0)
+        segments = []
+
+        for path in glob.glob(glob.escape(self.path) + '.delta.*'):
+            suffix = path.rsplit('.', 1)[1]
+            if suffix.isdigit() and int(suffix) >= sequence:
+                segments.append((int(suffix), path))
+
+        if not segments:
+            return
+
+        segments = [QTableFile(path, mmap=False) for _, path in sorted(segments)]
+        keys = np.concatenate([segment.keys for segment in segments])
+        values = np.concatenate([segment.values for segment in segments])
+        counters = {name: np.concatenate([counter_array(segment.arrays, name, len(segment), len(self.actions))
+                                          for segment in segments]) for name in COUNTERS}
+
+        # np.unique keeps the first occurrence, so search the reversed arrays to keep the last one
+        keys, last = np.unique(keys[::-1], return_index=True)
+        values = values[::-1][last]
+        counters = {name: array[::-1][last] for name, array in counters.items()}
+
+        in_base = base.lookup_batch(keys) >= 0
+        self.overrides = (keys[in_base], values[in_base], {name: a[in_base] for name, a in counters.items()})
+        self.extra = (keys[~in_base], values[~in_base], {name: a[~in_base] for name, a in counters.items()})
+
+    def __len__(self):
+        return len(self.keys)
+
+    def done(self):
+        return self.cursor >= len(self.keys)
+
+    def window_end(self, chunk_size):
+        # last key of the next chunk
+        return self.keys[min(self.cursor + chunk_size, len(self.keys)) - 1]
+
+    def take(self, bound, chunk_size):
+        # rows from the cursor up to and including key `bound`, which is at most the next chunk's last key, as
+        # keys, values, merge weights (rows, actions) and counters
+        window = min(self.cursor + chunk_size, len(self.keys))
+        start, stop = self.cursor, self.cursor + int(np.searchsorted(self.keys[self.cursor:window], bound,
+                                                                     side='right'))
+        self.cursor = stop
+
+        keys = np.array(self.keys[start:stop])
+        values = np.array(self.values[start:stop])
+        counters = {name: np.array(self.counters[name][start:stop]) if name in self.counters
+                    else counter_array({}, name, len(keys), len(self.actions)) for name in COUNTERS}
+
+        if self.overrides is not None and len(self.overrides[0]):
+            override_keys, override_values, override_counters = self.overrides
+            positions = np.minimum(np.searchsorted(override_keys, keys), len(override_keys) - 1)
+            found = override_keys[positions] == keys
+
+            values[found] = override_values[positions[found]]
+            for name, array in counters.items():
+                array[found] = override_counters[name][positions[found]]
+
+        updated = counters['updates'].any(axis=1)
+        weights = np.where(updated[:, None], counters['updates'], counters['visits'][:, None]).astype(np.float64)
+
+        return keys, values, weights, counters
+
+
+class ArrayStream(TableStream):
+    # the delta-only rows of a native input, streamed alongside it; their keys are not in the snapshot
+
+    def __init__(self, path, actions, keys, values, counters):
+        self.path = path
+        self.actions = actions
+        self.keys, self.values, self.counters = keys, values, counters
+        self.overrides = None
+        self.extra = None
+        self.cursor = 0
+
+
+def counter_array(arrays, name, n, n_actions):
+    # `name` from a file's arrays, or its stand-in for files saved without it: one visit per state, no updates
+    if name in arrays:
+        return arrays[name]
+
+    if name == 'visits':
+        return np.ones(n, dtype=np.int64)
+
+    return np.zeros((n, n_actions), dtype=np.uint32)
+
+
+def open_streams(paths, migrate_key=None):
+    streams = []
+
+    for path in paths:
+        stream = TableStream(path, migrate_key)
+
+        if streams and stream.actions != streams[0].actions:
+            raise ValueError('%s has a different action list than %s' % (path, streams[0].path))
+
+        streams.append(stream)
+        if stream.extra is not None and len(stream.extra[0]):
+            streams.append(ArrayStream(path, stream.actions, *stream.extra))
+
+    return streams
+
+
+def combine(keys, values, weights, counters):
+    """Folds rows with the same key into one: each value averaged weighted by its weight, counters summed.
+
+    Values no input has any weight for are averaged evenly.
+    """
+    unique, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.searchsorted(inverse[order], np.arange(len(unique)))
+
+    totals = np.add.reduceat(weights[order], starts)
+
+    unweighted = totals[inverse] == 0
+    weights[unweighted] = 1.0
+    totals = np.add.reduceat(weights[order], starts)
+
+    merged = np.add.reduceat((values * weights)[order], starts) / totals
+    merged_counters = {name: np.add.reduceat(array[order], starts, dtype=np.int64).astype(array.dtype)
+                       for name, array in counters.items()}
+
+    return unique, merged, merged_counters
+
+
+def merge_chunks(streams, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields the merged table as (keys, values, counters) chunks in ascending key order.
+
+    Each round reads at most one chunk from every input: everything up to the smallest last key of the inputs'
+    next chunks, so every row with a key in that range is in memory together and no key spans two rounds.
+    """
+    while True:
+        active = [stream for stream in streams if not stream.done()]
+        if not active:
+            return
+
+        bound = min(stream.window_end(chunk_size) for stream in active)
+        parts = [stream.take(bound, chunk_size) for stream in active]
+
+        keys, values, weights, counters = zip(*parts)
+        yield combine(np.concatenate(keys), np.concatenate(values), np.concatenate(weights),
+                      {name: np.concatenate([c[name] for c in counters]) for name in COUNTERS})
+
+
+def merge_tables(paths, out, chunk_size=DEFAULT_CHUNK_SIZE, migrate_key=None):
+    """Merges the tables at `paths` into `out`; returns the number of states written.
+
+    A native `out` is streamed: the merged arrays go to raw temporary files next to it, which are then copied
+    into place behind the header, so memory use does not depend on the size of the tables. A .gz `out` is the
+    legacy pickle format, which can only be written from a table held in memory.
+    """
+    streams = open_streams(paths, migrate_key)
+    actions = streams[0].actions
+    attrs = {'merged_from': [os.path.abspath(path) for path in paths]}
+
+    if out.endswith('.gz'):
+        chunks = list(merge_chunks(streams, chunk_size))
+        keys = np.concatenate([chunk[0] for chunk in chunks]) if chunks else np.zeros(0, dtype=np.int64)
+        values = np.concatenate([chunk[1] for chunk in chunks]) if chunks else np.zeros((0, len(actions)))
+
+        write_table(out, actions, keys.tolist(), values, **attrs)
+        return len(keys)
+
+    work = tempfile.mkdtemp(prefix='.merge-', dir=os.path.dirname(os.path.abspath(out)))
+    dtypes = {'keys': '<i8', 'values': '<f8', 'visits': '<i8', 'action_visits': '<u4', 'updates': '<u4'}
+    parts = {name: os.path.join(work, name) for name in dtypes}
+    n = 0
+
+    try:
+        files = {name: open(path, 'wb') for name, path in parts.items()}
+        try:
+            for keys, values, counters in merge_chunks(streams, chunk_size):
+                for name, array in dict(counters, keys=keys, values=values).items():
+                    files[name].write(array.astype(dtypes[name]).tobytes())
+                n += len(keys)
+        finally:
+            for f in files.values():
+                f.close()
+
+        specs = {name: (dtype, (n, ) if name in ('keys', 'visits') else (n, len(actions)))
+                 for name, dtype in dtypes.items()}
+
+        tmp = out + '.tmp'
+        write_qtable_parts(tmp, actions, specs, parts, attrs=attrs)
+        os.replace(tmp, out)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merges Q-tables from several training runs into one, averaging '
+                                                 'the values of shared states weighted by their update counts.')
+    parser.add_argument('tables', nargs='+', help='native .qtab checkpoints (with their delta segments) or .gz '
+                                                  'pickles, all with the same action list')
+    parser.add_argument('--out', required=True, help='table to write (.qtab native and streamed, .gz pickle)')
+    parser.add_argument('--agent', help="agent module whose STATE_ENCODER rekeys legacy str(np.ndarray) states, "
+                                        "e.g. bm_agent")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows read per input per round')
+    args = parser.parse_args()
+
+    migrate_key = importlib.import_module(args.agent).STATE_ENCODER.migrate_key if args.agent else None
+
+    start_time = time.time()
+    n_states = merge_tables(args.tables, args.out, args.chunk_size, migrate_key)
+
+    print('Merged %d tables into %d states in %s: %.3f seconds' % (len(args.tables), n_states, args.out,
+                                                                    time.time() - start_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import numpy as np
+
+_PLAYER_HOSTILE = 4
+
+
+def hot_squares(player_relative, grid_size, base_top_left, player=_PLAYER_HOSTILE):
+    """Flags which cells of a grid_size x grid_size split of the minimap contain any `player` pixel.
+
+    Returned flattened row-major, and reversed when the base is bottom-right so that index 0 is always the
+    cell nearest our own base.
+    """
+    height, width = player_relative.shape
+    enemy_y, enemy_x = (player_relative == player).nonzero()
+
+    squares = np.zeros(grid_size * grid_size)
+    squares[(enemy_y * grid_size // height) * grid_size + enemy_x * grid_size // width] = 1
+
+    if not base_top_left:
+        squares = squares[::-1]
+
+    return squares
+
+
+def hot_squares_batch(player_relative, grid_size, base_top_left, player=_PLAYER_HOSTILE):
+    # hot_squares of a stack of minimaps (n, height, width) in one pass, with a base_top_left flag per minimap
+    n, height, width = player_relative.shape
+    cells = (np.arange(height) * grid_size // height)[:, None] * grid_size + np.arange(width) * grid_size // width
+
+    minimap, enemy_y, enemy_x = (player_relative == player).nonzero()
+
+    squares = np.zeros((n, grid_size * grid_size))
+    squares[minimap, cells[enemy_y, enemy_x]] = 1
+
+    flip = ~np.asarray(base_top_left, dtype=bool)
+    squares[flip] = squares[flip, ::-1]
+
+    return squares
+
+
+def cell_centres(grid_size, minimap_size=64):
+    # minimap coordinate of the centre of each grid row/column
+    cell = minimap_size // grid_size
+    return [(i + 1) * cell - 1 - cell // 2 for i in range(grid_size)]
+
+
@@ -0,0 +1,317 @@
+import argparse
+import atexit
+import functools
+import json
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+# pysc2 is only imported on first use, so main() can import a stand-in env (which installs its own pysc2) first
+
+# Observation log: an 8-byte magic, a little-endian uint32 header length and a JSON header (the agent and the
+# shape and dtype of every field), then chunks of up to `chunk_size` steps. A chunk is a little-endian
+# (frames, raw bytes, compressed bytes) triple followed by the zlib-compressed fields, in header order, each as
+# one array over the chunk's frames. Fixed-shape fields in DELTA are stored XORed with the previous frame (the
+# chunk's first frame as is), so a chunk decodes on its own; the variable-length ones are a per-frame row count
+# followed by all the rows. A log that was cut off mid-chunk is read up to its last whole chunk.
+MAGIC = b'QOBS\x00\x01\r\n'
+_PREFIX = struct.Struct('<8sI')
+_CHUNK = struct.Struct('<III')
+
+# only what the agents read: screen[unit_type], minimap[player_relative] (see _layers) and these
+SCALARS = (('step_type', '<u1'), ('reward', '<i4'), ('game_loop', '<u4'))
+VECTORS = (('player', '<i4'), ('score_cumulative', '<i4'))
+LAYERS = (('unit_type', '<u2'), ('player_relative', '<u1'))
+ROWS = (('available_actions', '<u2', ()), ('single_select', '<u2', (7, )), ('multi_select', '<u2', (7, )))
+DELTA = ('unit_type', 'player_relative', 'player', 'score_cumulative')
+
+_FIXED = dict(VECTORS + LAYERS)
+_ROWS = {name: shape for name, dtype, shape in ROWS}
+
+
+@functools.lru_cache(maxsize=None)
+def _layers():
+    # (unit_type, player_relative): the indices the agents read the screen and minimap layers at
+    from pysc2.lib import features
+
+    return features.SCREEN_FEATURES.unit_type.index, features.SCREEN_FEATURES.player_relative.index
+
+
+def _fields(obs):
+    observation = obs.observation
+    unit_type, player_relative = _layers()
+
+    return {
+        'step_type': int(obs.step_type),
+        'reward': obs.reward,
+        'game_loop': int(np.asarray(observation.get('game_loop', 0)).reshape(-1)[0]),
+        'player': observation['player'],
+        'score_cumulative': observation['score_cumulative'],
+        'unit_type': observation['screen'][unit_type],
+        'player_relative': observation['minimap'][player_relative],
+        'available_actions': observation['available_actions'],
+        'single_select': observation['single_select'],
+        'multi_select': observation['multi_select'],
+    }
+
+
+def _layout(fields):
+    # name -> (dtype, shape of one frame); ROWS fields have a variable first dimension
+    layout = {name: (dtype, ()) for name, dtype in SCALARS}
+    for name, dtype in VECTORS + LAYERS:
+        layout[name] = (dtype, np.shape(fields[name]))
+    for name, dtype, shape in ROWS:
+        layout[name] = (dtype, shape)
+
+    return layout
+
+
+class ObservationRecorder:
+    """Appends the observation fields the agents read, one chunk of steps at a time, to an observation log.
+
+    The layers are stored as uint16 (unit_type) and uint8 (player_relative) frames, so a step takes a few KB raw and
+    far less once delta-encoded and compressed. The header is written with the first step, from its shapes; steps
+    appended to an existing log must match it. The chunk is written whenever it fills and at the end of an episode.
+    """
+
+    def __init__(self, path, agent=None, chunk_size=256, level=6):
+        self.path = path
+        self.agent = agent
+        self.chunk_size = chunk_size
+        self.level = level
+
+        self.layout = None
+        self.frames = []
+        self.file = None
+
+        if os.path.isfile(path) and os.path.getsize(path):
+            header, _ = read_observation_header(path)
+            self.layout = {name: (dtype, tuple(shape)) for name, (dtype, shape) in header['fields']}
+
+        atexit.register(self.close)
+
+    def append(self, obs):
+        fields = _fields(obs)
+
+        if self.file is None:
+            self._open(fields)
+
+        for name in _FIXED:
+            shape = self.layout[name][1]
+            if np.shape(fields[name]) != shape:
+                raise ValueError('%s has shape %s, the log has %s' % (name, np.shape(fields[name]), shape))
+
+        self.frames.append(fields)
+        if len(self.frames) == self.chunk_size or obs.last():
+            self.flush()
+
+    def _open(self, fields):
+        if self.layout is None:
+            self.layout = _layout(fields)
+            header = json.dumps({'version': 1, 'agent': self.agent, 'fields': [
+                [name, [dtype, list(shape)]] for name, (dtype, shape) in self.layout.items()]}).encode('utf-8')
+
+            with open(self.path, 'wb') as f:
+                f.write(_PREFIX.pack(MAGIC, len(header)))
+                f.write(header)
+
+        self.file = open(self.path, 'ab')
+
+    def flush(self):
+        if self.frames:
+            raw = _encode(self.layout, self.frames)
+            data = zlib.compress(raw, self.level)
+
+            self.file.write(_CHUNK.pack(len(self.frames), len(raw), len(data)))
+            self.file.write(data)
+            self.frames = []
+
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None and not self.file.closed:
+            self.flush()
+            self.file.close()
+
+        atexit.unregister(self.close)
+
+
+def _encode(layout, frames):
+    parts = []
+
+    for name, (dtype, shape) in layout.items():
+        if name in _ROWS:
+            rows = [np.asarray(frame[name]).reshape((-1, ) + shape) for frame in frames]
+            parts.append(np.array([len(r) for r in rows], dtype='<u2'))
+            parts.append(np.concatenate(rows).astype(dtype))
+            continue
+
+        array = np.array([frame[name] for frame in frames]).astype(dtype)
+        if name in DELTA:
+            array[1:] ^= array[:-1].copy()
+        parts.append(array)
+
+    return b''.join(np.ascontiguousarray(part).tobytes() for part in parts)
+
+
+def _decode(layout, n, raw):
+    fields = {}
+    offset = 0
+
+    def take(dtype, shape):
+        nonlocal offset
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape, dtype=np.int64))
+        array = np.frombuffer(raw, dtype=dtype, count=count, offset=offset).reshape(shape)
+        offset += count * dtype.itemsize
+        return array
+
+    for name, (dtype, shape) in layout.items():
+        if name in _ROWS:
+            counts = take('<u2', (n, ))
+            values = take(dtype, (int(counts.sum()), ) + shape)
+            fields[name] = np.split(values, np.cumsum(counts)[:-1])
+            continue
+
+        array = take(dtype, (n, ) + shape)
+        if name in DELTA:
+            array = np.bitwise_xor.accumulate(array, axis=0)
+        fields[name] = array
+
+    return fields
+
+
+class _Layers:
+    # stands in for a screen or minimap stack that only has the recorded layers
+    def __init__(self, layers):
+        self.layers = layers
+
+    def __getitem__(self, index):
+        try:
+            return self.layers[index]
+        except KeyError:
+            raise KeyError('feature layer %r was not recorded' % (index, ))
+
+    def __contains__(self, index):
+        return index in self.layers
+
+
+def read_observation_header(path):
+    with open(path, 'rb') as f:
+        magic, length = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError('%s is not an observation log' % path)
+
+        return json.loads(f.read(length).decode('utf-8')), _PREFIX.size + length
+
+
+def read_chunks(path):
+    # (header, generator of (frames, decoded fields)), a chunk at a time
+    header, offset = read_observation_header(path)
+    layout = {name: (dtype, tuple(shape)) for name, (dtype, shape) in header['fields']}
+
+    def chunks():
+        with open(path, 'rb') as f:
+            f.seek(offset)
+
+            while True:
+                prefix = f.read(_CHUNK.size)
+                if len(prefix) < _CHUNK.size:
+                    return
+
+                n, raw_size, size = _CHUNK.unpack(prefix)
+                data = f.read(size)
+                if len(data) < size:
+                    return
+
+                yield n, _decode(layout, n, zlib.decompress(data, bufsize=raw_size))
+
+    return header, chunks()
+
+
+def read_observations(path):
+    """Yields the log's steps as pysc2 TimeSteps, whose observation has only the recorded fields.
+
+    observation['screen'] and ['minimap'] can be indexed with the unit_type and player_relative layer indices
+    respectively; the arrays are read-only views into the decoded chunk.
+    """
+    from pysc2.env import environment
+
+    unit_type, player_relative = _layers()
+    header, chunks = read_chunks(path)
+
+    for n, fields in chunks:
+        for i in range(n):
+            step_type = environment.StepType(int(fields['step_type'][i]))
+            observation = {
+                'screen': _Layers({unit_type: fields['unit_type'][i]}),
+                'minimap': _Layers({player_relative: fields['player_relative'][i]}),
+                'player': fields['player'][i],
+                'score_cumulative': fields['score_cumulative'][i],
+                'available_actions': fields['available_actions'][i],
+                'single_select': fields['single_select'][i],
+                'multi_select': fields['multi_select'][i],
+                'game_loop': fields['game_loop'][i:i + 1],
+            }
+
+            yield environment.TimeStep(step_type=step_type, reward=int(fields['reward'][i]),
+                                       discount=0.0 if step_type == environment.StepType.LAST else 1.0,
+                                       observation=observation)
+
+
+def record_observations(agent, path, **kwargs):
+    """Wraps `agent.step` so every observation it is given is appended to the log at `path`; returns the recorder."""
+    recorder = ObservationRecorder(path, agent=type(agent).__name__, **kwargs)
+    step = agent.step
+
+    @functools.wraps(step)
+    def recorded_step(obs):
+        recorder.append(obs)
+        return step(obs)
+
+    agent.step = recorded_step
+    agent.observation_recorder = recorder
+
+    return recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record agent observations to a log, or summarize one.')
+    parser.add_argument('path', help='observation log')
+    parser.add_argument('--agent', default=None, help='module:Class to record; without it the log is summarized')
+    parser.add_argument('--env', default='run_loop:make_sc2_env', help='module:callable returning a new env')
+    parser.add_argument('--episodes', type=int, default=1)
+    parser.add_argument('--chunk-size', type=int, default=256, help='steps per compressed chunk')
+    args = parser.parse_args()
+
+    from parallel_train import load_object
+    from run_loop import run_episodes
+
+    # the env module first, as in parallel_train: a stand-in environment installs its fake pysc2 before the agent
+    # module (or reading the log) imports it
+    make_env = load_object(args.env)
+
+    if args.agent is not None:
+        agent = load_object(args.agent)()
+        recorder = record_observations(agent, args.path, chunk_size=args.chunk_size)
+        run_episodes(agent, make_env(), args.episodes)
+        recorder.close()
+
+    start = time.perf_counter()
+    steps = episodes = 0
+    for timestep in read_observations(args.path):
+        steps += 1
+        episodes += timestep.last()
+    elapsed = time.perf_counter() - start
+
+    size = os.path.getsize(args.path)
+    print('%s: %d steps, %d episodes, %.1f KB, %.0f bytes/step, read at %.0f steps/s' % (
+        args.path, steps, episodes, size / 1024.0, size / max(steps, 1), steps / max(elapsed, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
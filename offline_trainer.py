@@ -0,0 +1,150 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from qlearning_table import QLearningTable
+from transition_log import read_transitions
+
+
+def load_transitions(paths):
+    # (actions, records) of one or more logs written for the same agent
+    actions = None
+    records = []
+
+    for path in paths:
+        header, log = read_transitions(path)
+
+        if actions is None:
+            actions = header['actions']
+        elif header['actions'] != actions:
+            raise ValueError('%s was recorded with a different action list' % path)
+
+        records.append(np.asarray(log))
+
+    return actions, np.concatenate(records)
+
+
+def action_columns(table, actions):
+    # column of each action, looked up once per distinct action
+    distinct, inverse = np.unique(actions, return_inverse=True)
+    return np.array([table.action_index[action] for action in distinct.tolist()], dtype=np.int64)[inverse]
+
+
+def replay_sequential(table, records, epochs=1):
+    """Replays the transitions in recorded order, exactly the updates `learn` made during play.
+
+    Every update reads what the ones before it wrote, so this stays a loop over the transitions rather than array
+    arithmetic. It runs over Python lists of just the rows the log touches, written back to the table at the end,
+    which tops out at about a million updates a second; replay_synchronous is the vectorized alternative, at a
+    few million.
+    """
+    if not len(records):
+        return
+
+    rows, next_rows = table.transition_rows(records['state'], records['next_state'], records['terminal'])
+    columns = action_columns(table, records['action'])
+
+    # the rows the log touches as Python lists, and per transition its state's and next state's list; the None
+    # after the last row is the next "row" of terminal transitions
+    touched, local = np.unique(np.concatenate([rows, next_rows]), return_inverse=True)
+    local = local.reshape(-1)
+    if touched[0] < 0:
+        touched, local = touched[1:], local - 1
+
+    values = table.values[touched].tolist() + [None]
+    q_rows = [values[i] for i in local[:len(rows)].tolist()]
+    next_q_rows = [values[i] for i in local[len(rows):].tolist()]
+    q_columns, rewards = columns.tolist(), records['reward'].tolist()
+    lr, gamma = table.lr, table.gamma
+
+    for _ in range(epochs):
+        for q_values, column, reward, next_q_values in zip(q_rows, q_columns, rewards, next_q_rows):
+            if next_q_values is not None:
+                q_target = reward + gamma * max(next_q_values)
+            else:
+                q_target = reward  # next state is terminal
+
+            q_values[column] += lr * (q_target - q_values[column])
+
+    table.values[touched] = values[:-1]
+    _replayed(table, records, rows, columns, epochs)
+
+
+def replay_synchronous(table, records, epochs=1):
+    """Applies every transition at once per epoch, with all targets computed from the previous epoch's values.
+
+    A (state, action) pair seen k times moves by the mean of its k updates, so the step size does not depend on
+    how often a pair was logged.
+    """
+    rows, next_rows = table.transition_rows(records['state'], records['next_state'], records['terminal'])
+    columns = action_columns(table, records['action'])
+    rewards = records['reward']
+    bootstrap = next_rows >= 0
+
+    n_states = len(table.states)
+    values = table.values[:n_states]
+
+    cells = rows * len(table.actions) + columns
+    counts = np.bincount(cells, minlength=values.size).reshape(values.shape)
+    seen = counts > 0
+
+    for _ in range(epochs):
+        q_target = rewards.copy()
+        q_target[bootstrap] += table.gamma * values[next_rows[bootstrap]].max(axis=1)
+
+        delta = np.zeros_like(values)
+        np.add.at(delta, (rows, columns), q_target - values[rows, columns])
+
+        values[seen] += table.lr * delta[seen] / counts[seen]
+
+    _replayed(table, records, rows, columns, epochs)
+
+
+def _replayed(table, records, rows, columns, epochs):
+    # the bookkeeping `learn` does per transition: update counters, dirty states and the end of every episode;
+    # rows stay put during a replay, so the episodes it went through end together afterwards
+    np.add.at(table.updates, (rows, columns), epochs)
+    table.dirty.update(records['state'].tolist())
+
+    if records['terminal'].any():
+        table.end_episode()
+
+
+MODES = {
+    'sequential': replay_sequential,
+    'synchronous': replay_synchronous,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train a Q-table from recorded transition logs, without SC2.')
+    parser.add_argument('logs', nargs='+')
+    parser.add_argument('--out', required=True, help='table to write (.qtab native, .gz pickle)')
+    parser.add_argument('--start', help='table to start from instead of all zeros')
+    parser.add_argument('--mode', choices=sorted(MODES), default='sequential')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--learning-rate', type=float, default=0.01)
+    parser.add_argument('--reward-decay', type=float, default=0.9)
+    args = parser.parse_args()
+
+    actions, records = load_transitions(args.logs)
+
+    table = QLearningTable(actions, learning_rate=args.learning_rate, reward_decay=args.reward_decay)
+    if args.start and os.path.isfile(args.start):
+        table.load(args.start)
+
+    start_time = time.time()
+    MODES[args.mode](table, records, args.epochs)
+    elapsed_time = time.time() - start_time
+
+    table.save(args.out)
+
+    updates = len(records) * args.epochs
+    print('%d transitions x %d epochs (%s): %.3f seconds, %.0f updates/second, %d states' % (
+        len(records), args.epochs, args.mode, elapsed_time, updates / max(elapsed_time, 1e-9), table.n_states))
+
+
+if __name__ == '__main__':
+    main()
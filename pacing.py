@@ -0,0 +1,114 @@
+import functools
+import os
+import time
+
+# overrides every agent's default pacing, e.g. BMBOT_PACING=off, BMBOT_PACING=realtime:1 or BMBOT_PACING=deadline:0.1
+PACING_ENV = 'BMBOT_PACING'
+
+# game loops per second of game time at the 'faster' game speed pysc2 plays at
+GAME_LOOPS_PER_SECOND = 22.4
+
+
+class Unthrottled:
+    # steps as fast as the game and the agent allow
+
+    def pace(self, obs):
+        pass
+
+    def __repr__(self):
+        return 'off'
+
+
+class Deadline:
+    """At most one step per `seconds` of wall time.
+
+    The time since the previous step, the game's share included, counts against the budget, so only what is
+    left of it is slept and a slow step is not slowed down further.
+    """
+
+    def __init__(self, seconds=0.1):
+        self.seconds = seconds
+        self._deadline = None
+
+    def pace(self, obs):
+        self._wait(self.seconds)
+
+    def _wait(self, interval):
+        now = time.perf_counter()
+
+        if self._deadline is not None and now < self._deadline:
+            time.sleep(self._deadline - now)
+            now = self._deadline
+
+        # a step that ran over starts the next budget from now, rather than catching up with shorter ones
+        self._deadline = now + interval
+
+    def __repr__(self):
+        return 'deadline:%g' % self.seconds
+
+
+class RealTimeRatio(Deadline):
+    """Game time advances at `ratio` times wall-clock time: 1 is real time, 2 twice as fast.
+
+    Each step's budget is the game loops it covers (from the observation's game_loop, or `step_mul` without one)
+    at GAME_LOOPS_PER_SECOND * ratio.
+    """
+
+    def __init__(self, ratio=1.0, step_mul=8):
+        super(RealTimeRatio, self).__init__()
+
+        self.ratio = ratio
+        self.step_mul = step_mul
+        self._game_loop = None
+
+    def pace(self, obs):
+        game_loop = obs.observation.get('game_loop')
+
+        if game_loop is None:
+            loops = self.step_mul
+        else:
+            game_loop = int(game_loop[0])
+            loops = game_loop - self._game_loop if self._game_loop is not None else self.step_mul
+            self._game_loop = game_loop
+
+        self._wait(max(0, loops) / (GAME_LOOPS_PER_SECOND * self.ratio))
+
+    def __repr__(self):
+        return 'realtime:%g' % self.ratio
+
+
+def parse_pacing(spec):
+    # 'off', 'realtime[:ratio]' or 'deadline[:seconds]'
+    mode, _, value = spec.strip().lower().partition(':')
+
+    if mode in ('', 'off', 'none', 'unthrottled'):
+        return Unthrottled()
+    if mode == 'realtime':
+        return RealTimeRatio(float(value) if value else 1.0)
+    if mode == 'deadline':
+        return Deadline(float(value) if value else 0.1)
+
+    raise ValueError('unknown pacing %r, expected off, realtime[:ratio] or deadline[:seconds]' % spec)
+
+
+def make_pacer(pacing=None, default=None):
+    """The pacer an agent uses: `pacing` if given (a pacer or a spec for parse_pacing), else the BMBOT_PACING
+    environment variable, else `default`, else unthrottled.
+    """
+    if pacing is None:
+        pacing = os.environ.get(PACING_ENV) or default
+
+    if pacing is None:
+        return Unthrottled()
+
+    return parse_pacing(pacing) if isinstance(pacing, str) else pacing
+
+
+def paced_step(step):
+    # decorates an agent's step(obs) to wait on `self.pacer` first
+    @functools.wraps(step)
+    def wrapper(self, obs):
+        self.pacer.pace(obs)
+        return step(self, obs)
+
+    return wrapper
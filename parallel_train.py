@@ -0,0 +1,142 @@
+import argparse
+import importlib
+import multiprocessing
+import os
+import queue
+import random
+import time
+
+import numpy as np
+
+from checkpoint import Checkpointer
+from qlearning_table import QLearningTable
+from run_loop import run_episode
+from shared_qtable import SharedQTable
+
+
+def load_object(spec):
+    # 'module:attr', e.g. 'sparse_agent:SparseAgent' or 'run_loop:make_sc2_env'
+    module, attr = spec.split(':')
+    return getattr(importlib.import_module(module), attr)
+
+
+def worker(worker_id, seed, table_spec, locks, agent_spec, env_spec, episodes, results):
+    random.seed(seed)
+    np.random.seed(seed)
+
+    table = SharedQTable(locks=locks, **table_spec)
+
+    # the env module first: a stand-in environment installs its fake pysc2 before the agent module imports it
+    env = load_object(env_spec)()
+
+    try:
+        agent = load_object(agent_spec)(qlearn=table)
+        agent.setup(env.observation_spec(), env.action_spec())
+
+        for _ in range(episodes):
+            reward, steps = run_episode(agent, env)
+            results.put((worker_id, reward, steps))
+    finally:
+        env.close()
+        table.close()
+        results.put((worker_id, None, None))
+
+
+def save(table, checkpoint):
+    # the shared values over the checkpointed table, written as a snapshot: counters are kept (the shared table has
+    # none, so states it added start at zero), and the delta segments the snapshot includes are removed
+    checkpoint.table.update_rows(*table.export())
+    checkpoint.save(snapshot=True)
+    checkpoint.flush()
+
+
+def train(agent_spec, env_spec, path, workers=None, episodes=10, capacity=1 << 20, stripes=64, seed=0,
+          save_every_seconds=60):
+    """Runs `workers` processes that each play `episodes` games, all learning into one SharedQTable.
+
+    The table is restored from `path` the way the agent's own Checkpointer does it (a legacy .gz next to it is
+    migrated, newer delta segments are replayed) and written back there as a snapshot periodically and at the end,
+    so the agent picks up from it with its counters.
+    """
+    workers = workers or os.cpu_count()
+    load_object(env_spec)  # see worker
+    agent_module = importlib.import_module(load_object(agent_spec).__module__)
+    actions = list(range(len(agent_module.smart_actions)))
+
+    legacy_path = None if path.endswith('.gz') else os.path.splitext(path)[0] + '.gz'
+    checkpoint = Checkpointer(QLearningTable(actions), path, migrate=agent_module.STATE_ENCODER.migrate_table,
+                              legacy_path=legacy_path)
+
+    context = multiprocessing.get_context('spawn')  # the game client doesn't survive a fork
+    locks = SharedQTable.create_locks(stripes, context)
+    table = SharedQTable(actions, capacity, locks)
+
+    try:
+        if checkpoint.restore():
+            table.update_rows(*checkpoint.table.export())
+            print('Restored %d states for %s' % (table.n_states, path))
+
+        results = context.Queue()
+        processes = [context.Process(target=worker, name='worker-%d' % i,
+                                     args=(i, seed + i, table.spec(), locks, agent_spec, env_spec, episodes,
+                                           results))
+                     for i in range(workers)]
+        for process in processes:
+            process.start()
+
+        start_time = last_save = time.time()
+        running = workers
+        finished = 0
+        wins = 0
+
+        while running:
+            try:
+                worker_id, reward, steps = results.get(timeout=1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    break  # a worker died without reporting
+            else:
+                if reward is None:
+                    running -= 1
+                else:
+                    finished += 1
+                    wins += reward > 0
+                    print('worker %d: reward %s after %d steps (%d episodes, %d states)' % (
+                        worker_id, reward, steps, finished, table.n_states))
+
+            if time.time() - last_save >= save_every_seconds:
+                save(table, checkpoint)
+                last_save = time.time()
+
+        for process in processes:
+            process.join()
+
+        save(table, checkpoint)
+
+        hours = (time.time() - start_time) / 3600
+        print('%d episodes in %.1f minutes with %d workers: %.1f episodes/hour, %d wins, %d states' % (
+            finished, hours * 60, workers, finished / max(hours, 1e-9), wins, table.n_states))
+    finally:
+        table.close()
+        checkpoint.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train one Q-table with several game processes in parallel.')
+    parser.add_argument('--agent', default='sparse_agent:SparseAgent')
+    parser.add_argument('--env', default='run_loop:make_sc2_env', help='module:callable returning a new env')
+    parser.add_argument('--path', default='sparse_agent_data.qtab', help='checkpoint to start from and save to')
+    parser.add_argument('--workers', type=int, default=None, help='defaults to the number of CPUs')
+    parser.add_argument('--episodes', type=int, default=10, help='episodes per worker')
+    parser.add_argument('--capacity', type=int, default=1 << 20, help='most states the shared table can hold')
+    parser.add_argument('--stripes', type=int, default=64, help='number of row locks')
+    parser.add_argument('--seed', type=int, default=0, help='worker i is seeded with seed + i')
+    parser.add_argument('--save-every', type=float, default=60, help='seconds between checkpoints')
+    args = parser.parse_args()
+
+    train(args.agent, args.env, args.path, args.workers, args.episodes, args.capacity, args.stripes, args.seed,
+          args.save_every)
+
+
+if __name__ == '__main__':
+    main()
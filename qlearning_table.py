@@ -0,0 +1,650 @@
+import atexit
+import os
+import tempfile
+
+import numpy as np
+
+from eligibility_traces import EligibilityTraces
+from exploration import EpsilonGreedy, select_batch
+from qtable_format import QTableFile, is_qtable_file, write_qtable
+
+_INITIAL_CAPACITY = 64
+_GROWTH_FACTOR = 2
+
+# a bounded table evicts down to this fraction of max_states, so evictions (and the index rebuild) are rare
+_EVICTION_TARGET = 0.875
+
+# counters saved with the table: lookups per state, and per (state, action) how often it was chosen and updated
+COUNTERS = ('visits', 'action_visits', 'updates')
+
+# every array with one entry per row, kept in step as rows are added, moved and dropped
+_ROW_ARRAYS = ('values', 'visits', 'last_seen') + COUNTERS[1:]
+
+# rough per-state cost of the dict entry, the states list slot and the key object, on top of the arrays
+_STATE_OVERHEAD_BYTES = 120
+
+
+# Stolen from https://github.com/MorvanZhou/Reinforcement-learning-with-tensorflow
+#
+# The Q-values live in a preallocated float array that doubles when it fills up, with a dict mapping each
+# state to its row, so adding a state is amortised O(1) and reads/writes are plain array indexing.
+# A table loaded from a native file keeps it memory-mapped as `base` and only copies a state's row into
+# the array the first time that state is seen.
+#
+# With `max_states` (or a `memory_budget` in bytes, turned into a number of states) the in-memory rows are
+# bounded: every lookup counts a visit and stamps the row with a clock, and at the end of each episode a table
+# over its bound drops the least visited states, lowest-valued and then least recent first. An evicted row that
+# has learned something since it was copied in (from the base file or the spill, or at all for a new state) is
+# written to `spill`, a native file in the temp directory that is memory-mapped like the base, so evicted rows
+# cost page cache rather than memory and eviction never loses learning, saved or not. The spill is rewritten
+# with every eviction and released once a Checkpointer snapshot that has it becomes the new base (see rebase);
+# without a Checkpointer it lasts as long as the table.
+#
+# Next to each row of values are two uint32 rows of counters, `action_visits` (times choose_action picked the
+# action) and `updates` (times learning updated it directly, not through a trace). They cost one increment per
+# call, so they can stay on, and are saved with the table; every lookup marks its state dirty, so delta segments
+# carry the counters (and `visits`) too. most_visited(), action_coverage() and counts() query them.
+class QLearningTable:
+    def __init__(self, actions, learning_rate=0.01, reward_decay=0.9, e_greedy=0.9, capacity=_INITIAL_CAPACITY,
+                 exploration=None, trace_decay=0.0, max_states=None, memory_budget=None):
+        self.actions = actions  # a list
+        self.lr = learning_rate
+        self.gamma = reward_decay
+
+        # lambda of Watkins Q(lambda); with 0, learn() is plain one-step Q-learning
+        self.trace_decay = trace_decay
+        self.traces = EligibilityTraces() if trace_decay > 0 else None
+
+        # how choose_action picks from a state's row (see exploration.py); epsilon-greedy with e_greedy by default
+        self.exploration = exploration if exploration is not None else EpsilonGreedy(e_greedy)
+
+        self.action_index = {action: i for i, action in enumerate(self.actions)}
+
+        self.states = []  # row -> state
+        self.state_index = {}  # state -> row
+        self.values = np.zeros((max(1, capacity), len(self.actions)), dtype=np.float64)
+        self.visits = np.zeros(max(1, capacity), dtype=np.int64)  # row -> lookups
+        self.last_seen = np.zeros(max(1, capacity), dtype=np.int64)  # row -> clock at the last lookup
+        self.action_visits = np.zeros(self.values.shape, dtype=np.uint32)  # (row, column) -> times chosen
+        self.updates = np.zeros(self.values.shape, dtype=np.uint32)  # (row, column) -> times learned
+
+        self.dirty = set()  # states added, updated or looked up (so their counters changed) since the last checkpoint
+        self.read_only = False  # nothing will save the table (see inference.FrozenTable), so lookups leave dirty alone
+
+        self.base = None  # read-only QTableFile behind the in-memory rows
+        self._base_rows = 0  # in-memory rows that were copied from base
+        self._base_counters = {}  # the base file's counter arrays, those it has
+        self.spill = None  # QTableFile of evicted rows that differ from where they were copied in from
+        self._spilled_rows = 0  # rows of spill whose state is not in memory
+
+        if memory_budget is not None:
+            max_states = memory_budget // self.bytes_per_state()
+        self.max_states = max_states
+
+        self.eviction_stats = {'evictions': 0, 'evicted': 0, 'evicted_visits': 0, 'max_evicted_visits': 0,
+                               'peak_states': 0}
+
+        self._clock = 0
+
+    @property
+    def n_states(self):
+        if self.base is None:
+            return len(self.states) + self._spilled_rows
+
+        # _base_rows counts the base's states that are in memory or spilled
+        return len(self.states) + self._spilled_rows + len(self.base) - self._base_rows
+
+    def bytes_per_state(self):
+        return sum(getattr(self, name)[:1].nbytes for name in _ROW_ARRAYS) + _STATE_OVERHEAD_BYTES
+
+    @property
+    def q_table(self):
+        return self.to_dataframe()
+
+    @q_table.setter
+    def q_table(self, table):
+        self.load_dataframe(table)
+
+    def choose_action(self, observation):
+        row = self.check_state_exist(observation)
+        column = self.exploration.select(self.values[row], row)
+        self.action_visits[row, column] += 1
+
+        return self.actions[column]
+
+    def choose_actions(self, observations):
+        # choose_action for an array of integer states at once, e.g. one per environment of an AgentBatch
+        rows = self.state_rows(np.asarray(observations, dtype=np.int64))
+        columns = select_batch(self.exploration, self.values[rows], rows)
+        np.add.at(self.action_visits, (rows, columns), 1)
+
+        return [self.actions[column] for column in columns.tolist()]
+
+    def learn(self, s, a, r, s_):
+        if s_ != 'terminal':
+            row_ = self.check_state_exist(s_)
+
+        row = self.check_state_exist(s)
+        column = self.action_index[a]
+
+        q_predict = self.values[row, column]
+        self.updates[row, column] += 1
+
+        if s_ != 'terminal':
+            q_target = r + self.gamma * self.values[row_].max()
+        else:
+            q_target = r  # next state is terminal
+
+        if self.traces is not None:
+            self._learn_traced(row, column, q_target - q_predict, s_ == 'terminal')
+        else:
+            # update
+            self.values[row, column] += self.lr * (q_target - q_predict)
+            self.dirty.add(s)
+
+        if s_ == 'terminal':
+            self.end_episode()
+
+    def _learn_traced(self, row, column, td_error, terminal):
+        # Watkins Q(lambda): the TD error of this step is credited to every recently visited (state, action) in
+        # proportion to its trace; an exploratory action ends the greedy path the earlier traces were following
+        traces = self.traces
+
+        if self.values[row, column] < self.values[row].max():
+            traces.clear()
+
+        traces.visit(row, column)
+        traces.apply(self.values, self.lr * td_error)
+
+        states = self.states
+        self.dirty.update([states[r] for r in traces.rows[:len(traces)].tolist()])
+
+        if terminal:
+            traces.clear()
+        else:
+            traces.decay(self.gamma * self.trace_decay)
+
+    def learn_batch(self, s, a, r, s_, terminal):
+        # applies an episode of transitions (arrays, as from ExperienceBuffer.columns) last one first, so a
+        # reward at the end of the episode reaches every earlier state in a single pass; traces are not needed
+        # for that and are left alone
+        n = len(s)
+        if not n:
+            return
+
+        # resolve every state to its row up front; after this the values array can no longer be reallocated
+        rows, next_rows = self.transition_rows(s, s_, terminal)
+        rows, next_rows = rows.tolist(), next_rows.tolist()
+
+        columns = [self.action_index[action] for action in a.tolist()]
+        rewards = r.tolist()
+        values = self.values
+
+        for i in range(n - 1, -1, -1):
+            row, column = rows[i], columns[i]
+
+            if next_rows[i] >= 0:
+                q_target = rewards[i] + self.gamma * values[next_rows[i]].max()
+            else:
+                q_target = rewards[i]  # next state is terminal
+
+            values[row, column] += self.lr * (q_target - values[row, column])
+
+        np.add.at(self.updates, (rows, columns), 1)
+        self.dirty.update(s.tolist())
+
+        if terminal[-1]:
+            self.end_episode()
+
+    def state_rows(self, states):
+        # rows of an array of integer states, adding the missing ones; one lookup per distinct state
+        keys, inverse, counts = np.unique(states, return_inverse=True, return_counts=True)
+        key_rows = np.array([self._row(state) for state in keys.tolist()], dtype=np.int64)
+
+        self.visits[key_rows] += counts
+        self.last_seen[key_rows] = self._clock
+        self._clock += 1
+        if not self.read_only:
+            self.dirty.update(keys.tolist())
+
+        return key_rows[inverse.reshape(-1)]
+
+    def transition_rows(self, s, s_, terminal):
+        # rows of s and s', with -1 for the next state of terminal transitions
+        rows = self.state_rows(np.concatenate([s, s_[~terminal]]))
+
+        next_rows = np.full(len(s), -1, dtype=np.int64)
+        next_rows[~terminal] = rows[len(s):]
+
+        return rows[:len(s)], next_rows
+
+    def check_state_exist(self, state):
+        row = self._row(state)
+
+        self.visits[row] += 1
+        self.last_seen[row] = self._clock
+        self._clock += 1
+        if not self.read_only:
+            self.dirty.add(state)
+
+        return row
+
+    def _row(self, state):
+        row = self.state_index.get(state)
+
+        if row is None:
+            # append new state to q table
+            row = len(self.states)
+
+            if row == len(self.values):
+                self._grow(row * _GROWTH_FACTOR)
+
+            self.states.append(state)
+            self.state_index[state] = row
+
+            spill_row = _lookup(self.spill, state)
+            base_row = _lookup(self.base, state) if spill_row < 0 else -1
+
+            if spill_row >= 0:
+                # back from eviction; it stays counted in _base_rows if base has it
+                self.values[row] = self.spill.values[spill_row]
+                for name in COUNTERS:
+                    getattr(self, name)[row] = self.spill.arrays[name][spill_row]
+                self._spilled_rows -= 1
+            elif base_row >= 0:
+                self.values[row] = self.base.values[base_row]
+                for name, array in self._base_counters.items():
+                    getattr(self, name)[row] = array[base_row]
+                self._base_rows += 1
+            elif not self.read_only:
+                self.dirty.add(state)
+
+        return row
+
+    def update_rows(self, states, values, counters=None):
+        # `counters` maps counter names to arrays parallel to states (e.g. a native file's arrays); missing ones
+        # keep their current values
+        for state, row_values in zip(states, values):
+            row = self._row(state)
+            self.values[row] = row_values
+
+        names = [name for name in COUNTERS if counters is not None and name in counters]
+        if names:
+            rows = [self.state_index[state] for state in states]
+            for name in names:
+                getattr(self, name)[rows] = counters[name]
+
+    def counters(self, rows):
+        # copies of the counters of the given rows (a list or a slice), as saved with the table
+        return {name: np.array(getattr(self, name)[rows]) for name in COUNTERS}
+
+    def is_spilled(self, state):
+        # evicted to the spill and not back in memory since
+        return state not in self.state_index and _lookup(self.spill, state) >= 0
+
+    def copy_rows(self, states):
+        # (values, counters) of the given states, each in memory or spilled, as copies
+        values = np.zeros((len(states), len(self.actions)), dtype=self.values.dtype)
+        counters = {name: np.zeros((len(states), ) + getattr(self, name).shape[1:], dtype=getattr(self, name).dtype)
+                    for name in COUNTERS}
+
+        for i, state in enumerate(states):
+            row = self.state_index.get(state)
+            if row is not None:
+                values[i] = self.values[row]
+                for name in COUNTERS:
+                    counters[name][i] = getattr(self, name)[row]
+            else:
+                spill_row = self.spill.lookup(state)
+                values[i] = self.spill.values[spill_row]
+                for name in COUNTERS:
+                    counters[name][i] = self.spill.arrays[name][spill_row]
+
+        return values, counters
+
+    def saved_rows(self):
+        # (states, values, counters) of the in-memory rows followed by the spilled ones, as copies: all the table
+        # holds that its base file may not
+        n = len(self.states)
+        states = list(self.states)
+        values = self.values[:n].copy()
+        counters = self.counters(slice(0, n))
+
+        if self._spilled_rows:
+            spilled = self._spill_only()
+
+            states += self.spill.keys[spilled].tolist()
+            values = np.concatenate([values, self.spill.values[spilled]])
+            counters = {name: np.concatenate([counters[name], self.spill.arrays[name][spilled]]) for name in COUNTERS}
+
+        return states, values, counters
+
+    def _spill_only(self):
+        # rows of the spill whose state is not in memory
+        keys = np.array([state for state in self.states if isinstance(state, int)], dtype=np.int64)
+        return np.flatnonzero(~np.isin(self.spill.keys, keys))
+
+    def _grow(self, capacity):
+        n = len(self.states)
+
+        for name in _ROW_ARRAYS:
+            array = getattr(self, name)
+            grown = np.zeros((capacity, ) + array.shape[1:], dtype=array.dtype)
+            grown[:n] = array[:n]
+            setattr(self, name, grown)
+
+    def end_episode(self):
+        # called at every terminal transition; the one point where rows may move, as nothing holds on to them
+        n = len(self.states)
+        self.eviction_stats['peak_states'] = max(self.eviction_stats['peak_states'], n)
+
+        if self.max_states is not None and n > self.max_states:
+            self.evict(int(self.max_states * _EVICTION_TARGET))
+
+    def evict(self, target):
+        # drops states until at most `target` remain in memory; returns how many
+        n = len(self.states)
+
+        # least visited first, then lowest-valued, then least recently seen; only integer states fit the spill
+        order = np.lexsort((self.last_seen[:n], np.abs(self.values[:n]).max(axis=1), self.visits[:n]))
+        order = order[np.array([isinstance(state, int) for state in self.states], dtype=bool)[order]]
+        victims = order[:max(0, n - target)]
+
+        if not len(victims):
+            return 0
+
+        keep = np.ones(n, dtype=bool)
+        keep[victims] = False
+        kept = np.flatnonzero(keep)
+
+        evicted = [self.states[row] for row in victims.tolist()]
+        evicted_visits = self.visits[victims]
+        dropped = self._spill(victims, evicted)
+
+        for name in _ROW_ARRAYS:
+            array = getattr(self, name)
+            array[:len(kept)] = array[kept]
+            array[len(kept):n] = 0
+
+        self.states = [self.states[row] for row in kept.tolist()]
+        self.state_index = {state: row for row, state in enumerate(self.states)}
+        self.dirty.difference_update(dropped)  # spilled ones stay dirty until a checkpoint writes them
+        self._recount()
+
+        if self.traces is not None:
+            self.traces.clear()
+
+        stats = self.eviction_stats
+        stats['evictions'] += 1
+        stats['evicted'] += len(victims)
+        stats['evicted_visits'] += int(evicted_visits.sum())
+        stats['max_evicted_visits'] = max(stats['max_evicted_visits'], int(evicted_visits.max()))
+
+        return len(victims)
+
+    def _spill(self, rows, states):
+        # writes the evicted rows that learned something since they were copied in to the spill; returns the
+        # states dropped outright, which lose only their visit counts
+        keys = np.array(states, dtype=np.int64)
+        values = self.values[rows]
+        counters = self.counters(rows)
+
+        # what a row started from: its spilled copy, else its base copy, else zeros
+        start_values = np.zeros_like(values)
+        start_updates = np.zeros_like(counters['updates'])
+        found = np.zeros(len(keys), dtype=bool)
+
+        for source in (self.spill, self.base):
+            if source is None or not len(source):
+                continue
+
+            source_rows = source.lookup_batch(keys)
+            hits = np.flatnonzero((source_rows >= 0) & ~found)
+            start_values[hits] = source.values[source_rows[hits]]
+            if 'updates' in source.arrays:
+                start_updates[hits] = source.arrays['updates'][source_rows[hits]]
+            found[hits] = True
+
+        changed = ~((values == start_values).all(axis=1) & (counters['updates'] == start_updates).all(axis=1))
+        if changed.any():
+            self._write_spill(keys[changed], values[changed], {name: counters[name][changed] for name in COUNTERS})
+
+        return [state for state, spilled in zip(states, changed.tolist()) if not spilled]
+
+    def _write_spill(self, keys, values, counters):
+        # a new spill with these rows over the current one's
+        fd, path = tempfile.mkstemp(prefix='qtable-spill-', suffix='.qtab')
+        os.close(fd)
+
+        keys, values, counters = merge_rows(self.spill, keys, values, counters)
+        write_qtable(path, self.actions, keys, values, arrays=counters)
+
+        self._release_spill()
+        self.spill = QTableFile(path)
+        atexit.register(self._release_spill)
+
+    def _release_spill(self):
+        if self.spill is None:
+            return
+
+        path, self.spill = self.spill.path, None
+        atexit.unregister(self._release_spill)
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # still mapped somewhere (Windows); the temp directory's cleanup gets it
+
+    def _recount(self):
+        # _spilled_rows and _base_rows from scratch
+        keys = np.array([state for state in self.states if isinstance(state, int)], dtype=np.int64)
+
+        if self.spill is not None:
+            spilled = self.spill.keys[self._spill_only()]
+            self._spilled_rows = len(spilled)
+            keys = np.concatenate([keys, spilled])
+        else:
+            self._spilled_rows = 0
+
+        base = self.base
+        self._base_rows = int(np.count_nonzero(base.lookup_batch(keys) >= 0)) if base and len(base) and len(keys) else 0
+
+    def rebase(self, base, spill=None):
+        # makes `base` (a QTableFile saved from this table's rows) the new base; `spill` (self.spill when the file's
+        # rows were taken) is in it and is released, unless an eviction has written a new spill since
+        self.base = base
+        self._base_counters = {name: base.arrays[name] for name in COUNTERS if name in base.arrays}
+
+        if spill is not None and spill is self.spill:
+            self._release_spill()
+
+        self._recount()
+
+    def remap_states(self, fn):
+        # rekeys every row with fn(state); rows mapped to None are dropped and the first row wins on collisions
+        rows = []
+        states = []
+        state_index = {}
+
+        for row, state in enumerate(self.states):
+            state = fn(state)
+
+            if state is not None and state not in state_index:
+                state_index[state] = len(states)
+                states.append(state)
+                rows.append(row)
+
+        for name in _ROW_ARRAYS:
+            array = getattr(self, name)
+            array[:len(rows)] = array[rows]
+            array[len(rows):] = 0
+
+        self.states = states
+        self.state_index = state_index
+        self.dirty = set(states)
+
+        if self.spill is not None:
+            spilled = self._spill_only()
+            old_keys = self.spill.keys[spilled].tolist()
+            values = np.array(self.spill.values[spilled])
+            counters = {name: np.array(self.spill.arrays[name][spilled]) for name in COUNTERS}
+            self._release_spill()
+
+            keys = {}  # state -> its row in the old spill, the first one mapped to it
+            for i, state in enumerate(old_keys):
+                state = fn(state)
+                if isinstance(state, int) and state not in state_index and state not in keys:
+                    keys[state] = i
+
+            if keys:
+                kept = list(keys.values())
+                self._write_spill(np.array(list(keys), dtype=np.int64), values[kept],
+                                  {name: counter[kept] for name, counter in counters.items()})
+                self.dirty.update(keys)
+
+        self._recount()
+
+        if self.traces is not None:
+            self.traces.clear()
+
+    def clear(self):
+        self.states = []
+        self.state_index = {}
+        for name in _ROW_ARRAYS:
+            getattr(self, name)[:] = 0
+        self.dirty = set()
+        self.base = None
+        self._base_rows = 0
+        self._base_counters = {}
+        self._release_spill()
+        self._spilled_rows = 0
+
+        if self.traces is not None:
+            self.traces.clear()
+
+    def export(self, with_counters=False):
+        # every state and its values (and counters), including rows of the base file that were never touched
+        states, values, counters = self.saved_rows()
+
+        return merge_rows(self.base, states, values, counters if with_counters else None)
+
+    def most_visited(self, n=10, counter='action_visits'):
+        # the n states with the highest total of `counter`, as (state, total) pairs, most visited first
+        states, _, counters = self.export(with_counters=True)
+        totals = counters[counter].reshape(len(states), -1).sum(axis=1, dtype=np.int64)
+
+        top = np.argsort(-totals, kind='stable')[:n]
+        return list(zip(np.asarray(states)[top].tolist(), totals[top].tolist()))
+
+    def action_coverage(self, counter='updates'):
+        # per action, the fraction of states in which `counter` is non-zero for it
+        states, _, counters = self.export(with_counters=True)
+        covered = np.count_nonzero(counters[counter], axis=0) / float(max(1, len(states)))
+
+        return dict(zip(self.actions, covered.tolist()))
+
+    def counts(self, state):
+        # the counters of one state, per action for the per-action ones; zeros for a state the table lacks
+        row = self.state_index.get(state)
+        if row is not None:
+            counters = {name: getattr(self, name)[row] for name in COUNTERS}
+        elif self.is_spilled(state):
+            spill_row = self.spill.lookup(state)
+            counters = {name: self.spill.arrays[name][spill_row] for name in COUNTERS}
+        else:
+            base_row = self.base.lookup(state) if self.base is not None and isinstance(state, int) else -1
+            counters = {name: self._base_counters[name][base_row] if base_row >= 0 and name in self._base_counters
+                        else np.zeros(getattr(self, name).shape[1:], dtype=getattr(self, name).dtype)
+                        for name in COUNTERS}
+
+        return {name: dict(zip(self.actions, counter.tolist())) if counter.ndim else int(counter)
+                for name, counter in counters.items()}
+
+    def to_dataframe(self):
+        return make_dataframe(self.actions, *self.export())
+
+    def load_dataframe(self, table):
+        table = table.reindex(columns=self.actions, fill_value=0.0)
+
+        self.clear()
+        if len(self.values) < len(table):
+            self._grow(len(table))
+
+        self.states = list(table.index)
+        self.state_index = {state: row for row, state in enumerate(self.states)}
+        self.values[:len(self.states)] = table.to_numpy(dtype=np.float64)
+        self.dirty = set()
+
+    def load(self, path):
+        if not is_qtable_file(path):
+            table = read_table(path)
+            self.load_dataframe(table)
+
+            return table.attrs
+
+        base = QTableFile(path)
+        if base.actions != list(self.actions):
+            # different action space, fall back to a full load that lines the columns up
+            self.load_dataframe(make_dataframe(base.actions, base.keys.tolist(), np.array(base.values)))
+        else:
+            self.clear()
+            self.base = base
+            self._base_counters = {name: base.arrays[name] for name in COUNTERS if name in base.arrays}
+
+        return base.attrs
+
+    def save(self, path, **attrs):
+        write_table(path, self.actions, *self.export(with_counters=True), **attrs)
+
+
+def _lookup(table_file, state):
+    # row of `state` in a QTableFile (or None), -1 if it is not there; only integer states can be
+    return table_file.lookup(state) if table_file is not None and isinstance(state, int) else -1
+
+
+def merge_rows(base, states, values, counters=None):
+    # in-memory rows take precedence over the same states in the base file; counters, if given, are merged the same
+    # way and returned as a third item, zero for base rows of a file saved without them
+    if base is None or not len(base):
+        return (states, values) if counters is None else (states, values, counters)
+
+    keep = ~np.isin(base.keys, np.array(states, dtype=np.int64))
+    merged = (np.concatenate([np.array(states, dtype=np.int64), base.keys[keep]]),
+              np.concatenate([values, base.values[keep]]))
+
+    if counters is None:
+        return merged
+
+    merged_counters = {}
+    for name, array in counters.items():
+        base_array = (base.arrays[name][keep] if name in base.arrays else
+                      np.zeros((np.count_nonzero(keep), ) + array.shape[1:], dtype=array.dtype))
+        merged_counters[name] = np.concatenate([array, base_array]).astype(array.dtype)
+
+    return merged + (merged_counters,)
+
+
+# pandas is only imported by the DataFrame and legacy .gz helpers below, so agents playing or training from a
+# native file never pay for it
+def make_dataframe(actions, states, values):
+    import pandas as pd
+
+    return pd.DataFrame(values, index=pd.Index(states, dtype=object), columns=actions)
+
+
+def read_table(path):
+    # legacy checkpoints are gzipped pickles of a pandas DataFrame, one row per state and one column per action
+    import pandas as pd
+
+    return pd.read_pickle(path, compression='gzip')
+
+
+def write_table(path, actions, states, values, counters=None, **attrs):
+    # .gz paths keep the legacy pickle format, which has no room for counters; anything else is written as a
+    # native file, with each counter as an extra array
+    if path.endswith('.gz'):
+        table = make_dataframe(actions, states, values)
+        table.attrs.update(attrs)
+        table.to_pickle(path, compression='gzip')
+    else:
+        write_qtable(path, actions, states, values, attrs=attrs,
+                     arrays=counters)
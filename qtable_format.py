@@ -0,0 +1,207 @@
+import argparse
+import importlib
+import json
+import os
+import shutil
+import struct
+
+import numpy as np
+
+# Native Q-table file: an 8-byte magic, a little-endian uint32 header length, a JSON header, then raw arrays,
+# each starting on a 64-byte boundary. The header lists the action space, free-form attrs and, for every array,
+# its dtype, shape and byte offset. `keys` holds the integer state keys in ascending order and `values` the
+# matching rows, so a file can be memory-mapped and searched without reading it.
+MAGIC = b'QTAB\x00\x01\r\n'
+_ALIGN = 64
+_PREFIX = struct.Struct('<8sI')
+
+
+def _align(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_qtable(path, actions, keys, values, attrs=None, arrays=None):
+    """Writes a table to `path`, sorting rows by key. `arrays` are extra per-state arrays stored alongside."""
+    keys = np.asarray(keys)
+    if len(keys) and keys.dtype.kind not in 'iu':
+        raise ValueError('native Q-tables need integer state keys, got %s' % keys.dtype)
+
+    keys = keys.astype('<i8')
+    order = np.argsort(keys, kind='stable')
+
+    columns = {'keys': keys[order], 'values': np.asarray(values, dtype='<f8').reshape(len(keys), len(actions))[order]}
+    for name, array in (arrays or {}).items():
+        columns[name] = np.asarray(array)[order]
+
+    with open(path, 'wb') as f:
+        write_qtable_columns(f, actions, columns, attrs)
+
+
+def write_qtable_columns(f, actions, columns, attrs=None):
+    # columns must already be sorted by their 'keys' array
+    specs = {name: (array.dtype, array.shape) for name, array in columns.items()}
+    layout, end = _write_header(f, actions, specs, attrs)
+
+    for name, array in columns.items():
+        f.seek(layout[name]['offset'])
+        f.write(np.ascontiguousarray(array).tobytes())
+
+    f.truncate(end)
+
+
+def write_qtable_parts(path, actions, specs, parts, attrs=None, buffer_size=1 << 20):
+    """Writes a table whose arrays are already on disk as raw little-endian bytes, one file per array.
+
+    `specs` maps each array name to its (dtype, shape) and `parts` to the raw file; rows must be sorted by key.
+    The parts are copied `buffer_size` bytes at a time, so the table never has to fit in memory.
+    """
+    with open(path, 'wb') as f:
+        layout, end = _write_header(f, actions, specs, attrs)
+
+        for name in specs:
+            f.seek(layout[name]['offset'])
+            with open(parts[name], 'rb') as part:
+                shutil.copyfileobj(part, f, buffer_size)
+
+        f.truncate(end)
+
+
+def _write_header(f, actions, specs, attrs):
+    # writes the prefix and header for arrays of the given (dtype, shape); returns their layout and the file's end
+    header = {
+        'version': 1,
+        'actions': list(actions),
+        'n_states': int(specs['keys'][1][0]),
+        'attrs': attrs or {},
+        'arrays': {},
+    }
+
+    # the offsets depend on the header length and vice versa; the header is padded to a fixed size once known
+    layout = {name: {'dtype': np.dtype(dtype).str, 'shape': [int(n) for n in shape], 'offset': 0}
+              for name, (dtype, shape) in specs.items()}
+    header['arrays'] = layout
+    size = _align(_PREFIX.size + len(json.dumps(header)) + 32 * len(layout))
+
+    offset = size
+    for name, (dtype, shape) in specs.items():
+        layout[name]['offset'] = offset
+        offset = _align(offset + np.dtype(dtype).itemsize * int(np.prod(shape)))
+
+    encoded = json.dumps(header).encode('utf-8')
+    assert len(encoded) <= size - _PREFIX.size
+
+    f.write(_PREFIX.pack(MAGIC, size - _PREFIX.size))
+    f.write(encoded.ljust(size - _PREFIX.size))
+
+    return layout, max(offset, size)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        magic, length = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError('%s is not a native Q-table file' % path)
+
+        return json.loads(f.read(length).decode('utf-8'))
+
+
+def is_qtable_file(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class QTableFile:
+    """A native Q-table file opened read-only; arrays are memory-mapped, so pages load on first touch."""
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        self.header = read_header(path)
+        self.actions = self.header['actions']
+        self.attrs = self.header['attrs']
+        self.n_states = self.header['n_states']
+
+        self.arrays = {}
+        for name, spec in self.header['arrays'].items():
+            dtype, shape = np.dtype(spec['dtype']), tuple(spec['shape'])
+
+            if not int(np.prod(shape)):
+                self.arrays[name] = np.zeros(shape, dtype=dtype)
+            elif mmap:
+                self.arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=spec['offset'], shape=shape)
+            else:
+                with open(path, 'rb') as f:
+                    f.seek(spec['offset'])
+                    self.arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+        self.keys = self.arrays['keys']
+        self.values = self.arrays['values']
+
+    def __len__(self):
+        return self.n_states
+
+    def lookup(self, key):
+        # row of `key`, or -1 if the state is not in the file
+        row = int(np.searchsorted(self.keys, key))
+
+        if row < self.n_states and self.keys[row] == key:
+            return row
+
+        return -1
+
+    def lookup_batch(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.keys, keys), max(0, self.n_states - 1))
+        found = (self.keys[rows] == keys) if self.n_states else np.zeros(len(keys), dtype=bool)
+
+        return np.where(found, rows, -1)
+
+
+def convert_pickle(src, dst, migrate_key=None):
+    """Rewrites a gzip-pickled DataFrame checkpoint as a native file, rekeying states with `migrate_key`."""
+    from qlearning_table import read_table
+
+    table = read_table(src)
+
+    keys = list(table.index)
+    if migrate_key is not None:
+        keys = [migrate_key(key) for key in keys]
+
+    keep = [i for i, key in enumerate(keys) if key is not None]
+    keys = np.array([keys[i] for i in keep], dtype=np.int64)
+    values = table.to_numpy(dtype=np.float64)[keep]
+
+    # several legacy rows can map to the same key; the first one wins, as in QLearningTable.remap_states
+    keys, first = np.unique(keys, return_index=True)
+
+    write_qtable(dst, list(table.columns), keys, values[first])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Native Q-table file tools.')
+    commands = parser.add_subparsers(dest='command')
+
+    convert = commands.add_parser('convert', help='convert a .gz pickle checkpoint to the native format')
+    convert.add_argument('src')
+    convert.add_argument('dst')
+    convert.add_argument('--agent', help="agent module whose STATE_ENCODER rekeys legacy str(np.ndarray) states, "
+                                         "e.g. bm_agent")
+
+    info = commands.add_parser('info', help='print the header of a native Q-table file')
+    info.add_argument('path')
+
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        migrate_key = importlib.import_module(args.agent).STATE_ENCODER.migrate_key if args.agent else None
+        convert_pickle(args.src, args.dst, migrate_key)
+        print('%s -> %s (%d -> %d bytes)' % (args.src, args.dst, os.path.getsize(args.src),
+                                             os.path.getsize(args.dst)))
+    elif args.command == 'info':
+        header = read_header(args.path)
+        print(json.dumps({k: v for k, v in header.items() if k != 'actions'}, indent=2))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
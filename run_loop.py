@@ -0,0 +1,56 @@
+import time
+
+
+def run_episode(agent, env, max_steps=0, latencies=None):
+    """Plays one episode the way pysc2's run_loop does; returns (final reward, steps).
+
+    The caller is expected to have called `agent.setup(...)` once for this environment. If `latencies` is a list,
+    the seconds each agent.step call took are appended to it.
+    """
+    agent.reset()
+    timestep = env.reset()[0]
+    steps = 0
+
+    while True:
+        steps += 1
+
+        if latencies is None:
+            call = agent.step(timestep)
+        else:
+            start = time.perf_counter()
+            call = agent.step(timestep)
+            latencies.append(time.perf_counter() - start)
+
+        if timestep.last() or (max_steps and steps >= max_steps):
+            return timestep.reward, steps
+
+        timestep = env.step([call])[0]
+
+
+def run_episodes(agent, env, episodes=1, max_steps=0):
+    agent.setup(env.observation_spec(), env.action_spec())
+
+    results = []
+    start_time = time.time()
+
+    for _ in range(episodes):
+        results.append(run_episode(agent, env, max_steps))
+
+    elapsed_time = time.time() - start_time
+    steps = sum(steps for _, steps in results)
+    print('Took %.3f seconds for %s steps: %.3f fps' % (elapsed_time, steps, steps / max(elapsed_time, 1e-9)))
+
+    return results
+
+
+def make_sc2_env(map_name='Simple64', step_mul=8, screen_size=84, minimap_size=64, difficulty='1', visualize=False):
+    # the real game, as the agents in this repo are normally run against it
+    from absl import flags
+    from pysc2.env import sc2_env
+
+    if not flags.FLAGS.is_parsed():
+        flags.FLAGS.mark_as_parsed()
+
+    return sc2_env.SC2Env(map_name=map_name, agent_race='T', bot_race='R', difficulty=difficulty,
+                          step_mul=step_mul, game_steps_per_episode=0, screen_size_px=(screen_size, screen_size),
+                          minimap_size_px=(minimap_size, minimap_size), visualize=visualize)
@@ -0,0 +1,3 @@
+# Local stand-in for the parts of pysc2 the agents in this repo touch, so that
+# agent step() code can run (and be timed) without a StarCraft II install.
+# Function ids and feature layer indices match pysc2 1.2.
@@ -0,0 +1,21 @@
+import collections
+import enum
+
+
+class StepType(enum.IntEnum):
+    FIRST = 0
+    MID = 1
+    LAST = 2
+
+
+class TimeStep(collections.namedtuple('TimeStep', ['step_type', 'reward', 'discount', 'observation'])):
+    __slots__ = ()
+
+    def first(self):
+        return self.step_type is StepType.FIRST
+
+    def mid(self):
+        return self.step_type is StepType.MID
+
+    def last(self):
+        return self.step_type is StepType.LAST
@@ -0,0 +1,56 @@
+import collections
+
+
+class Function(collections.namedtuple('Function', ['id', 'name'])):
+    __slots__ = ()
+
+
+class Functions(object):
+    def __init__(self, functions):
+        self._func_list = functions
+        self._func_dict = {f.name: f for f in functions}
+
+    def __getattr__(self, name):
+        try:
+            return self._func_dict[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._func_list[key]
+        return self._func_dict[key]
+
+    def __iter__(self):
+        return iter(self._func_list)
+
+    def __len__(self):
+        return len(self._func_list)
+
+
+# Only the functions used by the agents, with their pysc2 1.2 ids.
+FUNCTIONS = Functions([
+    Function(0, 'no_op'),
+    Function(1, 'move_camera'),
+    Function(2, 'select_point'),
+    Function(7, 'select_army'),
+    Function(13, 'Attack_minimap'),
+    Function(42, 'Build_Barracks_screen'),
+    Function(53, 'Build_Factory_screen'),
+    Function(71, 'Build_Reactor_quick'),
+    Function(79, 'Build_Refinery_screen'),
+    Function(89, 'Build_Starport_screen'),
+    Function(91, 'Build_SupplyDepot_screen'),
+    Function(92, 'Build_TechLab_quick'),
+    Function(264, 'Harvest_Gather_screen'),
+    Function(268, 'Harvest_Gather_SCV_screen'),
+    Function(336, 'Rally_Units_minimap'),
+    Function(470, 'Train_Hellion_quick'),
+    Function(477, 'Train_Marine_quick'),
+    Function(478, 'Train_Medivac_quick'),
+    Function(490, 'Train_SCV_quick'),
+])
+
+
+class FunctionCall(collections.namedtuple('FunctionCall', ['function', 'arguments'])):
+    __slots__ = ()
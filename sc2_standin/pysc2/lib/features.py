@@ -0,0 +1,21 @@
+import collections
+
+Feature = collections.namedtuple('Feature', ['index', 'name'])
+
+
+class ScreenFeatures(collections.namedtuple('ScreenFeatures', [
+        'height_map', 'visibility_map', 'creep', 'power', 'player_id',
+        'player_relative', 'unit_type', 'selected', 'unit_hit_points',
+        'unit_hit_points_ratio', 'unit_energy', 'unit_energy_ratio', 'unit_shields',
+        'unit_shields_ratio', 'unit_density', 'unit_density_aa', 'effects'])):
+    __slots__ = ()
+
+
+class MinimapFeatures(collections.namedtuple('MinimapFeatures', [
+        'height_map', 'visibility_map', 'creep', 'camera', 'player_id',
+        'player_relative', 'selected'])):
+    __slots__ = ()
+
+
+SCREEN_FEATURES = ScreenFeatures(*[Feature(i, name) for i, name in enumerate(ScreenFeatures._fields)])
+MINIMAP_FEATURES = MinimapFeatures(*[Feature(i, name) for i, name in enumerate(MinimapFeatures._fields)])
@@ -0,0 +1,187 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from exploration import EpsilonGreedy
+
+_EMPTY = -1
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK_64 = (1 << 64) - 1
+
+
+def _layout(capacity, n_actions):
+    slots = 1 << (2 * capacity - 1).bit_length()  # at most half full, keeps probe chains short
+
+    layout = {}
+    offset = 0
+    for name, dtype, shape in [('count', np.int64, (1, )),
+                               ('slot_keys', np.int64, (slots, )),
+                               ('slot_rows', np.int64, (slots, )),
+                               ('row_keys', np.int64, (capacity, )),
+                               ('values', np.float64, (capacity, n_actions))]:
+        layout[name] = (dtype, shape, offset)
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+    return layout, offset
+
+
+# A Q-table in one block of shared memory that several actor processes learn into at the same time.
+#
+# States are integer keys (see state_encoding.py) found through an open-addressing hash table; rows are
+# appended and never move, so each process caches state -> row in a plain dict once it has seen a state.
+#
+# Update policy:
+#   - adding a state takes the single insert lock; the row is zeroed before its key is published, so
+#     lookups never take a lock and never see a half-written row
+#   - a learn() read-modify-write of a row holds one of `n_stripes` locks, picked by row number, so
+#     workers only wait on each other when they update rows in the same stripe
+#   - choose_action() reads without locking; it may see a row mid-update, which costs at most one
+#     slightly stale greedy choice
+class SharedQTable:
+    def __init__(self, actions, capacity, locks, name=None, learning_rate=0.01, reward_decay=0.9, e_greedy=0.9,
+                 exploration=None):
+        self.actions = actions  # a list
+        self.capacity = capacity
+        self.lr = learning_rate
+        self.gamma = reward_decay
+
+        # each process gets its own copy of the strategy, with its own schedule and counts
+        self.exploration = exploration if exploration is not None else EpsilonGreedy(e_greedy)
+
+        self.action_index = {action: i for i, action in enumerate(self.actions)}
+
+        self.insert_lock = locks[0]
+        self.stripes = locks[1:]
+
+        layout, size = _layout(capacity, len(actions))
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.name = self.shm.name
+
+        views = {key: np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+                 for key, (dtype, shape, offset) in layout.items()}
+
+        self._count = views['count']  # states added so far
+        self._slot_keys = views['slot_keys']  # hash slot -> state, _EMPTY if free
+        self._slot_rows = views['slot_rows']  # hash slot -> row
+        self.row_keys = views['row_keys']  # row -> state
+        self.values = views['values']
+
+        if self.owner:
+            self._count[0] = 0
+            self._slot_keys[:] = _EMPTY
+
+        self._mask = len(self._slot_keys) - 1
+        self.state_index = {}  # state -> row, filled in as this process meets states
+
+    @staticmethod
+    def create_locks(n_stripes=64, context=multiprocessing):
+        # one insert lock followed by the row stripes; pass the same list to every process
+        return [context.Lock() for _ in range(n_stripes + 1)]
+
+    def spec(self):
+        # what another process needs to attach: SharedQTable(**table.spec(), locks=locks)
+        return {'actions': list(self.actions), 'capacity': self.capacity, 'name': self.name,
+                'learning_rate': self.lr, 'reward_decay': self.gamma, 'exploration': self.exploration}
+
+    @property
+    def n_states(self):
+        return int(self._count[0])
+
+    def choose_action(self, observation):
+        row = self.check_state_exist(observation)
+
+        return self.actions[self.exploration.select(self.values[row], row)]
+
+    def learn(self, s, a, r, s_):
+        if s_ != 'terminal':
+            row_ = self.check_state_exist(s_)
+
+        row = self.check_state_exist(s)
+        column = self.action_index[a]
+
+        with self.stripes[row % len(self.stripes)]:
+            q_predict = self.values[row, column]
+
+            if s_ != 'terminal':
+                q_target = r + self.gamma * self.values[row_].max()
+            else:
+                q_target = r  # next state is terminal
+
+            # update
+            self.values[row, column] += self.lr * (q_target - q_predict)
+
+    def learn_batch(self, s, a, r, s_, terminal):
+        # same backward sweep as QLearningTable.learn_batch, each update under its row's stripe lock
+        for i in range(len(s) - 1, -1, -1):
+            self.learn(int(s[i]), int(a[i]), float(r[i]), 'terminal' if terminal[i] else int(s_[i]))
+
+    def check_state_exist(self, state):
+        row = self.state_index.get(state)
+
+        if row is None:
+            row = self._find(state)
+
+            if row < 0:
+                with self.insert_lock:
+                    row = self._find(state)  # another worker may have added it meanwhile
+                    if row < 0:
+                        row = self._insert(state)
+
+            self.state_index[state] = row
+
+        return row
+
+    def _slot(self, state):
+        return ((int(state) * _HASH_MULTIPLIER) & _MASK_64) >> 32 & self._mask
+
+    def _find(self, state):
+        slot = self._slot(state)
+
+        while True:
+            key = self._slot_keys[slot]
+            if key == state:
+                return int(self._slot_rows[slot])
+            if key == _EMPTY:
+                return -1
+
+            slot = (slot + 1) & self._mask
+
+    def _insert(self, state):
+        if state < 0:
+            raise ValueError('shared Q-tables need non-negative integer states, got %r' % (state, ))
+
+        row = int(self._count[0])
+        if row == self.capacity:
+            raise RuntimeError('shared Q-table is full (%d states), raise its capacity' % self.capacity)
+
+        self.row_keys[row] = state
+        self.values[row] = 0.0
+
+        slot = self._slot(state)
+        while self._slot_keys[slot] != _EMPTY:
+            slot = (slot + 1) & self._mask
+
+        self._slot_rows[slot] = row
+        self._slot_keys[slot] = state  # published last, once the row is ready
+        self._count[0] = row + 1
+
+        return row
+
+    def update_rows(self, states, values):
+        for state, row_values in zip(states, values):
+            row = self.check_state_exist(int(state))
+            self.values[row] = row_values
+
+    def export(self):
+        n = self.n_states
+        return self.row_keys[:n].copy(), self.values[:n].copy()
+
+    def close(self):
+        # drop the views before the buffer they point into
+        self.values = self.row_keys = self._count = self._slot_keys = self._slot_rows = None
+        self.shm.close()
+
+        if self.owner:
+            self.shm.unlink()
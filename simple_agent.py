@@ -2,8 +2,10 @@ from pysc2.agents import base_agent
 from pysc2.lib import actions
 from pysc2.lib import features
 
-import time
-import sys
+from map_context import MapContext, closest_point
+from pacing import make_pacer, paced_step
+from step_profiler import make_profiler, profiled_step
+from unit_census import UnitCensus
 
 # Functions
 _BUILD_BARRACKS = actions.FUNCTIONS.Build_Barracks_screen.id
@@ -25,10 +27,8 @@ _TERRAN_BARRACKS = 21
 _TERRAN_COMMANDCENTER = 18
 _TERRAN_SUPPLYDEPOT = 19
 _TERRAN_SCV = 45
-_VESPENE_GEYSER = 342
 
 # Parameters
-_PLAYER_SELF = 1
 _SUPPLY_USED = 3
 _SUPPLY_MAX = 4
 _NOT_QUEUED = [0]
@@ -46,18 +46,16 @@ class SimpleAgent(base_agent.BaseAgent):
     army_rallied = False
     refinery_built = False
 
+    def __init__(self, pacing=None):
+        super(SimpleAgent, self).__init__()
+
+        # one step per 0.1s of wall time unless told otherwise (see pacing.py); 'off' runs as fast as the game
+        self.pacer = make_pacer(pacing, default='deadline:0.1')
+        self.map_context = MapContext()
+        self.profiler = make_profiler(type(self).__name__)
+
     def closestVespeneGeyser(self, base_cord_x, base_cord_y, geysers_x, geysers_y):
-        smallest = sys.maxsize
-        closest_geyser_index = 0
-        list_len = len(geysers_x)
-        for i in range(0,list_len):
-            geyser_x_cord = geysers_x[i]
-            geyser_y_cord = geysers_y[i]
-            distance = ((base_cord_x - geyser_x_cord)**2 + (base_cord_y - geyser_y_cord)**2)
-            if(distance < smallest):
-                smallest = distance
-                closest_geyser_index = i
-        return [geysers_x[closest_geyser_index], geysers_y[closest_geyser_index]]
+        return closest_point(base_cord_x, base_cord_y, geysers_x, geysers_y)
 
 
     def transformLocation(self, x, x_distance, y, y_distance):
@@ -66,19 +64,22 @@ class SimpleAgent(base_agent.BaseAgent):
 
         return [x + x_distance, y + y_distance]
 
+    @paced_step
+    @profiled_step
     def step(self, obs):
         super(SimpleAgent, self).step(obs)
 
-        time.sleep(0.1)
+        self.profiler.phase('features')
+        census = UnitCensus(obs.observation["screen"][_UNIT_TYPE])
+        context = self.map_context.update(obs, census)
+
+        self.base_top_left = context.base_top_left
 
-        if self.base_top_left is None:
-            player_y, player_x = (obs.observation["minimap"][_PLAYER_RELATIVE] == _PLAYER_SELF).nonzero()
-            self.base_top_left = player_y.mean() <= 31
+        self.profiler.phase('dispatch')
 
         if not self.supply_depot_built:
             if not self.scv_selected:
-                unit_type = obs.observation["screen"][_UNIT_TYPE]
-                unit_y, unit_x = (unit_type == _TERRAN_SCV).nonzero()
+                unit_y, unit_x = census.coords(_TERRAN_SCV)
 
                 target = [unit_x[0], unit_y[0]]
 
@@ -86,20 +87,18 @@ class SimpleAgent(base_agent.BaseAgent):
 
                 return actions.FunctionCall(_SELECT_POINT, [_NOT_QUEUED, target])
 
-            elif _BUILD_SUPPLYDEPOT in obs.observation["available_actions"]:
-                unit_type = obs.observation["screen"][_UNIT_TYPE]
-                unit_y, unit_x = (unit_type == _TERRAN_COMMANDCENTER).nonzero()
-                print("cmd center is at: x=" + str(unit_x.mean()) + " y=" + str(unit_y.mean()))
+            elif _BUILD_SUPPLYDEPOT in obs.observation["available_actions"] and context.cc_centroid is not None:
+                cc_x, cc_y = context.cc_centroid
+                print("cmd center is at: x=" + str(cc_x) + " y=" + str(cc_y))
 
-                target = self.transformLocation(int(unit_x.mean()), 0, int(unit_y.mean()), 20)
+                target = self.transformLocation(int(cc_x), 0, int(cc_y), 20)
 
                 self.supply_depot_built = True
 
                 return actions.FunctionCall(_BUILD_SUPPLYDEPOT, [_NOT_QUEUED, target])
         elif not self.refinery_built:
             if not self.scv_selected:
-                unit_type = obs.observation["screen"][_UNIT_TYPE]
-                unit_y, unit_x = (unit_type == _TERRAN_SCV).nonzero()
+                unit_y, unit_x = census.coords(_TERRAN_SCV)
                 target = [unit_x[0], unit_y[0]]
 
                 self.scv_selected = True
@@ -108,15 +107,12 @@ class SimpleAgent(base_agent.BaseAgent):
 
             elif _BUILD_REFINERY in obs.observation["available_actions"]:
                 print("attempting to build refinery")
-                unit_type = obs.observation["screen"][_UNIT_TYPE]
-                unit_y, unit_x = (unit_type == _VESPENE_GEYSER).nonzero()
+                unit_y, unit_x = context.geyser_y, context.geyser_x
                 print(str(unit_x))
                 print(str(unit_y))
-                unit_type = obs.observation["screen"][_UNIT_TYPE]
-                command_center_y, command_center_x = (unit_type == _TERRAN_COMMANDCENTER).nonzero()
 
                 target = unit_x[23], unit_y[23]
-                #target = self.closestVespeneGeyser(command_center_x[0], command_center_y[0], unit_x, unit_y)
+                #target = context.nearest_geyser()
 
                 self.refinery_built = True
 
@@ -125,19 +121,17 @@ class SimpleAgent(base_agent.BaseAgent):
 
 
         elif not self.barracks_built and self.refinery_built:
-            if _BUILD_BARRACKS in obs.observation["available_actions"]:
-                unit_type = obs.observation["screen"][_UNIT_TYPE]
-                unit_y, unit_x = (unit_type == _TERRAN_COMMANDCENTER).nonzero()
+            if _BUILD_BARRACKS in obs.observation["available_actions"] and context.cc_centroid is not None:
+                cc_x, cc_y = context.cc_centroid
 
-                target = self.transformLocation(int(unit_x.mean()), 20, int(unit_y.mean()), 0)
+                target = self.transformLocation(int(cc_x), 20, int(cc_y), 0)
 
                 self.barracks_built = True
 
                 return actions.FunctionCall(_BUILD_BARRACKS, [_NOT_QUEUED, target])
         elif not self.barracks_rallied:
             if not self.barracks_selected:
-                unit_type = obs.observation["screen"][_UNIT_TYPE]
-                unit_y, unit_x = (unit_type == _TERRAN_BARRACKS).nonzero()
+                unit_y, unit_x = census.coords(_TERRAN_BARRACKS)
 
                 if unit_y.any():
                     target = [int(unit_x.mean()), int(unit_y.mean())]
@@ -1,13 +1,15 @@
 import random
-import math
-
-import numpy as np
-import pandas as pd
 
 from pysc2.agents import base_agent
 from pysc2.lib import actions
 from pysc2.lib import features
 
+from map_context import MapContext
+from pacing import make_pacer, paced_step
+from qlearning_table import QLearningTable
+from step_profiler import make_profiler, profiled_step
+from unit_census import UnitCensus
+
 _NO_OP = actions.FUNCTIONS.no_op.id
 _SELECT_POINT = actions.FUNCTIONS.select_point.id
 _BUILD_SUPPLY_DEPOT = actions.FUNCTIONS.Build_SupplyDepot_screen.id
@@ -54,54 +56,11 @@ KILL_UNIT_REWARD = 0.2
 KILL_BUILDING_REWARD = 0.5
 
 
-# Stolen from https://github.com/MorvanZhou/Reinforcement-learning-with-tensorflow
-class QLearningTable:
-    def __init__(self, actions, learning_rate=0.01, reward_decay=0.9, e_greedy=0.9):
-        self.actions = actions  # a list
-        self.lr = learning_rate
-        self.gamma = reward_decay
-        self.epsilon = e_greedy
-        self.q_table = pd.DataFrame(columns=self.actions, dtype=np.float64)
-
-    def choose_action(self, observation):
-        self.check_state_exist(observation)
-
-        if np.random.uniform() < self.epsilon:
-            # choose best action
-            state_action = self.q_table.ix[observation, :]
-
-            # some actions have the same value
-            state_action = state_action.reindex(np.random.permutation(state_action.index))
-
-            action = state_action.idxmax()
-        else:
-            # choose random action
-            action = np.random.choice(self.actions)
-
-        return action
-
-    def learn(self, s, a, r, s_):
-        self.check_state_exist(s_)
-        self.check_state_exist(s)
-
-        q_predict = self.q_table.ix[s, a]
-        q_target = r + self.gamma * self.q_table.ix[s_, :].max()
-
-        # update
-        self.q_table.ix[s, a] += self.lr * (q_target - q_predict)
-
-    def check_state_exist(self, state):
-        if state not in self.q_table.index:
-            # append new state to q table
-            self.q_table = self.q_table.append(
-                pd.Series([0] * len(self.actions), index=self.q_table.columns, name=state))
-
-
 class SmartAgent(base_agent.BaseAgent):
-    def __init__(self):
+    def __init__(self, exploration=None, pacing=None):
         super(SmartAgent, self).__init__()
 
-        self.qlearn = QLearningTable(actions=list(range(len(smart_actions))))
+        self.qlearn = QLearningTable(actions=list(range(len(smart_actions))), exploration=exploration)
 
         self.previous_killed_unit_score = 0
         self.previous_killed_building_score = 0
@@ -109,24 +68,31 @@ class SmartAgent(base_agent.BaseAgent):
         self.previous_action = None
         self.previous_state = None
 
+        self.profiler = make_profiler(type(self).__name__)
+        self.pacer = make_pacer(pacing)
+        self.map_context = MapContext()
+
     def transformLocation(self, x, x_distance, y, y_distance):
         if not self.base_top_left:
             return [x - x_distance, y - y_distance]
 
         return [x + x_distance, y + y_distance]
 
+    @paced_step
+    @profiled_step
     def step(self, obs):
         super(SmartAgent, self).step(obs)
 
-        player_y, player_x = (obs.observation['minimap'][_PLAYER_RELATIVE] == _PLAYER_SELF).nonzero()
-        self.base_top_left = 1 if player_y.any() and player_y.mean() <= 31 else 0
+        self.profiler.phase('features')
+        census = UnitCensus(obs.observation['screen'][_UNIT_TYPE])
+        context = self.map_context.update(obs, census)
 
-        unit_type = obs.observation['screen'][_UNIT_TYPE]
+        self.base_top_left = context.base_top_left
 
-        depot_y, depot_x = (unit_type == _TERRAN_SUPPLY_DEPOT).nonzero()
+        depot_y, depot_x = census.coords(_TERRAN_SUPPLY_DEPOT)
         supply_depot_count = supply_depot_count = 1 if depot_y.any() else 0
 
-        barracks_y, barracks_x = (unit_type == _TERRAN_BARRACKS).nonzero()
+        barracks_y, barracks_x = census.coords(_TERRAN_BARRACKS)
         barracks_count = 1 if barracks_y.any() else 0
 
         supply_limit = obs.observation['player'][4]
@@ -135,6 +101,7 @@ class SmartAgent(base_agent.BaseAgent):
         killed_unit_score = obs.observation['score_cumulative'][5]
         killed_building_score = obs.observation['score_cumulative'][6]
 
+        self.profiler.phase('state')
         current_state = [
             supply_depot_count,
             barracks_count,
@@ -142,6 +109,7 @@ class SmartAgent(base_agent.BaseAgent):
             army_supply,
         ]
 
+        self.profiler.phase('learn')
         if self.previous_action is not None:
             reward = 0
 
@@ -153,6 +121,7 @@ class SmartAgent(base_agent.BaseAgent):
 
             self.qlearn.learn(str(self.previous_state), self.previous_action, reward, str(current_state))
 
+        self.profiler.phase('choose_action')
         rl_action = self.qlearn.choose_action(str(current_state))
         smart_action = smart_actions[rl_action]
 
@@ -161,12 +130,13 @@ class SmartAgent(base_agent.BaseAgent):
         self.previous_state = current_state
         self.previous_action = rl_action
 
+        self.profiler.phase('dispatch')
+
         if smart_action == ACTION_DO_NOTHING:
             return actions.FunctionCall(_NO_OP, [])
 
         elif smart_action == ACTION_SELECT_SCV:
-            unit_type = obs.observation['screen'][_UNIT_TYPE]
-            unit_y, unit_x = (unit_type == _TERRAN_SCV).nonzero()
+            unit_y, unit_x = census.coords(_TERRAN_SCV)
 
             if unit_y.any():
                 i = random.randint(0, len(unit_y) - 1)
@@ -176,27 +146,22 @@ class SmartAgent(base_agent.BaseAgent):
 
         elif smart_action == ACTION_BUILD_SUPPLY_DEPOT:
             if _BUILD_SUPPLY_DEPOT in obs.observation['available_actions']:
-                unit_type = obs.observation['screen'][_UNIT_TYPE]
-                unit_y, unit_x = (unit_type == _TERRAN_COMMANDCENTER).nonzero()
-
-                if unit_y.any():
-                    target = self.transformLocation(int(unit_x.mean()), 0, int(unit_y.mean()), 20)
+                if context.cc_centroid is not None:
+                    cc_x, cc_y = context.cc_centroid
+                    target = self.transformLocation(int(cc_x), 0, int(cc_y), 20)
 
                     return actions.FunctionCall(_BUILD_SUPPLY_DEPOT, [_NOT_QUEUED, target])
 
         elif smart_action == ACTION_BUILD_BARRACKS:
             if _BUILD_BARRACKS in obs.observation['available_actions']:
-                unit_type = obs.observation['screen'][_UNIT_TYPE]
-                unit_y, unit_x = (unit_type == _TERRAN_COMMANDCENTER).nonzero()
-
-                if unit_y.any():
-                    target = self.transformLocation(int(unit_x.mean()), 20, int(unit_y.mean()), 0)
+                if context.cc_centroid is not None:
+                    cc_x, cc_y = context.cc_centroid
+                    target = self.transformLocation(int(cc_x), 20, int(cc_y), 0)
 
                     return actions.FunctionCall(_BUILD_BARRACKS, [_NOT_QUEUED, target])
 
         elif smart_action == ACTION_SELECT_BARRACKS:
-            unit_type = obs.observation['screen'][_UNIT_TYPE]
-            unit_y, unit_x = (unit_type == _TERRAN_BARRACKS).nonzero()
+            unit_y, unit_x = census.coords(_TERRAN_BARRACKS)
 
             if unit_y.any():
                 target = [int(unit_x.mean()), int(unit_y.mean())]
@@ -1,14 +1,25 @@
 import random
-import math
-import os.path
 
 import numpy as np
-import pandas as pd
 
 from pysc2.agents import base_agent
 from pysc2.lib import actions
 from pysc2.lib import features
 
+from action_registry import ActionRegistry
+from building_tracker import BuildingTracker
+from checkpoint import Checkpointer
+from experience_buffer import ExperienceBuffer
+from inference import load_policy
+from map_context import MapContext
+from minimap_grid import hot_squares
+from pacing import make_pacer, paced_step
+from qlearning_table import QLearningTable
+from state_encoding import StateEncoder, bit_fields
+from step_profiler import make_profiler, profiled_step
+from transition_log import TransitionRecorder
+from unit_census import UnitCensus
+
 _NO_OP = actions.FUNCTIONS.no_op.id
 _SELECT_POINT = actions.FUNCTIONS.select_point.id
 _BUILD_SUPPLY_DEPOT = actions.FUNCTIONS.Build_SupplyDepot_screen.id
@@ -38,89 +49,203 @@ _SELECT_ALL = [2]
 
 DATA_FILE = 'sparse_agent_data'
 
+# Q-table checkpoints are also written this often, not just at the end of each episode
+CHECKPOINT_EVERY_SECONDS = 60
+
+# bytes the in-memory Q-table may use before rarely visited states are evicted at the end of an episode;
+# None lets it grow without bound
+QTABLE_MEMORY_BUDGET = None
+
+# enemy presence is tracked on a HOT_SQUARES_GRID x HOT_SQUARES_GRID split of the minimap
+HOT_SQUARES_GRID = 2
+
+# screen pixels covered by one building of each type counted in the state
+BUILDING_FOOTPRINTS = {_TERRAN_SUPPLY_DEPOT: 69, _TERRAN_BARRACKS: 137}
+
 ACTION_DO_NOTHING = 'donothing'
 ACTION_BUILD_SUPPLY_DEPOT = 'buildsupplydepot'
 ACTION_BUILD_BARRACKS = 'buildbarracks'
 ACTION_BUILD_MARINE = 'buildmarine'
 ACTION_ATTACK = 'attack'
 
-smart_actions = [
-    ACTION_DO_NOTHING,
-    ACTION_BUILD_SUPPLY_DEPOT,
-    ACTION_BUILD_BARRACKS,
-    ACTION_BUILD_MARINE,
-]
+# each smart action plays out over three steps, one per move_number
+ACTIONS = ActionRegistry(phases=3)
+ACTIONS.add(ACTION_DO_NOTHING)
+ACTIONS.add(ACTION_BUILD_SUPPLY_DEPOT)
+ACTIONS.add(ACTION_BUILD_BARRACKS)
+ACTIONS.add(ACTION_BUILD_MARINE)
 #refineries are 97px wide
 
-for mm_x in range(0, 64):
-    for mm_y in range(0, 64):
-        if (mm_x + 1) % 32 == 0 and (mm_y + 1) % 32 == 0:
-            smart_actions.append(ACTION_ATTACK + '_' + str(mm_x - 16) + '_' + str(mm_y - 16))
+ACTIONS.add_grid(ACTION_ATTACK, HOT_SQUARES_GRID)
 
+smart_actions = ACTIONS.names
 
-# Stolen from https://github.com/MorvanZhou/Reinforcement-learning-with-tensorflow
-class QLearningTable:
-    def __init__(self, actions, learning_rate=0.01, reward_decay=0.9, e_greedy=0.9):
-        self.actions = actions  # a list
-        self.lr = learning_rate
-        self.gamma = reward_decay
-        self.epsilon = e_greedy
-        self.q_table = pd.DataFrame(columns=self.actions, dtype=np.float64)
+STATE_ENCODER = StateEncoder([
+    ('cc_count', 1),
+    ('supply_depot_count', 4),
+    ('barracks_count', 4),
+    ('army_supply', 8),
+] + bit_fields('hot_square', HOT_SQUARES_GRID ** 2))
 
-    def choose_action(self, observation):
-        self.check_state_exist(observation)
 
-        if np.random.uniform() < self.epsilon:
-            # choose best action
-            state_action = self.q_table.ix[observation, :]
+@ACTIONS.handler(ACTION_BUILD_SUPPLY_DEPOT, 0)
+@ACTIONS.handler(ACTION_BUILD_BARRACKS, 0)
+def select_scv(agent, obs, census, action):
+    unit_y, unit_x = census.coords(_TERRAN_SCV)
 
-            # some actions have the same value
-            state_action = state_action.reindex(np.random.permutation(state_action.index))
+    if unit_y.any():
+        i = random.randint(0, len(unit_y) - 1)
+        target = [unit_x[i], unit_y[i]]
 
-            action = state_action.idxmax()
-        else:
-            # choose random action
-            action = np.random.choice(self.actions)
+        return actions.FunctionCall(_SELECT_POINT, [_NOT_QUEUED, target])
 
-        return action
 
-    def learn(self, s, a, r, s_):
-        self.check_state_exist(s_)
-        self.check_state_exist(s)
+@ACTIONS.handler(ACTION_BUILD_MARINE, 0)
+def select_barracks(agent, obs, census, action):
+    barracks_y, barracks_x = census.coords(_TERRAN_BARRACKS)
 
-        q_predict = self.q_table.ix[s, a]
+    if barracks_y.any():
+        i = random.randint(0, len(barracks_y) - 1)
+        target = [barracks_x[i], barracks_y[i]]
 
-        if s_ != 'terminal':
-            q_target = r + self.gamma * self.q_table.ix[s_, :].max()
-        else:
-            q_target = r  # next state is terminal
+        return actions.FunctionCall(_SELECT_POINT, [_SELECT_ALL, target])
+
+
+@ACTIONS.handler(ACTION_ATTACK, 0)
+def select_army(agent, obs, census, action):
+    if _SELECT_ARMY in obs.observation['available_actions']:
+        return actions.FunctionCall(_SELECT_ARMY, [_NOT_QUEUED])
+
+
+@ACTIONS.handler(ACTION_BUILD_SUPPLY_DEPOT, 1)
+def build_supply_depot(agent, obs, census, action):
+    supply_depot_count = agent.building_counts[_TERRAN_SUPPLY_DEPOT]
+
+    if supply_depot_count < 2 and _BUILD_SUPPLY_DEPOT in obs.observation['available_actions']:
+        cc = agent.map_context.cc_centroid
+        if cc is not None:
+            if supply_depot_count == 0:
+                target = agent.transformDistance(round(cc[0]), -35, round(cc[1]), 0)
+            elif supply_depot_count == 1:
+                target = agent.transformDistance(round(cc[0]), -25, round(cc[1]), -25)
+
+            return actions.FunctionCall(_BUILD_SUPPLY_DEPOT, [_NOT_QUEUED, target])
+
+
+@ACTIONS.handler(ACTION_BUILD_BARRACKS, 1)
+def build_barracks(agent, obs, census, action):
+    barracks_count = agent.building_counts[_TERRAN_BARRACKS]
+
+    if barracks_count < 2 and _BUILD_BARRACKS in obs.observation['available_actions']:
+        cc = agent.map_context.cc_centroid
+        if cc is not None:
+            if barracks_count == 0:
+                target = agent.transformDistance(round(cc[0]), 15, round(cc[1]), -9)
+            elif barracks_count == 1:
+                target = agent.transformDistance(round(cc[0]), 15, round(cc[1]), 12)
+
+            return actions.FunctionCall(_BUILD_BARRACKS, [_NOT_QUEUED, target])
+
+
+@ACTIONS.handler(ACTION_BUILD_MARINE, 1)
+def train_marine(agent, obs, census, action):
+    if _TRAIN_MARINE in obs.observation['available_actions']:
+        return actions.FunctionCall(_TRAIN_MARINE, [_QUEUED])
 
-        # update
-        self.q_table.ix[s, a] += self.lr * (q_target - q_predict)
 
-    def check_state_exist(self, state):
-        if state not in self.q_table.index:
-            # append new state to q table
-            self.q_table = self.q_table.append(
-                pd.Series([0] * len(self.actions), index=self.q_table.columns, name=state))
+@ACTIONS.handler(ACTION_ATTACK, 1)
+def attack(agent, obs, census, action):
+    do_it = True
+
+    if len(obs.observation['single_select']) > 0 and obs.observation['single_select'][0][0] == _TERRAN_SCV:
+        do_it = False
+
+    if len(obs.observation['multi_select']) > 0 and obs.observation['multi_select'][0][0] == _TERRAN_SCV:
+        do_it = False
+
+    if do_it and _ATTACK_MINIMAP in obs.observation["available_actions"]:
+        x_offset = random.randint(-1, 1)
+        y_offset = random.randint(-1, 1)
+
+        return actions.FunctionCall(_ATTACK_MINIMAP, [_NOT_QUEUED,
+                                                      agent.transformLocation(action.x + (x_offset * 8),
+                                                                              action.y + (y_offset * 8))])
+
+
+@ACTIONS.handler(ACTION_BUILD_SUPPLY_DEPOT, 2)
+@ACTIONS.handler(ACTION_BUILD_BARRACKS, 2)
+def send_scv_to_minerals(agent, obs, census, action):
+    if _HARVEST_GATHER in obs.observation['available_actions']:
+        unit_y, unit_x = agent.map_context.mineral_y, agent.map_context.mineral_x
+
+        if unit_y.any():
+            i = random.randint(0, len(unit_y) - 1)
+
+            m_x = unit_x[i]
+            m_y = unit_y[i]
+
+            target = [int(m_x), int(m_y)]
+
+            return actions.FunctionCall(_HARVEST_GATHER, [_QUEUED, target])
 
 
 class SparseAgent(base_agent.BaseAgent):
-    def __init__(self):
+    def __init__(self, qlearn=None, batch_learning=False, record_path=None, exploration=None, trace_decay=0.0,
+                 pacing=None, policy=None):
         super(SparseAgent, self).__init__()
 
-        self.qlearn = QLearningTable(actions=list(range(len(smart_actions))))
+        # a table passed in (e.g. a SharedQTable from parallel_train.py) is saved by whoever owns it, and explores
+        # with its own strategy; otherwise `exploration` (see exploration.py) defaults to epsilon-greedy.
+        # trace_decay > 0 learns with Watkins Q(lambda), so the end-of-game reward reaches back past the last step.
+        # `policy` (or BMBOT_POLICY) names a native table file to play greedily without learning or checkpointing
+        self.qlearn = qlearn
+        self.inference = False
+        if qlearn is None:
+            self.qlearn = load_policy(policy, list(range(len(smart_actions))))
+            self.inference = self.qlearn is not None
+        if self.qlearn is None:
+            self.qlearn = QLearningTable(actions=list(range(len(smart_actions))), exploration=exploration,
+                                         trace_decay=trace_decay, memory_budget=QTABLE_MEMORY_BUDGET)
+
+        # with batch learning, step only records transitions and the episode is learned from at obs.last()
+        self.experience = ExperienceBuffer() if batch_learning else None
+
+        # every transition learned from is also appended here, for offline_trainer.py
+        self.recorder = None
+        if record_path is not None:
+            self.recorder = TransitionRecorder(record_path, self.qlearn.actions, agent=type(self).__name__)
 
         self.previous_action = None
         self.previous_state = None
 
-        self.cc_y = None
-        self.cc_x = None
+        # base orientation, command center, minerals and geysers, worked out once per episode
+        self.map_context = MapContext()
+
+        # building counts by unit type, kept up to date from every screen and read by the action handlers
+        self.buildings = BuildingTracker(BUILDING_FOOTPRINTS)
+        self.building_counts = self.buildings.counts
 
         self.move_number = 0
 
-        if os.path.isfile(DATA_FILE + '.gz'):
-            self.qlearn.q_table = pd.read_pickle(DATA_FILE + '.gz', compression='gzip')
+        self.profiler = make_profiler(type(self).__name__)
+
+        # unthrottled unless `pacing` or BMBOT_PACING says otherwise, see pacing.py
+        self.pacer = make_pacer(pacing)
+
+        self.checkpoint = None
+        if qlearn is None and not self.inference:
+            self.checkpoint = Checkpointer(self.qlearn, DATA_FILE + '.qtab', every_seconds=CHECKPOINT_EVERY_SECONDS,
+                                           migrate=STATE_ENCODER.migrate_table, legacy_path=DATA_FILE + '.gz')
+            self.checkpoint.restore()
+
+    def learn(self, s, a, r, s_):
+        if self.recorder is not None:
+            self.recorder.append(s, a, r, s_)
+
+        if self.experience is not None:
+            self.experience.append(s, a, r, s_)
+        else:
+            self.qlearn.learn(s, a, r, s_)
 
     def transformDistance(self, x, x_distance, y, y_distance):
         if not self.base_top_left:
@@ -134,166 +259,124 @@ class SparseAgent(base_agent.BaseAgent):
 
         return [x, y]
 
-    def splitAction(self, action_id):
-        smart_action = smart_actions[action_id]
-
-        x = 0
-        y = 0
-        if '_' in smart_action:
-            smart_action, x, y = smart_action.split('_')
-
-        return (smart_action, x, y)
-
+    @paced_step
+    @profiled_step
     def step(self, obs):
-        super(SparseAgent, self).step(obs)
+        call, census = self.observe(obs)
+        if call is not None:
+            return call
 
-        if obs.last():
-            reward = obs.reward
+        current_key = rl_action = None
 
-            self.qlearn.learn(str(self.previous_state), self.previous_action, reward, 'terminal')
-
-            self.qlearn.q_table.to_pickle(DATA_FILE + '.gz', 'gzip')
+        if self.move_number == 0:
+            self.profiler.phase('state')
+            squares = hot_squares(obs.observation['minimap'][_PLAYER_RELATIVE], HOT_SQUARES_GRID, self.base_top_left)
+            current_key = STATE_ENCODER.encode(self.state_features(obs, census, squares))
 
-            self.previous_action = None
-            self.previous_state = None
+            self.profiler.phase('learn')
+            self.learn_previous(current_key)
 
-            self.move_number = 0
+            self.profiler.phase('choose_action')
+            rl_action = self.qlearn.choose_action(current_key)
 
-            return actions.FunctionCall(_NO_OP, [])
+        return self.act(obs, census, current_key, rl_action)
 
-        unit_type = obs.observation['screen'][_UNIT_TYPE]
+    # step() in the phases AgentBatch runs for many environments at once: observe, then at move 0 the state's
+    # features, learning from the previous move and the Q-table's choice, then act
 
-        if obs.first():
-            player_y, player_x = (obs.observation['minimap'][_PLAYER_RELATIVE] == _PLAYER_SELF).nonzero()
-            self.base_top_left = 1 if player_y.any() and player_y.mean() <= 31 else 0
+    def observe(self, obs, census=None):
+        # per-step bookkeeping; returns (call, census), with a call when the step ends here
+        super(SparseAgent, self).step(obs)
 
-            self.cc_y, self.cc_x = (unit_type == _TERRAN_COMMANDCENTER).nonzero()
+        self.profiler.phase('checkpoint')
+        if self.checkpoint is not None:
+            self.checkpoint.tick()
 
-        cc_y, cc_x = (unit_type == _TERRAN_COMMANDCENTER).nonzero()
-        cc_count = 1 if cc_y.any() else 0
+        if obs.last():
+            self.profiler.phase('learn')
+            reward = obs.reward
 
-        depot_y, depot_x = (unit_type == _TERRAN_SUPPLY_DEPOT).nonzero()
-        supply_depot_count = int(round(len(depot_y) / 69))
+            if self.previous_action is not None:
+                self.learn(self.previous_state, self.previous_action, reward, 'terminal')
 
-        barracks_y, barracks_x = (unit_type == _TERRAN_BARRACKS).nonzero()
-        barracks_count = int(round(len(barracks_y) / 137))
+            if self.experience is not None:
+                self.qlearn.learn_batch(*self.experience.columns())
+                self.experience.clear()
 
-        if self.move_number == 0:
-            self.move_number += 1
+            if self.recorder is not None:
+                self.recorder.flush()
 
-            current_state = np.zeros(8)
-            current_state[0] = cc_count
-            current_state[1] = supply_depot_count
-            current_state[2] = barracks_count
-            current_state[3] = obs.observation['player'][_ARMY_SUPPLY]
+            self.profiler.phase('checkpoint')
+            if self.checkpoint is not None:
+                self.checkpoint.save()
 
-            hot_squares = np.zeros(4)
-            enemy_y, enemy_x = (obs.observation['minimap'][_PLAYER_RELATIVE] == _PLAYER_HOSTILE).nonzero()
-            for i in range(0, len(enemy_y)):
-                y = int(math.ceil((enemy_y[i] + 1) / 32))
-                x = int(math.ceil((enemy_x[i] + 1) / 32))
+            self.previous_action = None
+            self.previous_state = None
 
-                hot_squares[((y - 1) * 2) + (x - 1)] = 1
+            self.move_number = 0
 
-            if not self.base_top_left:
-                hot_squares = hot_squares[::-1]
+            return actions.FunctionCall(_NO_OP, []), census
 
-            for i in range(0, 4):
-                current_state[i + 4] = hot_squares[i]
+        self.profiler.phase('features')
+        if census is None:
+            census = UnitCensus(obs.observation['screen'][_UNIT_TYPE])
 
-            if self.previous_action is not None:
-                self.qlearn.learn(str(self.previous_state), self.previous_action, 0, str(current_state))
+        self.base_top_left = self.map_context.update(obs, census).base_top_left
 
-            rl_action = self.qlearn.choose_action(str(current_state))
+        if obs.first():
+            self.buildings.reset()
 
-            self.previous_state = current_state
-            self.previous_action = rl_action
+        self.buildings.update(obs.observation['screen'][_UNIT_TYPE])
 
-            smart_action, x, y = self.splitAction(self.previous_action)
+        return None, census
 
-            if smart_action == ACTION_BUILD_BARRACKS or smart_action == ACTION_BUILD_SUPPLY_DEPOT:
-                unit_y, unit_x = (unit_type == _TERRAN_SCV).nonzero()
+    def state_features(self, obs, census, squares):
+        # the state vector STATE_ENCODER packs; `squares` are the hot squares of the minimap
+        cc_y, cc_x = census.coords(_TERRAN_COMMANDCENTER)
+        cc_count = 1 if cc_y.any() else 0
 
-                if unit_y.any():
-                    i = random.randint(0, len(unit_y) - 1)
-                    target = [unit_x[i], unit_y[i]]
+        supply_depot_count = self.buildings.count(_TERRAN_SUPPLY_DEPOT)
+        barracks_count = self.buildings.count(_TERRAN_BARRACKS)
 
-                    return actions.FunctionCall(_SELECT_POINT, [_NOT_QUEUED, target])
+        current_state = np.zeros(4 + HOT_SQUARES_GRID ** 2)
+        current_state[0] = cc_count
+        current_state[1] = supply_depot_count
+        current_state[2] = barracks_count
+        current_state[3] = obs.observation['player'][_ARMY_SUPPLY]
 
-            elif smart_action == ACTION_BUILD_MARINE:
-                if barracks_y.any():
-                    i = random.randint(0, len(barracks_y) - 1)
-                    target = [barracks_x[i], barracks_y[i]]
+        current_state[4:] = squares
 
-                    return actions.FunctionCall(_SELECT_POINT, [_SELECT_ALL, target])
+        return current_state
 
-            elif smart_action == ACTION_ATTACK:
-                if _SELECT_ARMY in obs.observation['available_actions']:
-                    return actions.FunctionCall(_SELECT_ARMY, [_NOT_QUEUED])
+    def learn_previous(self, current_key):
+        if self.previous_action is not None:
+            self.learn(self.previous_state, self.previous_action, 0, current_key)
 
-        elif self.move_number == 1:
+    def act(self, obs, census, current_key=None, rl_action=None):
+        # advances the move_number state machine; at move 0, current_key is the state and rl_action the choice
+        if self.move_number == 0:
             self.move_number += 1
 
-            smart_action, x, y = self.splitAction(self.previous_action)
-
-            if smart_action == ACTION_BUILD_SUPPLY_DEPOT:
-                if supply_depot_count < 2 and _BUILD_SUPPLY_DEPOT in obs.observation['available_actions']:
-                    if self.cc_y.any():
-                        if supply_depot_count == 0:
-                            target = self.transformDistance(round(self.cc_x.mean()), -35, round(self.cc_y.mean()), 0)
-                        elif supply_depot_count == 1:
-                            target = self.transformDistance(round(self.cc_x.mean()), -25, round(self.cc_y.mean()), -25)
-
-                        return actions.FunctionCall(_BUILD_SUPPLY_DEPOT, [_NOT_QUEUED, target])
-
-            elif smart_action == ACTION_BUILD_BARRACKS:
-                if barracks_count < 2 and _BUILD_BARRACKS in obs.observation['available_actions']:
-                    if self.cc_y.any():
-                        if barracks_count == 0:
-                            target = self.transformDistance(round(self.cc_x.mean()), 15, round(self.cc_y.mean()), -9)
-                        elif barracks_count == 1:
-                            target = self.transformDistance(round(self.cc_x.mean()), 15, round(self.cc_y.mean()), 12)
-
-                        return actions.FunctionCall(_BUILD_BARRACKS, [_NOT_QUEUED, target])
-
-            elif smart_action == ACTION_BUILD_MARINE:
-                if _TRAIN_MARINE in obs.observation['available_actions']:
-                    return actions.FunctionCall(_TRAIN_MARINE, [_QUEUED])
+            self.profiler.phase('dispatch')
 
-            elif smart_action == ACTION_ATTACK:
-                do_it = True
-
-                if len(obs.observation['single_select']) > 0 and obs.observation['single_select'][0][0] == _TERRAN_SCV:
-                    do_it = False
+            self.previous_state = current_key
+            self.previous_action = rl_action
 
-                if len(obs.observation['multi_select']) > 0 and obs.observation['multi_select'][0][0] == _TERRAN_SCV:
-                    do_it = False
+            call = ACTIONS.dispatch(self, 0, rl_action, obs, census)
 
-                if do_it and _ATTACK_MINIMAP in obs.observation["available_actions"]:
-                    x_offset = random.randint(-1, 1)
-                    y_offset = random.randint(-1, 1)
+        elif self.move_number == 1:
+            self.profiler.phase('move_1')
+            self.move_number += 1
 
-                    return actions.FunctionCall(_ATTACK_MINIMAP, [_NOT_QUEUED,
-                                                                  self.transformLocation(int(x) + (x_offset * 8),
-                                                                                         int(y) + (y_offset * 8))])
+            call = ACTIONS.dispatch(self, 1, self.previous_action, obs, census)
 
-        elif self.move_number == 2:
+        else:
+            self.profiler.phase('move_2')
             self.move_number = 0
 
-            smart_action, x, y = self.splitAction(self.previous_action)
-
-            if smart_action == ACTION_BUILD_BARRACKS or smart_action == ACTION_BUILD_SUPPLY_DEPOT:
-                if _HARVEST_GATHER in obs.observation['available_actions']:
-                    unit_y, unit_x = (unit_type == _NEUTRAL_MINERAL_FIELD).nonzero()
-
-                    if unit_y.any():
-                        i = random.randint(0, len(unit_y) - 1)
-
-                        m_x = unit_x[i]
-                        m_y = unit_y[i]
-
-                        target = [int(m_x), int(m_y)]
+            call = ACTIONS.dispatch(self, 2, self.previous_action, obs, census)
 
-                        return actions.FunctionCall(_HARVEST_GATHER, [_QUEUED, target])
+        if call is not None:
+            return call
 
         return actions.FunctionCall(_NO_OP, [])
\ No newline at end of file
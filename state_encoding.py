@@ -0,0 +1,59 @@
+import numpy as np
+
+
+def bit_fields(name, count):
+    return [('%s_%d' % (name, i), 1) for i in range(count)]
+
+
+class StateEncoder:
+    """Packs a fixed layout of small non-negative integer features into one integer Q-table key.
+
+    `fields` is a list of (name, bits) pairs; the first field goes in the most significant bits, so keys sort
+    the same way the feature vectors would. Values outside a field's range are clipped to it.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.names = [name for name, _ in fields]
+
+        bits = np.array([width for _, width in fields], dtype=np.int64)
+        self.width = int(bits.sum())
+        if self.width > 63:
+            raise ValueError('state layout needs %d bits, at most 63 fit in a key' % self.width)
+
+        self.shifts = self.width - np.cumsum(bits)
+        self.maxima = (np.int64(1) << bits) - 1
+        self.multipliers = np.int64(1) << self.shifts
+
+    def __len__(self):
+        return len(self.fields)
+
+    def encode(self, values):
+        return int(np.clip(np.asarray(values, dtype=np.int64), 0, self.maxima).dot(self.multipliers))
+
+    def encode_batch(self, values):
+        return np.clip(np.asarray(values, dtype=np.int64), 0, self.maxima).dot(self.multipliers)
+
+    def decode(self, key):
+        return (np.int64(key) >> self.shifts) & self.maxima
+
+    def decode_batch(self, keys):
+        return (np.asarray(keys, dtype=np.int64)[:, None] >> self.shifts) & self.maxima
+
+    def migrate_key(self, state):
+        # old checkpoints are keyed by str(np.ndarray), e.g. '[ 1.  2.  0.  0.  1.  0.  0.  0.]'
+        if isinstance(state, (int, np.integer)):
+            return int(state)
+
+        try:
+            values = np.array(str(state).strip('[]').split(), dtype=np.float64)
+        except ValueError:
+            return None  # 'terminal' and other non-state rows
+
+        if len(values) != len(self.fields):
+            return None
+
+        return self.encode(values)
+
+    def migrate_table(self, table):
+        table.remap_states(self.migrate_key)
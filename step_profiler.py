@@ -0,0 +1,145 @@
+import functools
+import os
+import sys
+import time
+
+import numpy as np
+
+# set to anything but '' or '0' to time agent step() phases, e.g. BMBOT_PROFILE=1 python -m pysc2.bin.agent ...
+PROFILE_ENV = 'BMBOT_PROFILE'
+PROFILE = os.environ.get(PROFILE_ENV, '') not in ('', '0')
+
+_RING_SIZE = 4096
+
+
+class StepProfiler:
+    """Per-phase step() timers.
+
+    `phase(name)` ends the running phase and starts `name`, so a step is timed by naming each phase as it starts;
+    whatever is running when step returns is closed by `end`. Each phase keeps its last `size` samples in a ring
+    buffer for percentiles, plus an exact count and total. `dump` prints the episode's summary and starts over.
+    """
+
+    def __init__(self, name, size=_RING_SIZE, file=None):
+        self.name = name
+        self.size = size
+        self.file = file or sys.stderr
+        self.episode = 0
+
+        self.reset()
+
+    def reset(self):
+        self.samples = {}  # phase -> ring buffer of durations in seconds
+        self.counts = {}
+        self.totals = {}
+
+        self._phase = None
+        self._start = 0.0
+        self._step_start = 0.0
+
+    def begin(self):
+        self._phase = None
+        self._start = self._step_start = time.perf_counter()
+
+    def phase(self, name):
+        now = time.perf_counter()
+
+        if self._phase is not None:
+            self._record(self._phase, now - self._start)
+
+        self._phase = name
+        self._start = now
+
+    def end(self):
+        now = time.perf_counter()
+
+        if self._phase is not None:
+            self._record(self._phase, now - self._start)
+            self._phase = None
+
+        self._record('step', now - self._step_start)
+
+    def _record(self, name, seconds):
+        count = self.counts.get(name)
+
+        if count is None:
+            self.samples[name] = np.zeros(self.size)
+            count = 0
+
+        self.samples[name][count % self.size] = seconds
+        self.counts[name] = count + 1
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def summary(self):
+        # phase -> (calls, mean, p50, p99, total), in microseconds except the total in milliseconds
+        summary = {}
+
+        for name, count in self.counts.items():
+            samples = self.samples[name][:min(count, self.size)] * 1e6
+            p50, p99 = np.percentile(samples, [50, 99])
+            summary[name] = (count, self.totals[name] * 1e6 / count, p50, p99, self.totals[name] * 1e3)
+
+        return summary
+
+    def dump(self):
+        self.episode += 1
+        summary = self.summary()
+        step_total = summary['step'][4] if 'step' in summary else 0.0
+
+        print('%s episode %d step() profile:' % (self.name, self.episode), file=self.file)
+        print('  %-16s %8s %10s %10s %10s %12s %6s' % ('phase', 'calls', 'mean (us)', 'p50 (us)', 'p99 (us)',
+                                                      'total (ms)', 'share'), file=self.file)
+
+        for name, (count, mean, p50, p99, total) in sorted(summary.items(), key=lambda item: -item[1][4]):
+            print('  %-16s %8d %10.1f %10.1f %10.1f %12.2f %5.1f%%' % (
+                name, count, mean, p50, p99, total, 100.0 * total / step_total if step_total else 0.0),
+                file=self.file)
+
+        self.reset()
+
+
+class NullProfiler:
+    # stands in for StepProfiler when profiling is off, so agents can call it unconditionally
+
+    def begin(self):
+        pass
+
+    def phase(self, name):
+        pass
+
+    def end(self):
+        pass
+
+    def dump(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def make_profiler(name):
+    return StepProfiler(name) if PROFILE else NULL_PROFILER
+
+
+def profiled_step(step):
+    """Decorates an agent's step(obs): times each call on `self.profiler` and dumps it at obs.last().
+
+    With profiling off the method is returned as is.
+    """
+    if not PROFILE:
+        return step
+
+    @functools.wraps(step)
+    def wrapper(self, obs):
+        profiler = self.profiler
+        profiler.begin()
+
+        try:
+            return step(self, obs)
+        finally:
+            profiler.end()
+
+            if obs.last():
+                profiler.dump()
+
+    return wrapper
@@ -0,0 +1,289 @@
+import os
+import sys
+
+import numpy as np
+
+STANDIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sc2_standin')
+
+
+def install_pysc2_standin(force=False):
+    """Makes `import pysc2` resolve to the local stand-in unless the real package is importable."""
+    if not force:
+        try:
+            import pysc2.agents.base_agent  # noqa: F401
+            return False
+        except Exception:
+            for name in [m for m in sys.modules if m == 'pysc2' or m.startswith('pysc2.')]:
+                del sys.modules[name]
+
+    if STANDIN_DIR not in sys.path:
+        sys.path.insert(0, STANDIN_DIR)
+
+    return True
+
+
+install_pysc2_standin()
+
+from pysc2.env import environment  # noqa: E402
+from pysc2.lib import actions  # noqa: E402
+from pysc2.lib import features  # noqa: E402
+
+_SCREEN_PLAYER_RELATIVE = features.SCREEN_FEATURES.player_relative.index
+_SCREEN_PLAYER_ID = features.SCREEN_FEATURES.player_id.index
+_SCREEN_UNIT_TYPE = features.SCREEN_FEATURES.unit_type.index
+_MINIMAP_PLAYER_RELATIVE = features.MINIMAP_FEATURES.player_relative.index
+_MINIMAP_CAMERA = features.MINIMAP_FEATURES.camera.index
+
+_PLAYER_SELF = 1
+_PLAYER_NEUTRAL = 3
+_PLAYER_HOSTILE = 4
+
+_TERRAN_COMMANDCENTER = 18
+_TERRAN_SUPPLY_DEPOT = 19
+_TERRAN_REFINERY = 20
+_TERRAN_BARRACKS = 21
+_TERRAN_FACTORY = 27
+_TERRAN_STARPORT = 28
+_TERRAN_SCV = 45
+_TERRAN_MARINE = 48
+_NEUTRAL_MINERAL_FIELD = 341
+_VESPENE_GAS = 342
+
+_F = actions.FUNCTIONS
+
+# type -> (width, height, mineral cost, build steps)
+_BUILDINGS = {
+    _F.Build_SupplyDepot_screen.id: (_TERRAN_SUPPLY_DEPOT, 8, 9, 100, 20),
+    _F.Build_Barracks_screen.id: (_TERRAN_BARRACKS, 12, 12, 150, 40),
+    _F.Build_Factory_screen.id: (_TERRAN_FACTORY, 11, 11, 150, 40),
+    _F.Build_Starport_screen.id: (_TERRAN_STARPORT, 11, 11, 150, 40),
+}
+
+# train function -> (producer type, supply, mineral cost)
+_TRAINING = {
+    _F.Train_SCV_quick.id: (_TERRAN_COMMANDCENTER, 1, 50),
+    _F.Train_Marine_quick.id: (_TERRAN_BARRACKS, 1, 50),
+    _F.Train_Hellion_quick.id: (_TERRAN_FACTORY, 2, 100),
+    _F.Train_Medivac_quick.id: (_TERRAN_STARPORT, 2, 100),
+}
+
+_SCORE_KILLED_UNITS = 5
+_SCORE_KILLED_STRUCTURES = 6
+
+
+class SyntheticEnv(object):
+    """A tiny scripted stand-in for `sc2_env.SC2Env` on a Simple64-like map.
+
+    It draws the `unit_type`/`player_relative` layers the agents read, places
+    buildings and trains units in response to their actions and ends each
+    episode with a win/tie/loss reward, so that agent `step()` code sees
+    realistic shapes, dtypes and state changes.
+    """
+
+    def __init__(self, screen_size=84, minimap_size=64, episode_steps=400, enemy_blobs=12, step_mul=8,
+                 seed=None):
+        self.screen_size = screen_size
+        self.minimap_size = minimap_size
+        self.episode_steps = episode_steps
+        self.enemy_blobs = enemy_blobs
+        self.step_mul = step_mul
+        self.rng = np.random.RandomState(seed)
+
+    def observation_spec(self):
+        return {
+            'screen': (len(features.SCREEN_FEATURES), self.screen_size, self.screen_size),
+            'minimap': (len(features.MINIMAP_FEATURES), self.minimap_size, self.minimap_size),
+            'player': (11,),
+            'score_cumulative': (13,),
+        }
+
+    def action_spec(self):
+        return {'functions': list(_F)}
+
+    def close(self):
+        pass
+
+    def reset(self):
+        rng = self.rng
+        size = self.screen_size
+
+        self._step = 0
+        self._minerals = 50
+        self._food_workers = 12
+        self._food_army = 0
+        self._score = np.zeros(13, dtype=np.int32)
+        self._selected = None
+        self._army_selected = False
+        self._base_top_left = bool(rng.randint(2))
+        self._pending = []
+
+        centre = size // 2
+        self._units = [(_TERRAN_COMMANDCENTER, centre - 8, centre - 8, 17, 17)]
+        for i in range(8):
+            self._units.append((_NEUTRAL_MINERAL_FIELD, 4 + (i % 2) * 4, 14 + i * 7, 4, 3))
+        self._units.append((_VESPENE_GAS, 14, 4, 9, 9))
+        self._units.append((_VESPENE_GAS, 14, size - 13, 9, 9))
+        self._scvs = np.column_stack([rng.randint(12, 30, 12), rng.randint(10, size - 10, 12)])
+
+        self._enemy = np.column_stack([rng.randint(0, self.minimap_size, self.enemy_blobs),
+                                       rng.randint(0, self.minimap_size, self.enemy_blobs)])
+
+        return [self._timestep(environment.StepType.FIRST, 0)]
+
+    def step(self, function_calls):
+        self._step += 1
+        self._minerals += 10
+        self._apply(function_calls[0])
+        self._advance()
+
+        if self._step >= self.episode_steps:
+            p_win = min(0.9, 0.1 + self._food_army / 40.0)
+            reward = int(self.rng.choice([1, 0, -1], p=[p_win, 0.1, 0.9 - p_win]))
+            return [self._timestep(environment.StepType.LAST, reward)]
+
+        return [self._timestep(environment.StepType.MID, 0)]
+
+    def _supply_cap(self):
+        depots = sum(1 for unit in self._units if unit[0] == _TERRAN_SUPPLY_DEPOT)
+        return min(200, 15 + 8 * depots)
+
+    def _has(self, unit_type):
+        return any(unit[0] == unit_type for unit in self._units)
+
+    def _apply(self, call):
+        function, arguments = call.function, call.arguments
+
+        if function == _F.select_point.id:
+            x, y = [int(v) for v in arguments[1]]
+            self._selected = self._render_unit_type()[np.clip(y, 0, self.screen_size - 1),
+                                                      np.clip(x, 0, self.screen_size - 1)] or None
+            self._army_selected = False
+
+        elif function == _F.select_army.id:
+            self._selected = _TERRAN_MARINE if self._food_army else None
+            self._army_selected = True
+
+        elif function in _BUILDINGS and self._selected == _TERRAN_SCV:
+            unit_type, width, height, cost, build_steps = _BUILDINGS[function]
+            if self._minerals >= cost:
+                x, y = [int(v) for v in arguments[1]]
+                self._minerals -= cost
+                self._pending.append((self._step + build_steps,
+                                      (unit_type, x - width // 2, y - height // 2, width, height)))
+
+        elif function == _F.Build_Refinery_screen.id and self._minerals >= 75:
+            x, y = [int(v) for v in arguments[1]]
+            self._minerals -= 75
+            self._pending.append((self._step + 30, (_TERRAN_REFINERY, x - 5, y - 5, 10, 10)))
+
+        elif function in _TRAINING:
+            producer, supply, cost = _TRAINING[function]
+            used = self._food_workers + self._food_army
+            if self._has(producer) and self._minerals >= cost and used + supply <= self._supply_cap():
+                self._minerals -= cost
+                if producer == _TERRAN_COMMANDCENTER:
+                    self._food_workers += supply
+                else:
+                    self._food_army += supply
+
+        elif function == _F.Attack_minimap.id and self._army_selected and self._food_army:
+            if self.rng.uniform() < 0.2:
+                self._score[_SCORE_KILLED_UNITS] += 50
+                self._food_army = max(0, self._food_army - 1)
+            if self.rng.uniform() < 0.05:
+                self._score[_SCORE_KILLED_STRUCTURES] += 100
+
+    def _advance(self):
+        rng = self.rng
+
+        done = [unit for due, unit in self._pending if due <= self._step]
+        self._pending = [(due, unit) for due, unit in self._pending if due > self._step]
+        self._units.extend(done)
+
+        self._scvs += rng.randint(-1, 2, self._scvs.shape)
+        np.clip(self._scvs, 2, self.screen_size - 3, out=self._scvs)
+
+        self._enemy += rng.randint(-1, 2, self._enemy.shape)
+        np.clip(self._enemy, 0, self.minimap_size - 2, out=self._enemy)
+
+    def _render_unit_type(self):
+        unit_type = np.zeros((self.screen_size, self.screen_size), dtype=np.int32)
+
+        for kind, x, y, width, height in self._units:
+            unit_type[max(0, y):max(0, y + height), max(0, x):max(0, x + width)] = kind
+
+        for x, y in self._scvs:
+            unit_type[y - 1:y + 2, x - 1:x + 2] = _TERRAN_SCV
+
+        return unit_type
+
+    def _timestep(self, step_type, reward):
+        size, mm = self.screen_size, self.minimap_size
+
+        screen = np.zeros((len(features.SCREEN_FEATURES), size, size), dtype=np.int32)
+        unit_type = self._render_unit_type()
+        screen[_SCREEN_UNIT_TYPE] = unit_type
+        relative = screen[_SCREEN_PLAYER_RELATIVE]
+        relative[unit_type > 0] = _PLAYER_SELF
+        relative[(unit_type == _NEUTRAL_MINERAL_FIELD) | (unit_type == _VESPENE_GAS)] = _PLAYER_NEUTRAL
+        screen[_SCREEN_PLAYER_ID][relative == _PLAYER_SELF] = 1
+
+        minimap = np.zeros((len(features.MINIMAP_FEATURES), mm, mm), dtype=np.int32)
+        own = minimap[_MINIMAP_PLAYER_RELATIVE]
+        base = 12 if self._base_top_left else mm - 20
+        own[base:base + 8, base:base + 8] = _PLAYER_SELF
+        minimap[_MINIMAP_CAMERA][base - 2:base + 10, base - 2:base + 10] = 1
+        for x, y in self._enemy:
+            own[y:y + 2, x:x + 2] = _PLAYER_HOSTILE
+
+        player = np.zeros(11, dtype=np.int32)
+        player[0] = 1
+        player[1] = self._minerals
+        player[3] = self._food_workers + self._food_army
+        player[4] = self._supply_cap()
+        player[5] = self._food_army
+        player[6] = self._food_workers
+        player[8] = self._food_army
+
+        available = [_F.no_op.id, _F.move_camera.id, _F.select_point.id]
+        if self._food_army:
+            available.append(_F.select_army.id)
+        if self._army_selected:
+            available.append(_F.Attack_minimap.id)
+        if self._selected == _TERRAN_SCV:
+            available.extend([_F.Build_SupplyDepot_screen.id, _F.Build_Barracks_screen.id,
+                              _F.Build_Refinery_screen.id, _F.Harvest_Gather_screen.id,
+                              _F.Harvest_Gather_SCV_screen.id])
+            if self._has(_TERRAN_BARRACKS):
+                available.append(_F.Build_Factory_screen.id)
+            if self._has(_TERRAN_FACTORY):
+                available.append(_F.Build_Starport_screen.id)
+        producers = {_TERRAN_COMMANDCENTER: _F.Train_SCV_quick.id, _TERRAN_BARRACKS: _F.Train_Marine_quick.id,
+                     _TERRAN_FACTORY: _F.Train_Hellion_quick.id, _TERRAN_STARPORT: _F.Train_Medivac_quick.id}
+        if self._selected in producers:
+            available.append(producers[self._selected])
+            if self._selected == _TERRAN_BARRACKS:
+                available.append(_F.Rally_Units_minimap.id)
+
+        single_select = np.zeros((0, 7), dtype=np.int32)
+        multi_select = np.zeros((0, 7), dtype=np.int32)
+        if self._army_selected and self._food_army:
+            multi_select = np.zeros((self._food_army, 7), dtype=np.int32)
+            multi_select[:, 0] = _TERRAN_MARINE
+        elif self._selected:
+            single_select = np.array([[self._selected, 1, 45, 0, 0, 0, 0]], dtype=np.int32)
+
+        observation = {
+            'screen': screen,
+            'minimap': minimap,
+            'player': player,
+            'available_actions': np.array(available, dtype=np.int32),
+            'single_select': single_select,
+            'multi_select': multi_select,
+            'score_cumulative': self._score.copy(),
+            'game_loop': np.array([self._step * self.step_mul], dtype=np.int32),
+        }
+
+        discount = 0.0 if step_type == environment.StepType.LAST else 1.0
+        return environment.TimeStep(step_type=step_type, reward=reward, discount=discount, observation=observation)
+
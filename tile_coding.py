@@ -0,0 +1,111 @@
+import numpy as np
+
+from exploration import EpsilonGreedy
+
+_HASH_SEED = 1234567
+
+# state -> tiles memo size; a step codes the state it learns from and the one it acts in, both usually seen
+_TILE_CACHE_SIZE = 4096
+
+
+class TileCoder:
+    """Hashed tile coding of a feature vector into `tilings` active indices in [0, size).
+
+    Each tiling is a grid over the features with tiles `widths` wide, shifted by a different fraction of a tile
+    per tiling (and per feature, so the shifts are not all along the diagonal). A tile's coordinates are hashed
+    into a table of `size` entries, a power of two, so memory is fixed however many distinct states turn up;
+    a few unrelated states sharing an entry only blurs their values a little.
+    """
+
+    def __init__(self, widths, tilings=8, size=1 << 14):
+        if size & (size - 1):
+            raise ValueError('size must be a power of two, got %d' % size)
+
+        self.widths = np.asarray(widths, dtype=np.float64)
+        self.tilings = tilings
+        self.size = size
+
+        # tiling t is shifted by t * (1, 3, 5, ...) / tilings of a tile, wrapped into [0, 1)
+        displacement = 2 * np.arange(len(self.widths)) + 1
+        self.offsets = (np.arange(tilings)[:, None] * displacement[None, :] / float(tilings)) % 1.0 * self.widths
+
+        rng = np.random.RandomState(_HASH_SEED)
+        self.multipliers = rng.randint(1, 1 << 62, size=len(self.widths), dtype=np.int64) | 1
+        self.tiling_keys = rng.randint(1, 1 << 62, size=tilings, dtype=np.int64)
+
+    def tiles(self, features):
+        coordinates = np.floor((np.asarray(features, dtype=np.float64) + self.offsets) / self.widths).astype(np.int64)
+
+        # integer overflow wraps around, which is what a hash wants
+        with np.errstate(over='ignore'):
+            hashes = coordinates.dot(self.multipliers) ^ self.tiling_keys
+            hashes ^= hashes >> 29
+
+        return hashes & (self.size - 1)
+
+
+class TileCodingQ:
+    """Q-learning over tile-coded features, with the choose_action/learn interface of QLearningTable.
+
+    States are integer keys as made by `encoder` (a StateEncoder); each is decoded back to its feature vector
+    and coded into one active tile per tiling. Q(s, a) is the sum of the active tiles' weights for action a,
+    so evaluating a state is a gather and a sum, and learning adds the TD error, split between the tilings,
+    to the same weights. The weights are one (size, n_actions) array allocated up front.
+    """
+
+    def __init__(self, actions, encoder, widths, tilings=8, size=1 << 14, learning_rate=0.1, reward_decay=0.9,
+                 e_greedy=0.9, exploration=None):
+        self.actions = actions  # a list
+        self.encoder = encoder
+        self.coder = TileCoder(widths, tilings, size)
+        self.lr = learning_rate
+        self.gamma = reward_decay
+
+        # the strategy sees the state's first tile as its row, so UCB's counts stay bounded as well
+        self.exploration = exploration if exploration is not None else EpsilonGreedy(e_greedy)
+
+        self.action_index = {action: i for i, action in enumerate(self.actions)}
+        self.weights = np.zeros((size, len(self.actions)), dtype=np.float64)
+
+        self._q = np.zeros(len(self.actions))
+        self._tile_cache = {}
+
+    @property
+    def n_states(self):
+        # weight rows that have been written to
+        return int(np.count_nonzero(self.weights.any(axis=1)))
+
+    def state_tiles(self, state):
+        tiles = self._tile_cache.get(state)
+
+        if tiles is None:
+            if len(self._tile_cache) >= _TILE_CACHE_SIZE:
+                self._tile_cache.clear()
+
+            tiles = self._tile_cache[state] = self.coder.tiles(self.encoder.decode(state))
+
+        return tiles
+
+    def values(self, state):
+        # Q-values of every action in `state`
+        return self.weights[self.state_tiles(state)].sum(axis=0)
+
+    def choose_action(self, observation):
+        tiles = self.state_tiles(observation)
+        np.sum(self.weights[tiles], axis=0, out=self._q)
+
+        return self.actions[self.exploration.select(self._q, int(tiles[0]))]
+
+    def learn(self, s, a, r, s_):
+        tiles = self.state_tiles(s)
+        column = self.action_index[a]
+
+        q_predict = self.weights[tiles, column].sum()
+
+        if s_ != 'terminal':
+            q_target = r + self.gamma * self.values(s_).max()
+        else:
+            q_target = r  # next state is terminal
+
+        # two tilings can hash to the same entry, which then takes both shares
+        np.add.at(self.weights[:, column], tiles, self.lr / self.coder.tilings * (q_target - q_predict))
@@ -0,0 +1,83 @@
+import atexit
+import json
+import os
+import struct
+
+import numpy as np
+
+from experience_buffer import TRANSITION
+
+# Transition log: an 8-byte magic, a little-endian uint32 header length, a JSON header (the agent, its action
+# list and the record dtype), then fixed-size TRANSITION records appended one chunk at a time. A log that was
+# cut off mid-record is read up to its last whole record.
+MAGIC = b'QTRN\x00\x01\r\n'
+_PREFIX = struct.Struct('<8sI')
+_RECORD = TRANSITION.newbyteorder('<')
+
+
+class TransitionRecorder:
+    """Appends the encoded (s, a, r, s', terminal) tuples an agent learns from to a transition log."""
+
+    def __init__(self, path, actions, agent=None, chunk_size=4096):
+        self.path = path
+        self.records = np.zeros(chunk_size, dtype=_RECORD)
+        self.size = 0
+
+        if not os.path.isfile(path) or not os.path.getsize(path):
+            header = json.dumps({'version': 1, 'agent': agent, 'actions': list(actions),
+                                 'dtype': _RECORD.descr}).encode('utf-8')
+
+            with open(path, 'wb') as f:
+                f.write(_PREFIX.pack(MAGIC, len(header)))
+                f.write(header)
+
+        self.file = open(path, 'ab')
+        atexit.register(self.close)
+
+    def append(self, s, a, r, s_):
+        if s_ == 'terminal':
+            self.records[self.size] = (s, a, r, -1, True)
+        else:
+            self.records[self.size] = (s, a, r, s_, False)
+
+        self.size += 1
+        if self.size == len(self.records):
+            self.flush()
+
+    def flush(self):
+        if self.size:
+            self.file.write(self.records[:self.size].tobytes())
+            self.size = 0
+
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+        atexit.unregister(self.close)
+
+
+def read_log_header(path):
+    with open(path, 'rb') as f:
+        magic, length = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError('%s is not a transition log' % path)
+
+        return json.loads(f.read(length).decode('utf-8')), _PREFIX.size + length
+
+
+def read_transitions(path, mmap=True):
+    # (header, records) with the records as a structured TRANSITION array
+    header, offset = read_log_header(path)
+    count = (os.path.getsize(path) - offset) // _RECORD.itemsize
+
+    if not count:
+        return header, np.zeros(0, dtype=_RECORD)
+    if mmap:
+        return header, np.memmap(path, dtype=_RECORD, mode='r', offset=offset, shape=(count, ))
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return header, np.fromfile(f, dtype=_RECORD, count=count)
@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class UnitCensus:
+    """Indexes a `unit_type` screen layer by unit type in a single pass.
+
+    Occupied pixels are grouped by type once (bincount plus a stable sort of their flat indices), after which
+    per-type counts, coordinates and centroids are slices of the grouped index instead of fresh full-screen
+    `(unit_type == X).nonzero()` scans. Coordinates come back in the same row-major order `nonzero()` gives.
+    """
+
+    def __init__(self, unit_type):
+        self.shape = unit_type.shape
+
+        flat = unit_type.ravel()
+        occupied = np.flatnonzero(flat)
+        types = flat[occupied]
+
+        self.counts = np.bincount(types) if len(types) else np.zeros(1, dtype=np.int64)
+        self.offsets = np.cumsum(self.counts) - self.counts
+        self.order = occupied[np.argsort(types, kind='stable')]
+
+        self._coords = {}
+
+    @classmethod
+    def batch(cls, unit_types):
+        # censuses of a stack of same-shape layers, one per environment, grouped in a single pass over all of them
+        stack = np.asarray(unit_types)
+        size = stack[0].size
+
+        flat = stack.reshape(-1)
+        occupied = np.flatnonzero(flat)
+        types = flat[occupied]
+
+        # sort by (layer, type); within a group the flat indices stay in row-major order
+        n_types = int(types.max()) + 1 if len(types) else 1
+        groups = occupied // size * n_types + types
+        counts = np.bincount(groups, minlength=len(stack) * n_types).reshape(len(stack), n_types)
+        order = occupied[np.argsort(groups, kind='stable')] % size
+        totals = counts.sum(axis=1)
+        ends = np.cumsum(totals)
+
+        censuses = []
+        for i in range(len(stack)):
+            census = cls.__new__(cls)
+            census.shape = stack.shape[1:]
+            census.counts = counts[i]
+            census.offsets = np.cumsum(counts[i]) - counts[i]
+            census.order = order[ends[i] - totals[i]:ends[i]]
+            census._coords = {}
+            censuses.append(census)
+
+        return censuses
+
+    def count(self, unit_type):
+        return int(self.counts[unit_type]) if unit_type < len(self.counts) else 0
+
+    def any(self, unit_type):
+        return self.count(unit_type) > 0
+
+    def coords(self, unit_type):
+        # (y, x) arrays, like (unit_type == X).nonzero()
+        coords = self._coords.get(unit_type)
+
+        if coords is None:
+            start = self.offsets[unit_type] if unit_type < len(self.counts) else 0
+            coords = np.divmod(self.order[start:start + self.count(unit_type)], self.shape[1])
+            self._coords[unit_type] = coords
+
+        return coords
+
+    def centroid(self, unit_type):
+        # [x, y] mean position, or None if the type is not on screen
+        if not self.count(unit_type):
+            return None
+
+        unit_y, unit_x = self.coords(unit_type)
+
+        return [unit_x.mean(), unit_y.mean()]